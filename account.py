@@ -3,6 +3,7 @@ File for account class.
 :author: Jeremy Daugherty
 """
 
+import sys
 from typing import Tuple, Union, Mapping
 
 
@@ -11,7 +12,14 @@ class Account:
     from it. It will contain raw numerical value and a list of items.
 
     It checks against the key to see if the user is who they say they are.
+
+    There can be a great many accounts so they use slots, item names are
+    interned so every inventory shares the library's strings and counts are
+    always ints.
     """
+    __slots__ = ('owner', 'name', 'key', 'value', 'inventory', 'observer',
+                 'version')
+
     def __init__(self, owner: str = "", name: str = "", key: str = "",
                  value: float = 0,
                  inventory: Union[Mapping[str, int], None] = None):
@@ -26,7 +34,27 @@ class Account:
         # Unliquidated items owned. A map of inventory[Name]->amount.
         if inventory is None:
             inventory = dict()
-        self.inventory = inventory
+        self.inventory = {sys.intern(item): amount
+                          for item, amount in inventory.items()}
+        # Whoever wants to hear about changes, usually the owning ledger.
+        # Must have an account_changed(account, value, items) method.
+        self.observer = None
+        # Bumped whenever the value or items change, so anything worked out
+        # from them knows when to throw it out.
+        self.version = 0
+        return
+
+    def notify(self, value: float = 0,
+               items: Union[Mapping[str, int], None] = None) -> None:
+        """Tells the observer, if any, what just changed in the account. Every
+        change goes through here, so this is where the version is bumped.
+
+        :param value: The change in currency, negative if removed.
+        :param items: The change in each item, negative if removed.
+        """
+        self.version += 1
+        if self.observer is not None:
+            self.observer.account_changed(self, value, items or {})
         return
 
     def save_data(self) -> str:
@@ -45,6 +73,7 @@ class Account:
         :param line: The line to parse and load from.
         """
         data = line.split('\t')
+        self.version += 1
         self.owner = data[0]
         self.name = data[1]
         self.key = data[2]
@@ -54,7 +83,7 @@ class Account:
             return
         for item in items.split(','):
             name, amount = item.split(':')
-            self.inventory[name] = float(amount)
+            self.inventory[sys.intern(name)] = int(amount)
         return
 
     def item_list(self) -> str:
@@ -87,19 +116,19 @@ class Account:
             return "Nothing given.\n"
         if value < 0:  # if negative value
             return "Value cannot be negative.\n"
-        else:
-            self.value += value
         if items is None:
-            return ""
+            items = {}
         for item, amount in items.items():
             if amount < 1:
                 return "Cannot add a negative number of %s to inventory.\n" %\
                        item
+        self.value += value
         for item, amount in items.items():
             if item in self.inventory:
                 self.inventory[item] += amount
             else:
-                self.inventory[item] = amount
+                self.inventory[sys.intern(item)] = amount
+        self.notify(value, items)
         return ""
 
     def remove(self, key: str, value: float=0, items: Mapping[str, int]=None) -> str:
@@ -146,8 +175,32 @@ class Account:
                 if self.inventory[item] == 0:
                     self.inventory.pop(item)
         self.value -= value
+        self.notify(-value, {item: -amount for item, amount in
+                             (items or {}).items()})
         return ""
 
+    def adjust(self, value: float = 0,
+               items: Union[Mapping[str, int], None] = None) -> None:
+        """Applies signed changes to the account with no checks at all.
+
+        Meant for putting back changes that were already checked once, like
+        undoing part of a failed batch. Anything else should use add or take.
+
+        :param value: Change in currency, negative to remove.
+        :param items: Change in each item, negative to remove.
+        """
+        if items is None:
+            items = {}
+        self.value += value
+        for item, amount in items.items():
+            count = self.inventory.get(item, 0) + amount
+            if count:
+                self.inventory[sys.intern(item)] = count
+            else:
+                self.inventory.pop(item, None)
+        self.notify(value, items)
+        return
+
     def balance(self) -> Tuple[float, str]:
         """Balance checking formula, returns everything owned by the account.
 
@@ -3,11 +3,35 @@ import asyncio
 import rolling
 import voting
 import pickle
+import ledger_commands
+from journal import Journal
 from ledger import Ledger
+from persistence import PersistenceWorker
+from registry import LedgerRegistry
+from ledger_locks import LedgerLocks
+from shards import ShardPool
+from storage import SQLiteStorage
 import string
 client = discord.Client()
 
 VERSION = '1.1.4'
+# Worker processes to spread ledgers across, 0 keeps them in this process.
+SHARDS = 0
+# Seconds between shard health checks.
+SHARD_CHECK = 30
+# Save ledgers as binary snapshots, convert older saves with snapshot.py.
+Ledger.binary_snapshots = True
+# How sure a command is to be on disk before it is answered, 'none', 'async'
+# or 'sync', see journal.py.
+DURABILITY = 'async'
+Ledger.durability = DURABILITY
+# Seconds between background syncs when DURABILITY is 'async'.
+Journal.flusher.interval = 0.05
+# Keep ledgers in a SQLite database instead of save files, move older ones
+# over with storage.py.
+DATABASE = False
+if DATABASE:
+    Ledger.storage = SQLiteStorage
 
 qwk_help = """For more specific help type help [topic].
 Topics are :
@@ -138,6 +162,11 @@ ledger_help_management = """Management Actions:
 Shows you the balance of an account, all money and items that an account has.
 Anyone may use this.
 
+.t [Account] Balance at #[Entry]
+
+Shows what an account had right after entry [Entry] in the history, the
+numbers Show History [Account] gives. Anyone may use this.
+
 .t Rectify
 
 Takes all the current money and items in all accounts, and the pot, and shows
@@ -155,10 +184,37 @@ This will add a new item to the system with the value given.
 [Item] is the name of the item. [Value] is the value of the item. Currently,
 only the admin may do this action.
 
+.t [Transaction]
+[Transaction]
+...
+
+Any number of transactions, one per line, may be sent in a single message.
+Either all of them go through or none of them do.
+
 .t Show History [Lines]
 
 This will show you [Lines] number of previous transactions. If lines is not
-given it will show you all of them. Please use wisely.
+given it will show you the last 20.
+
+.t Show History Page [Page]
+
+Pages back through the history 20 transactions at a time, page 1 being the
+most recent.
+
+.t Show History [Account] [Lines]
+.t Show History Item [Item] [Lines]
+
+Shows the last [Lines] transactions that changed an account, or that moved an
+item. If lines is not given it will show you the last 20.
+
+.t Who Has [Item]
+
+Shows every account holding [Item] and how many they have.
+
+.t Top [Number]
+
+Shows the [Number] richest accounts by total value, items included. If number
+is not given it will show the top 10.
 
 .t Show Items
 
@@ -196,10 +252,16 @@ ledger_help_commands = """Condensed Commands:
 -- .t Bank takes [Account]: [Value], [Items...]
 -- .t Set Value [Item]: [Value]
 -- .t [Account] Balance
+-- .t [Account] Balance at #[Entry]
 -- .t Rectify
 -- .t New Item [Item]: [Value]
 -- .t Delete Item [Item] 
 -- .t Show History [Number of Lines]
+-- .t Show History Page [Page]
+-- .t Show History [Account] [Number of Lines]
+-- .t Show History Item [Item] [Number of Lines]
+-- .t Who Has [Item]
+-- .t Top [Number]
 -- .t Show Items
 -- .t Total Value
 -- .t Save
@@ -214,7 +276,13 @@ Non-implemented commands.
 admin = '200818099547668490'
 
 votes = voting.voting()
-da_books = {}
+persistence = PersistenceWorker()
+# Ledgers by server id, only the recently used ones are kept in memory.
+da_books = LedgerRegistry(on_evict=persistence.evict)
+ledger_locks = LedgerLocks()
+shards = None
+# Servers whose ledger's history is being indexed in the background.
+indexing = set()
 
 
 @client.event
@@ -224,6 +292,10 @@ async def on_ready():
     print('Version %s' % VERSION)
     print(client.user.id)
     print('-----------------')
+    global shards
+    if SHARDS and shards is None:
+        shards = ShardPool(SHARDS)
+        client.loop.create_task(check_shards())
 
 
 def log(*args):
@@ -233,6 +305,81 @@ def log(*args):
     return
 
 
+async def ledger_action(message, create=False):
+    """Carries out a ledger command, .t or .L, and sends the reply. Only one
+    runs at a time for each server, see ledger_locks, but waiting for the
+    disk is done after letting go so commands landing together share a sync.
+
+    :param message: The message with the command.
+    :param create: True for .L, which creates a new ledger.
+    """
+    if create:
+        kind, command = 'create', message.content.split(' ')[2]
+    else:
+        kind, command = 'command', message.content[3:]
+    args = (message.server.id, str(message.server), message.author.name,
+            message.author.id, command)
+    synced = None
+    async with ledger_locks.hold(message.server.id):
+        if shards is not None:
+            reply = await shards.run(kind, *args)
+        else:
+            if create or command.startswith('Load '):
+                # the ledger is read back from disk or replaced, so its
+                # pending commit has to land first.
+                await persistence.flush(message.server.id)
+            else:
+                # the ledger may still be being written out after being
+                # dropped.
+                await persistence.settle(message.server.id)
+            if create:
+                reply, write = ledger_commands.create_ledger(da_books, *args)
+            else:
+                reply, write = ledger_commands.run_command(da_books, *args)
+            if write == ledger_commands.COMMIT and DURABILITY == 'sync':
+                synced = persistence.commit_durable(
+                    message.server.id, da_books[message.server.id])
+            elif write == ledger_commands.COMMIT:
+                persistence.mark_dirty(message.server.id,
+                                       da_books[message.server.id])
+            elif write == ledger_commands.SAVE:
+                await persistence.save(message.server.id,
+                                       da_books[message.server.id])
+            book = da_books.ledgers.get(message.server.id)
+            if (book is not None and not book.history.is_indexed()
+                    and message.server.id not in indexing):
+                indexing.add(message.server.id)
+                client.loop.create_task(index_history(message.server.id,
+                                                      book))
+    if synced is not None:
+        await synced
+    if reply:
+        await client.send_message(message.channel, reply)
+
+
+async def index_history(key, book):
+    """Indexes a freshly loaded ledger's history a chunk at a time,
+    letting other commands run in between.
+
+    :param key: The server's id.
+    :param book: The ledger.
+    """
+    try:
+        while not book.history.index_step():
+            await asyncio.sleep(0)
+    finally:
+        indexing.discard(key)
+
+
+async def check_shards():
+    """Health checks the shards every so often, restarting dead ones."""
+    while True:
+        await asyncio.sleep(SHARD_CHECK)
+        restarted = await client.loop.run_in_executor(None, shards.check)
+        if restarted:
+            log('Restarted shards %s' % restarted)
+
+
 @client.event
 async def on_message(message):
     # if message.author.id != client.user.id:
@@ -266,10 +413,23 @@ async def on_message(message):
                                           ledger_help_commands)
             else:
                 await client.send_message(message.channel, qwk_help)
+        elif 'ledger stats' in message.content.lower():
+            if message.author.id == admin:
+                books = da_books.ledgers.values()
+                await client.send_message(
+                    message.channel, da_books.stats() + ledger_locks.stats()
+                    + '%d saves wrote %d bytes.\n' % (
+                        sum(i.saves for i in books),
+                        sum(sum(i.bytes_written.values()) for i in books)))
+            else:
+                await client.send_message(message.channel, 'Only my admin may see that.')
         elif 'version' in message.content.lower():
             await client.send_message(message.channel, VERSION)
         elif 'Sepuku' in message.content:
             if message.author.id == admin:
+                await persistence.close(da_books.ledgers)
+                if shards is not None:
+                    shards.close()
                 client.logout()
                 client.close()
             else:
@@ -283,133 +443,9 @@ async def on_message(message):
                                       "Must give a name to the ledger "
                                       "and cannot have whitespace.")
         else:
-            da_books[message.server] = Ledger(name[2], message.server,
-                                              message.author.name,
-                                              message.author.id,
-                                              "%sStoreKey" % message.author.id)
-            await client.send_message(message.channel,
-                                      "Ledger Created.")
-
+            await ledger_action(message, create=True)
     elif message.content.startswith('.t'):  # ledger actions.
-        command = message.content[3:]
-        if command.startswith('Load '):
-            name = command.lstrip('Load ')
-            if True in [c in name for c in string.whitespace]:
-                await client.send_message(message.channel,
-                                          'Name cannot contain whitespace.')
-            else:
-                da_books[message.server] = Ledger(name, message.server,
-                                                  message.author.name,
-                                                  message.author.id,
-                                                  "%sStoreKey" %
-                                                  message.author.id)
-                da_books[message.server].load_save()
-                da_books[message.server].load_config()
-                await client.send_message(message.channel,
-                                      'Ledger Loaded.')
-        elif not da_books.get(message.server, False):
-            await client.send_message(message.channel,
-                                      'No Ledger on this server.')
-        elif command == 'Save':
-            da_books[message.server].save()
-            await client.send_message(message.channel,
-                                      'Ledger Saved.')
-        elif command == 'Show Items':
-            await client.send_message(message.channel,
-                                      da_books[message.server].item_list())
-        elif command == 'Total Value':
-            await client.send_message(
-                message.channel,
-                da_books[message.server].total_value()[3]
-            )
-        elif command == 'Rectify':
-            await client.send_message(
-                message.channel,
-                da_books[message.server].show_rectify()
-            )
-        elif command.startswith('Add Account '):
-            account = message.content[3:].lstrip('Add Account').split(' ')[0]
-            await client.send_message(
-                message.channel,
-                da_books[message.server].add_user(message.author.name, account,
-                                                  message.author.id)[1]
-            )
-            da_books[message.server].save()
-        elif command.startswith('Show Accounts'):
-            await client.send_message(
-                message.channel,
-                da_books[message.server].show_users()
-            )
-        elif command.startswith('Show History'):
-            if 'Show History' == command:
-                await client.send_message(
-                    message.channel,
-                    da_books[message.server].transaction_log()
-                )
-            else:
-                await client.send_message(
-                    message.channel,
-                    da_books[message.server].transaction_log(
-                        int(command.lstrip('Show History '))
-                    )
-                )
-        elif command.startswith('New Item '):
-            data = command.lstrip("New Item ")
-            item, value = data.split(':')
-            item = item.strip()
-            value = float(value.strip())
-            mess = ''
-            if da_books[message.server].admin_new_item(
-                    message.author.id, item, value):
-                mess += 'Successfully Added %s.\n' % item
-                da_books[message.server].save()
-            else:
-                mess += 'Item could not be added.\n'
-            if ',' in item:
-                mess += 'Item cannot have , in it. Use ; instead.'
-            await client.send_message(
-                message.channel,
-                mess
-            )
-        elif command.startswith('Set Value '):
-            await client.send_message(
-                message.channel,
-                da_books[message.server].transaction(command,
-                                                     message.author.id)
-            )
-            da_books[message.server].save()
-        elif command.startswith('Delete Item '):
-            item = command.lstrip('Delete Item ')
-            mess = ''
-            if da_books[message.server].delete_item(item, message.author.id):
-                mess += 'Item Successfully deleted.\n'
-                da_books[message.server].save()
-            else:
-                mess += 'Item could not be deleted.\n'
-            await client.send_message(
-                message.channel,
-                mess
-            )
-        elif da_books[message.server].is_account_name(command.split()[0]):
-            if command.split()[1] == 'Balance':
-                await client.send_message(
-                    message.channel,
-                    da_books[message.server].show_balance(command.split()[0])[3]
-                )
-            else:
-                res = da_books[message.server].transaction(command,
-                                                           message.author.id)
-                if res:
-                    await client.send_message(
-                        message.channel,
-                        res
-                    )
-                else:
-                    await client.send_message(
-                        message.channel,
-                        'Transaction Complete.'
-                    )
-                    da_books[message.server].save()
+        await ledger_action(message)
     elif message.content.startswith('Create Vote'):
         if message.content.split("ID:")[1].split("Q:")[0].strip() in votes.votes:  # id
             await client.send_message(message.channel, "Vote already exists. To Overwrite, delete previous first.")
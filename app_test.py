@@ -0,0 +1,76 @@
+import asyncio
+import builtins
+import importlib.util
+import os
+import symtable
+import tempfile
+import unittest
+
+
+class TestAppNames(unittest.TestCase):
+    def test_every_global_is_defined(self):
+        with open('app.py') as file:
+            table = symtable.symtable(file.read(), 'app.py', 'exec')
+        defined = {i.get_name() for i in table.get_symbols()
+                   if i.is_assigned() or i.is_imported()}
+        defined |= set(dir(builtins))
+        missing = set()
+        tables = [table]
+        while tables:
+            scope = tables.pop()
+            tables.extend(scope.get_children())
+            for symbol in scope.get_symbols():
+                if symbol.is_global() and symbol.is_referenced() and \
+                        symbol.get_name() not in defined:
+                    missing.add(symbol.get_name())
+        self.assertEqual(missing, set())
+
+
+@unittest.skipUnless(importlib.util.find_spec('discord'),
+                     'discord is not installed.')
+class TestLedgerAction(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def test_create_and_command(self):
+        import app
+        sent = []
+
+        async def send_message(channel, text):
+            sent.append(text)
+        app.client.send_message = send_message
+
+        class Server:
+            id = '1'
+
+            def __str__(self):
+                return 'Server'
+
+        class Author:
+            name = 'Admin'
+            id = 'AdminKey'
+
+        class Message:
+            server = Server()
+            author = Author()
+            channel = None
+
+            def __init__(self, content):
+                self.content = content
+
+        async def run():
+            await app.ledger_action(Message('.L Ledger Test'), create=True)
+            await app.ledger_action(Message('.t Add Account Alice'))
+            await app.persistence.flush()
+        asyncio.run(run())
+        self.assertEqual(sent, ['Ledger Created.', 'Alice account added.\n'])
+
+
+if __name__ == '__main__':
+    unittest.main()
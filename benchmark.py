@@ -0,0 +1,300 @@
+"""
+Benchmarks for the ledger.
+
+Run with python benchmark.py [name...], no names runs them all.
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from account import Account
+from ledger import Ledger
+from ledger_locks import LedgerLocks
+from persistence import PersistenceWorker
+from transfer import Transfer
+
+
+class DictAccount(Account):
+    """An account as it was before slots, a __dict__, float counts and every
+    inventory holding its own copy of each item name."""
+
+    def load_data(self, line: str) -> None:
+        data = line.split('\t')
+        self.owner = data[0]
+        self.name = data[1]
+        self.key = data[2]
+        self.value = float(data[3])
+        self.inventory = dict()
+        for item in data[4].split(','):
+            name, amount = item.split(':')
+            self.inventory[name] = float(amount)
+        return
+
+
+def account_lines(count: int, items: int = 20) -> list:
+    """Makes save lines for a lot of accounts holding a few items each.
+
+    :param count: How many accounts.
+    :param items: How many different items there are to hold.
+    :return: The lines, as Account.save_data() makes them.
+    """
+    return ['Owner%d\tAccount%d\tKey%d\t%d\t%s' % (
+        i, i, i, i, ','.join('Item%d:%d' % ((i + j) % items, j + 1)
+                             for j in range(3)))
+            for i in range(count)]
+
+
+def load_memory(kind: type, lines: list) -> int:
+    """Loads accounts from save lines and measures what they take up.
+
+    :param kind: The account class to load into.
+    :param lines: The save lines.
+    :return: Bytes allocated for the accounts.
+    """
+    tracemalloc.start()
+    accounts = []
+    for line in lines:
+        accounts.append(kind())
+        accounts[-1].load_data(line)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used
+
+
+def bench_accounts(count: int = 100000) -> None:
+    """Memory per account loaded, slotted accounts against dict ones."""
+    lines = account_lines(count)
+    slotted = load_memory(Account, lines)
+    dicts = load_memory(DictAccount, lines)
+    print('accounts: %d loaded' % count)
+    print('  with __dict__: %.1f bytes/account' % (dicts / count))
+    print('  with slots:    %.1f bytes/account' % (slotted / count))
+    print('  saved:         %.1f%%' % (100 * (dicts - slotted) / dicts))
+
+
+def timed(function, repeat: int = 5) -> float:
+    """
+    :return: The best time of a few runs of function, in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        took = time.perf_counter() - start
+        best = took if best is None else min(best, took)
+    return best
+
+
+def big_ledger(accounts: int, items: int, held: int = 20) -> Ledger:
+    """Makes a ledger with a lot of accounts holding a lot of items.
+
+    :param accounts: How many users.
+    :param items: How many different items exist.
+    :param held: How many different items each user holds.
+    :return: The ledger.
+    """
+    rng = random.Random(0)
+    ledger = Ledger('Bench', 'Bench', 'Admin', 'AdminKey', 'StoreKey')
+    for i in range(items):
+        ledger.new_item('Item%d' % i, rng.randint(1, 100))
+    for i in range(accounts):
+        ledger.add_user('Owner', 'Account%d' % i, 'Key', rng.randint(0, 1000),
+                        {'Item%d' % j: rng.randint(1, 5)
+                         for j in rng.sample(range(items), held)})
+    ledger.history.truncate(0)
+    ledger.checkpoints.truncate(0)
+    ledger.mark_committed()
+    return ledger
+
+
+def bench_columnar(accounts: int = 10000, items: int = 1000) -> None:
+    """Total Value, Rectify and all-accounts worth, looping over accounts
+    against NumPy reductions."""
+    cwd = os.getcwd()
+    # the ledger saves itself and takes checkpoints, keep them out of here.
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            ledger = big_ledger(accounts, items)
+
+            def reprice():
+                # changing a price throws out every cached worth.
+                ledger.library.change_value(
+                    'Item0', ledger.library.library['Item0'] + 1)
+
+            def total():
+                reprice()
+                ledger.total_value()
+
+            def rectify():
+                reprice()
+                ledger.show_rectify()
+
+            def worths():
+                reprice()
+                ledger.account_worths()
+
+            loops = [timed(total), timed(rectify), timed(worths)]
+            arrays = None
+            if ledger.enable_columnar():
+                arrays = [timed(total), timed(rectify), timed(worths)]
+            # anything left is written here rather than once it's collected.
+            ledger.save()
+            del ledger
+        finally:
+            os.chdir(cwd)
+    print('columnar: %d accounts x %d items' % (accounts, items))
+    if arrays is None:
+        print('  numpy is not installed, skipping.')
+        return
+    for name, loop, array in zip(['Total Value', 'Rectify', 'All worths'],
+                                 loops, arrays):
+        print('  %-12s loop: %8.2fms numpy: %8.2fms' % (name, loop * 1000,
+                                                          array * 1000))
+
+
+def bench_snapshot(accounts: int = 20000, items: int = 1000) -> None:
+    """Loading a ledger from the text save against the binary snapshot."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            ledger = big_ledger(accounts, items)
+
+            def load():
+                Ledger('Bench', 'Bench', 'Admin', 'AdminKey',
+                       'StoreKey').load_save()
+
+            ledger.save()
+            text_size = (os.path.getsize(ledger.save_location)
+                         + os.path.getsize(ledger.library.save_location))
+            text = timed(load, 3)
+            ledger.binary_snapshots = True
+            ledger.save()
+            binary_size = os.path.getsize(ledger.snapshot_location)
+            binary = timed(load, 3)
+            del ledger
+        finally:
+            os.chdir(cwd)
+    print('snapshot: %d accounts x %d items' % (accounts, items))
+    print('  text:   %8.2fms %8d bytes' % (text * 1000, text_size))
+    print('  binary: %8.2fms %8d bytes' % (binary * 1000, binary_size))
+
+
+def bench_durability(commits: int = 2000, clients: int = 8) -> None:
+    """Commits per second under each durability, going through the ledger
+    locks and persistence worker the way the bot's commands do, with several
+    clients sending commands to one ledger at once."""
+    print('durability: %d commits from %d clients' % (commits, clients))
+    for mode in ('none', 'async', 'sync'):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                ledger = big_ledger(100, 10, 5)
+                ledger.journal.durability = mode
+                ledger.save()
+
+                async def run():
+                    locks = LedgerLocks()
+                    worker = PersistenceWorker()
+
+                    async def client(count):
+                        for i in range(count):
+                            # as in the bot's ledger_action(), the command
+                            # runs under the lock and the wait for the disk
+                            # doesn't.
+                            async with locks.hold('server'):
+                                ledger.transaction('Bank gives Account%d: 1'
+                                                   % (i % 100), 'AdminKey')
+                                synced = worker.commit_durable('server',
+                                                               ledger)
+                            await synced
+
+                    start = time.perf_counter()
+                    await asyncio.gather(*(client(commits // clients)
+                                           for _ in range(clients)))
+                    took = time.perf_counter() - start
+                    await worker.close()
+                    return took
+
+                took = asyncio.run(run())
+                syncs = ledger.journal.syncs
+                del ledger
+            finally:
+                os.chdir(cwd)
+        print('  %-5s %10.0f commits/s %6d journal syncs'
+              % (mode + ':', commits // clients * clients / took, syncs))
+
+
+class CountingDict(dict):
+    """An inventory that counts every lookup and write made on it."""
+    operations = 0
+
+    def __getitem__(self, key):
+        CountingDict.operations += 1
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        CountingDict.operations += 1
+        super().__setitem__(key, value)
+
+    def __contains__(self, key):
+        CountingDict.operations += 1
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        CountingDict.operations += 1
+        return super().get(key, default)
+
+    def pop(self, key, *default):
+        CountingDict.operations += 1
+        return super().pop(key, *default)
+
+
+def bench_transfer(transfers: int = 100000, items: int = 3) -> None:
+    """Inventory operations and time per transfer, remove() then add()
+    against a Transfer."""
+    moved = {'Item%d' % i: 1 for i in range(items)}
+
+    def accounts():
+        giver = Account('Owner', 'Giver', 'Key', transfers * 2)
+        giver.inventory = CountingDict({i: transfers * 2 for i in moved})
+        taker = Account('Owner', 'Taker', 'Key', 0)
+        taker.inventory = CountingDict()
+        return giver, taker
+
+    def pair():
+        giver, taker = accounts()
+        for _ in range(transfers):
+            if not giver.remove('Key', 1, moved):
+                taker.add(1, moved)
+
+    def engine():
+        giver, taker = accounts()
+        for _ in range(transfers):
+            Transfer().take(giver, 1, moved, 'Key').give(taker, 1,
+                                                          moved).apply()
+
+    print('transfer: %d transfers of currency and %d items'
+          % (transfers, items))
+    for name, function in (('remove+add', pair), ('Transfer', engine)):
+        CountingDict.operations = 0
+        took = timed(function, 1)
+        print('  %-10s %5.1f dict ops/transfer %8.2fus/transfer'
+              % (name + ':', CountingDict.operations / transfers,
+                 took / transfers * 1e6))
+
+
+BENCHMARKS = {'accounts': bench_accounts, 'columnar': bench_columnar,
+              'snapshot': bench_snapshot, 'durability': bench_durability,
+              'transfer': bench_transfer}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,148 @@
+"""
+File for history checkpoints, copies of every account taken every so many
+history records so an account's balance at any point can be worked out
+without replaying the whole history.
+"""
+import glob
+from bisect import bisect_right
+from functools import partial
+from typing import Callable, List, Mapping, Tuple, Union
+
+import snapshot
+from files import write_atomic
+
+
+class Checkpoints:
+    """Every account as it stood every interval or so history records.
+
+    Checkpoint n covers records 0 to n - 1 and is kept as a binary snapshot
+    in [location]_[n].snap. One is taken whenever a write finds another
+    interval's worth of records since the last, covering however many there
+    are by then. Taking one only copies the accounts, turning them into a
+    snapshot is left to the write.
+    """
+    def __init__(self, location: str, interval: int = 1000) -> None:
+        """
+        :param location: What the files are named after.
+        :param interval: History records between checkpoints.
+        """
+        self.location = location
+        self.interval = interval
+        # Checkpoints taken but not yet written out, (records covered,
+        # (accounts, library, locks)).
+        self.pending = []
+        # How many records there were when due() last said yes, or when the
+        # history was loaded.
+        self.seen = 0
+        # Records covered by each checkpoint there is, in order, None until
+        # it's first needed.
+        self.known = None
+        return
+
+    def file(self, count: int) -> str:
+        """
+        :param count: The records the checkpoint covers.
+        :return: The file it is kept in.
+        """
+        return '%s_%d.snap' % (self.location, count)
+
+    def due(self, count: int) -> bool:
+        """
+        :param count: How many history records there are.
+        :return: Whether a checkpoint should be taken now, the records have
+            passed another multiple of interval since the last one.
+        """
+        if count // self.interval <= self.seen // self.interval:
+            return False
+        self.seen = count
+        return True
+
+    def take(self, count: int, accounts: List, library: Mapping[str, float],
+             locks: Tuple[bool, bool, bool, bool]) -> None:
+        """Holds on to a checkpoint until it is written out.
+
+        :param count: The history records it covers.
+        :param accounts: Copies of every account, the Bank, Store and Pot
+            first, nothing may change them afterwards.
+        :param library: A copy of the library, item name -> value.
+        :param locks: The user, transaction, store and bank locks.
+        """
+        self.pending.append((count, (accounts, library, locks)))
+        if self.known is not None:
+            self.known.append(count)
+        return
+
+    def truncate(self, count: int) -> None:
+        """Drops checkpoints not yet written out that cover more records
+        than are left.
+
+        :param count: How many history records are left.
+        """
+        self.pending = [i for i in self.pending if i[0] <= count]
+        if self.known is not None:
+            self.known = [i for i in self.known if i <= count]
+        return
+
+    def prepare_flush(self) -> Union[Callable[[], None], None]:
+        """Gets what writes out the checkpoints not yet written.
+
+        :return: A function doing the writing, None if there's nothing.
+        """
+        if not self.pending:
+            return None
+        pending = self.pending
+        self.pending = []
+        return partial(self.write, pending)
+
+    def write(self, pending: List[Tuple[int, Tuple]]) -> None:
+        """Writes out checkpoints.
+
+        :param pending: The records covered and what take() was given for
+            each.
+        """
+        for count, (accounts, library, locks) in pending:
+            write_atomic(self.file(count),
+                         snapshot.dump(accounts, library, locks))
+        return
+
+    def nearest(self, count: int) -> int:
+        """
+        :param count: A number of history records.
+        :return: The records covered by the last checkpoint covering no more
+            than that, 0 if there is none.
+        """
+        if self.known is None:
+            found = [i[len(self.location) + 1:-len('.snap')] for i in
+                     glob.glob(glob.escape(self.location) + '_*.snap')]
+            self.known = sorted(int(i) for i in found if i.isdigit())
+            self.known += [i[0] for i in self.pending]
+        index = bisect_right(self.known, count)
+        return self.known[index - 1] if index else 0
+
+    def balance(self, count: int, name: str) -> Union[
+            Tuple[float, Mapping[str, int]], None]:
+        """An account's balance in a checkpoint.
+
+        :param count: The records the checkpoint covers.
+        :param name: The account.
+        :return: Its value and items, None if it didn't exist yet.
+        """
+        pending = dict(self.pending)
+        if count in pending:
+            for account in pending[count][0]:
+                if account.name == name:
+                    return account.value, dict(account.inventory)
+            return None
+        data = snapshot.Snapshot(self.file(count))
+        accounts = data.accounts(data.strings())
+        ret = None
+        try:
+            for _, account, _, value, inventory in accounts:
+                if account == name:
+                    ret = value, inventory
+                    break
+        finally:
+            # the columns must be let go of before the file can be.
+            accounts.close()
+            data.close()
+        return ret
@@ -0,0 +1,155 @@
+"""
+File for the columnar store, a NumPy copy of the ledger's holdings for
+valuing everyone at once.
+
+NumPy is optional, without it the ledger simply values accounts one by one.
+"""
+from typing import Mapping
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+
+from account import Account
+from item import Items
+
+
+class ColumnarStore:
+    """Every account's currency and item counts held in NumPy arrays.
+
+    Each account gets a row, each item a column. Counts are stored as
+    floats so valuing needs no conversion. Kept in step with the
+    accounts through account_changed() so totals and every account's worth
+    are a reduction against the library's values instead of a loop.
+    """
+    def __init__(self, library: Items, rows: int = 64,
+                 columns: int = 64) -> None:
+        """
+        :param library: The library the item values come from.
+        :param rows: How many accounts to make room for to start with.
+        :param columns: How many items to make room for to start with.
+        """
+        if numpy is None:
+            raise ImportError('The columnar store needs numpy.')
+        self.library = library
+        # account name -> row, and row -> account name.
+        self.rows = dict()
+        self.names = []
+        # item name -> column, and column -> item name. Columns are never
+        # given back, an item seen once keeps its column.
+        self.columns = dict()
+        self.items = []
+        self.currency = numpy.zeros(rows)
+        self.holdings = numpy.zeros((rows, columns))
+        # Column sums of holdings, how many of each item there are in all.
+        self.counts = numpy.zeros(columns)
+        return
+
+    def add_account(self, account: Account) -> None:
+        """Gives an account a row, or refills its row if it has one.
+
+        :param account: The account to add.
+        """
+        row = self.rows.get(account.name)
+        if row is None:
+            row = len(self.names)
+            if row == len(self.currency):
+                self.grow(rows=2 * row)
+            self.rows[account.name] = row
+            self.names.append(account.name)
+        self.currency[row] = account.value
+        self.counts -= self.holdings[row]
+        self.holdings[row] = 0
+        self.account_changed(account, 0, account.inventory)
+        return
+
+    def remove_account(self, name: str) -> None:
+        """Drops an account's row, the last row is moved into its place.
+
+        :param name: Name of the account.
+        """
+        row = self.rows.pop(name)
+        self.counts -= self.holdings[row]
+        last = len(self.names) - 1
+        if row != last:
+            self.currency[row] = self.currency[last]
+            self.holdings[row] = self.holdings[last]
+            self.names[row] = self.names[last]
+            self.rows[self.names[row]] = row
+        self.names.pop()
+        self.currency[last] = 0
+        self.holdings[last] = 0
+        return
+
+    def account_changed(self, account: Account, value: float,
+                        items: Mapping[str, int]) -> None:
+        """Applies a change to an account's row.
+
+        :param account: The account that changed.
+        :param value: The change in currency.
+        :param items: The change in each item.
+        """
+        row = self.rows[account.name]
+        self.currency[row] += value
+        for item, amount in items.items():
+            column = self.columns.get(item)
+            if column is None:
+                column = len(self.items)
+                if column == self.holdings.shape[1]:
+                    self.grow(columns=2 * column + 1)
+                self.columns[item] = column
+                self.items.append(item)
+            self.holdings[row, column] += amount
+            self.counts[column] += amount
+        return
+
+    def grow(self, rows: int = 0, columns: int = 0) -> None:
+        """Makes room for more accounts or more items.
+
+        :param rows: Rows needed, nothing changes if there are enough.
+        :param columns: Columns needed, nothing changes if there are enough.
+        """
+        old_rows, old_columns = self.holdings.shape
+        rows = max(rows, old_rows)
+        columns = max(columns, old_columns)
+        currency = numpy.zeros(rows)
+        currency[:old_rows] = self.currency
+        holdings = numpy.zeros((rows, columns))
+        holdings[:old_rows, :old_columns] = self.holdings
+        counts = numpy.zeros(columns)
+        counts[:old_columns] = self.counts
+        self.currency = currency
+        self.holdings = holdings
+        self.counts = counts
+        return
+
+    def prices(self) -> 'numpy.ndarray':
+        """
+        :return: What each column is worth, from the library.
+        """
+        ret = numpy.zeros(self.holdings.shape[1])
+        ret[:len(self.items)] = [self.library.worth(i) for i in self.items]
+        return ret
+
+    def worths(self) -> Mapping[str, float]:
+        """Values every account at once.
+
+        :return: Each account's currency plus the worth of its items.
+        """
+        count = len(self.names)
+        worth = (self.currency[:count]
+                 + self.holdings[:count] @ self.prices())
+        return dict(zip(self.names, worth.tolist()))
+
+    def currency_total(self) -> float:
+        """
+        :return: All the currency held.
+        """
+        return float(self.currency.sum())
+
+    def total(self) -> float:
+        """
+        :return: The worth of everything held, currency included.
+        """
+        return float(self.currency.sum() + self.counts @ self.prices())
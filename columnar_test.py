@@ -0,0 +1,49 @@
+import unittest
+import ledger
+from columnar import numpy
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestColumnarStore(unittest.TestCase):
+    def setUp(self):
+        self.ledger = ledger.Ledger("Columnar", "Test", "TestAdmin", "TestKey",
+                                    "TestStoreKey")
+        self.ledger.library.new_item('Test', 100)
+        self.ledger.add_user("TestUser", "TestAccount", "TestUserKey", 100,
+                             {'Test': 1})
+        self.assertTrue(self.ledger.enable_columnar())
+        self.ledger.add_user("TestUser2", "TestAccount2", "TestUserKey2", 50)
+
+    def check(self):
+        loop = {account.name: self.ledger.account_worth(account)
+                for account in self.ledger.users + [self.ledger.pot]}
+        self.assertEqual(self.ledger.account_worths(), loop)
+        self.assertEqual(self.ledger.columns.total(), sum(loop.values()))
+
+    def test_matches_loop(self):
+        self.check()
+        self.ledger.transaction('Bank gives Pot: 100, Test:2', 'TestKey')
+        self.ledger.transaction('TestAccount gives TestAccount2: 20, Test:1',
+                                'TestUserKey')
+        self.ledger.transaction('Bank gives TestAccount2: 5, ' + ', '.join(
+            'Item%d:%d' % (i, i + 1) for i in range(100)), 'TestKey')
+        self.ledger.transaction('Set Value Item5: 7', 'TestKey')
+        self.check()
+        self.assertEqual(self.ledger.total_value()[2], 597)
+
+    def test_rectify(self):
+        self.ledger.transaction('Bank gives Pot: 100', 'TestKey')
+        self.assertEqual(self.ledger.show_rectify(),
+                         'TestAccount: -25\nTestAccount2: 125\n')
+
+    def test_unregister(self):
+        self.ledger.add_user("TestUser3", "TestAccount3", "TestUserKey3", 7)
+        self.ledger.unregister_account('TestAccount')
+        self.check()
+        self.assertEqual(self.ledger.columns.names,
+                         ['Pot', 'TestAccount3', 'TestAccount2'])
+        self.assertEqual(self.ledger.columns.total(), 57)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+File for writing files whole, so a crash part way through leaves the old file
+rather than half of the new one.
+"""
+import os
+from typing import Union
+
+
+def write_atomic(location: str, data: Union[str, bytes],
+                 sync: bool = False) -> int:
+    """Writes a file through a temporary file that is renamed over it once
+    everything is written.
+
+    :param location: The file.
+    :param data: Everything that goes in it, text is written as utf-8.
+    :param sync: Whether to wait until the file and the rename are on disk.
+    :return: The bytes written.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    temp = location + '.tmp'
+    with open(temp, 'wb') as file:
+        file.write(data)
+        if sync:
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(temp, location)
+    if sync:
+        sync_directory(os.path.dirname(location) or '.')
+    return len(data)
+
+
+def sync_directory(location: str) -> None:
+    """Puts a directory's entries on disk, so files renamed into it stay.
+
+    :param location: The directory.
+    """
+    try:
+        fd = os.open(location, os.O_RDONLY)
+    except OSError:
+        # not every OS lets a directory be opened, those that don't keep
+        # their renames anyway.
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+    return
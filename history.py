@@ -0,0 +1,417 @@
+"""
+File for the transaction history, kept as structured records in an append
+only log with only the most recent records held in memory.
+"""
+import json
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import partial
+from itertools import islice
+from typing import (Callable, Iterator, List, NamedTuple, Sequence, Tuple,
+                    Union)
+
+# (account, change in currency, ((item, change in count), ...))
+Change = Tuple[str, float, Tuple[Tuple[str, int], ...]]
+# An entry of the offset index, where a record ends in the log.
+OFFSET = struct.Struct('<Q')
+
+
+class HistoryRecord(NamedTuple):
+    """A single entry in the history.
+
+    Text is what Show History prints. Changes hold what the entry did to each
+    account so the history can be searched and replayed without parsing it.
+    """
+    seq: int
+    time: float
+    actor: str
+    action: str
+    text: str
+    changes: Tuple[Change, ...] = ()
+
+    def dump(self) -> str:
+        """
+        :return: The record as a single line of the log.
+        """
+        return json.dumps([self.seq, self.time, self.actor, self.action,
+                           self.text, self.changes])
+
+    @classmethod
+    def load(cls, line: str) -> 'HistoryRecord':
+        """
+        :param line: A line as dump() made it.
+        :return: The record.
+        """
+        seq, when, actor, action, text, changes = json.loads(line)
+        return cls(seq, when, actor, action, text,
+                   tuple((name, value, tuple(tuple(i) for i in items))
+                         for name, value, items in changes))
+
+
+class History:
+    """The history of a ledger.
+
+    Records are numbered from 0 and appended a line each to [location].log.
+    [location].idx holds where each of them ends, eight bytes a record, so
+    any run of records is found by reading two entries of it and read back
+    through a memory map without touching the rest of the log. Only the last
+    tail_size records, and any not yet written out, are kept in memory.
+
+    Which records touched each account and each item is indexed, so what
+    happened to one of them can be found without going through the rest.
+    Loading only reads the tail, the index is built afterwards chunk_size
+    records at a time by index_step(), or all at once the first time it is
+    needed.
+    """
+    def __init__(self, location: str, chunk_size: int = 1000,
+                 tail_size: int = 200) -> None:
+        """
+        :param location: What the files are named after.
+        :param chunk_size: Records read at a time when going through the
+            whole history.
+        :param tail_size: Most recent records to keep in memory.
+        """
+        self.location = location
+        self.log_location = location + '.log'
+        self.index_location = location + '.idx'
+        self.chunk_size = chunk_size
+        # Every record there is, and how many of those are on disk.
+        self.count = 0
+        self.flushed = 0
+        self.tail = deque(maxlen=tail_size)
+        # Records not yet written out, however many there are.
+        self.pending = []
+        # account name -> numbers of the records changing it, oldest first,
+        # and the same for item names. Only the first indexed records are in
+        # them.
+        self.accounts = dict()
+        self.items = dict()
+        self.indexed = 0
+        return
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[HistoryRecord]:
+        """Goes through every record, oldest first, a chunk at a time."""
+        for start in range(0, self.count, self.chunk_size):
+            yield from self.records(start, start + self.chunk_size)
+
+    def append(self, actor: str, action: str, text: str,
+               changes: Sequence[Change] = ()) -> HistoryRecord:
+        """Adds a record to the end of the history.
+
+        :param actor: Who did it.
+        :param action: What kind of thing they did.
+        :param text: The line to show for it.
+        :param changes: What it did to each account.
+        :return: The record.
+        """
+        record = HistoryRecord(self.count, time.time(), actor, action, text,
+                               tuple(changes))
+        self.tail.append(record)
+        self.pending.append(record)
+        if self.indexed == self.count:
+            self.index(record)
+            self.indexed += 1
+        self.count += 1
+        return record
+
+    def index(self, record: HistoryRecord) -> None:
+        """Adds a record to the account and item indexes.
+
+        :param record: The record, newer than any already indexed.
+        """
+        for name, _, items in record.changes:
+            seqs = self.accounts.setdefault(name, [])
+            if not seqs or seqs[-1] != record.seq:
+                seqs.append(record.seq)
+            for item, _ in items:
+                seqs = self.items.setdefault(item, [])
+                if not seqs or seqs[-1] != record.seq:
+                    seqs.append(record.seq)
+        return
+
+    def unindex(self, record: HistoryRecord) -> None:
+        """Takes the newest record back out of the indexes.
+
+        :param record: The record, the newest indexed.
+        """
+        for index, names in ((self.accounts, [i[0] for i in record.changes]),
+                             (self.items, [item for change in record.changes
+                                           for item, _ in change[2]])):
+            for name in names:
+                seqs = index.get(name)
+                if seqs and seqs[-1] == record.seq:
+                    seqs.pop()
+                    if not seqs:
+                        del index[name]
+        return
+
+    def unflushed(self) -> int:
+        """
+        :return: How many records haven't been written out yet.
+        """
+        return self.count - self.flushed
+
+    def truncate(self, length: int) -> None:
+        """Drops records from the end, only ones not yet written out.
+
+        :param length: How many records to keep.
+        """
+        if length < self.flushed:
+            raise ValueError('Cannot drop records already written out.')
+        while self.count > length:
+            record = self.pending.pop()
+            if record.seq < self.indexed:
+                self.unindex(record)
+                self.indexed -= 1
+            if self.tail:
+                self.tail.pop()
+            self.count -= 1
+        return
+
+    def prepare_flush(self) -> Union[Callable[[], None], None]:
+        """Marks every record as written out and gets what writes them.
+
+        :return: A function doing the writing that only touches the disk, None
+            if there is nothing to write.
+        """
+        records = self.take_pending()
+        if not records:
+            return None
+        return partial(self.write, records)
+
+    def take_pending(self) -> List[HistoryRecord]:
+        """Marks every record as written out, for whoever writes them.
+
+        :return: The records not yet written out, oldest first.
+        """
+        records = self.pending
+        self.pending = []
+        self.flushed = self.count
+        return records
+
+    def write(self, records: List[HistoryRecord]) -> None:
+        """Appends records to the log and where each ends to the index.
+
+        Anything in either file past the last record fully indexed was cut
+        off part way through writing and is written over.
+
+        :param records: The records, in order and following on from the ones
+            already on disk.
+        """
+        with open(self.index_location, 'ab+') as index, \
+                open(self.log_location, 'ab+') as log:
+            count = index.seek(0, os.SEEK_END) // OFFSET.size
+            index.truncate(count * OFFSET.size)
+            end = 0
+            if count:
+                index.seek((count - 1) * OFFSET.size)
+                end = OFFSET.unpack(index.read(OFFSET.size))[0]
+            log.truncate(end)
+            lines = []
+            ends = []
+            for record in records:
+                lines.append((record.dump() + '\n').encode())
+                end += len(lines[-1])
+                ends.append(OFFSET.pack(end))
+            log.write(b''.join(lines))
+            # the log first, so the index never points past what's there.
+            log.flush()
+            index.write(b''.join(ends))
+        return
+
+    def on_disk(self) -> int:
+        """
+        :return: How many records are in the index.
+        """
+        if not os.path.exists(self.index_location):
+            return 0
+        return os.path.getsize(self.index_location) // OFFSET.size
+
+    def read_spans(self, spans: Sequence[Tuple[int, int]]) -> List[bytes]:
+        """Reads runs of records through memory maps of the index and log,
+        only the pages holding the entries and lines asked for are read.
+
+        :param spans: The first and one past the last record's number of each
+            run, all of them on disk.
+        :return: The lines of each run.
+        """
+        with open(self.index_location, 'rb') as index_file, \
+                open(self.log_location, 'rb') as log_file:
+            index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            log = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            ret = []
+            for start, stop in spans:
+                begin = (OFFSET.unpack_from(index, (start - 1) * OFFSET.size)[0]
+                         if start else 0)
+                end = OFFSET.unpack_from(index, (stop - 1) * OFFSET.size)[0]
+                ret.append(log[begin:end])
+        finally:
+            index.close()
+            log.close()
+        return ret
+
+    def read_range(self, start: int, stop: int) -> List[HistoryRecord]:
+        """Reads a run of records from disk.
+
+        :param start: The first record's number.
+        :param stop: One past the last record's number, all of them on disk.
+        :return: The records, oldest first.
+        """
+        if start >= stop:
+            return []
+        data = self.read_spans([(start, stop)])[0]
+        return [HistoryRecord.load(line) for line in data.decode().splitlines()]
+
+    def read_seqs(self, seqs: Sequence[int]) -> List[HistoryRecord]:
+        """Reads records by number from disk, only reading and decoding the
+        records asked for.
+
+        :param seqs: The records' numbers, in order, all of them on disk.
+        :return: The records.
+        """
+        if not seqs:
+            return []
+        return [HistoryRecord.load(line.decode()) for line in
+                self.read_spans([(i, i + 1) for i in seqs])]
+
+    def load(self) -> None:
+        """Finds how many records there are on disk and reads in the tail,
+        nothing else is read until it is asked for.
+        """
+        self.tail.clear()
+        self.pending = []
+        self.accounts = dict()
+        self.items = dict()
+        self.indexed = 0
+        self.count = self.flushed = self.on_disk()
+        self.tail.extend(self.read_range(max(self.count - self.tail.maxlen, 0),
+                                         self.count))
+        return
+
+    def is_indexed(self) -> bool:
+        """
+        :return: Whether every record is in the indexes.
+        """
+        return self.indexed == self.count
+
+    def index_step(self) -> bool:
+        """Indexes the next chunk of records not yet indexed.
+
+        :return: Whether every record is now indexed.
+        """
+        if self.indexed < self.count:
+            stop = (self.indexed // self.chunk_size + 1) * self.chunk_size
+            for record in self.records(self.indexed, stop):
+                self.index(record)
+            self.indexed = min(stop, self.count)
+        return self.is_indexed()
+
+    def ensure_indexed(self) -> None:
+        """Finishes indexing, however much is left."""
+        while not self.index_step():
+            pass
+        return
+
+    def records(self, start: int, stop: int) -> List[HistoryRecord]:
+        """Gets a run of records.
+
+        :param start: The first record's number, clipped to the history.
+        :param stop: One past the last record's number, clipped likewise.
+        :return: The records, oldest first.
+        """
+        start = max(start, 0)
+        stop = min(stop, self.count)
+        if start >= stop:
+            return []
+        held, first_held = self.held()
+        ret = []
+        if start < first_held:
+            ret += self.read_range(start, min(stop, first_held))
+        if stop > first_held:
+            ret += islice(held, max(start, first_held) - first_held,
+                          stop - first_held)
+        return ret
+
+    def held(self) -> Tuple[Sequence[HistoryRecord], int]:
+        """
+        :return: Whichever of the tail and the records not written out
+            reaches further back, and the number of its first record.
+            Everything from there on is in memory, everything before it only
+            on disk.
+        """
+        held = self.tail if len(self.tail) > len(self.pending) else self.pending
+        return held, self.count - len(held)
+
+    def get(self, seqs: Sequence[int]) -> List[HistoryRecord]:
+        """Gets records by number.
+
+        :param seqs: The records' numbers, in order.
+        :return: The records.
+        """
+        held, first_held = self.held()
+        ret = self.read_seqs([i for i in seqs if i < first_held])
+        ret += (held[i - first_held] for i in seqs if i >= first_held)
+        return ret
+
+    def of_account(self, name: str, count: int) -> List[HistoryRecord]:
+        """
+        :param name: The account.
+        :param count: Most records to get.
+        :return: The latest records changing the account, oldest first.
+        """
+        self.ensure_indexed()
+        return self.get(self.accounts.get(name, [])[-count:])
+
+    def of_account_between(self, name: str, start: int,
+                           stop: int) -> List[HistoryRecord]:
+        """
+        :param name: The account.
+        :param start: The first record's number.
+        :param stop: One past the last record's number.
+        :return: The records in that run changing the account, oldest first.
+        """
+        self.ensure_indexed()
+        seqs = self.accounts.get(name, [])
+        return self.get(seqs[bisect_left(seqs, start):
+                             bisect_left(seqs, stop)])
+
+    def of_item(self, name: str, count: int) -> List[HistoryRecord]:
+        """
+        :param name: The item.
+        :param count: Most records to get.
+        :return: The latest records moving the item, oldest first.
+        """
+        self.ensure_indexed()
+        return self.get(self.items.get(name, [])[-count:])
+
+    def last(self, count: int) -> List[HistoryRecord]:
+        """
+        :param count: How many records.
+        :return: The most recent records, oldest first.
+        """
+        return self.records(self.count - count, self.count)
+
+    def page(self, number: int, size: int) -> List[HistoryRecord]:
+        """Gets a page of the history, page 1 being the most recent.
+
+        :param number: Which page.
+        :param size: Records to a page.
+        :return: The page's records, oldest first.
+        """
+        stop = self.count - (number - 1) * size
+        return self.records(stop - size, stop)
+
+    def pages(self, size: int) -> int:
+        """
+        :param size: Records to a page.
+        :return: How many pages there are.
+        """
+        return max(1, -(-self.count // size))
@@ -0,0 +1,157 @@
+import os
+import tempfile
+import unittest
+
+from history import History, HistoryRecord
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        self.history = History('history_Test', chunk_size=4, tail_size=3)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def fill(self, count):
+        for i in range(count):
+            self.history.append('Bank', 'give', 'Bank gives Pot: %d' % i,
+                                [('Pot', i, (('Loot', 1),))])
+
+    def flush(self):
+        write = self.history.prepare_flush()
+        if write is not None:
+            write()
+
+    def texts(self, records):
+        return [i.text for i in records]
+
+    def test_record_round_trip(self):
+        record = HistoryRecord(3, 12.5, 'Bank', 'give', 'Bank gives Pot: 1',
+                               (('Pot', 1.0, (('Loot', 2),)),))
+        self.assertEqual(HistoryRecord.load(record.dump()), record)
+
+    def test_log(self):
+        self.fill(10)
+        self.flush()
+        self.assertEqual(sorted(os.listdir('.')),
+                         ['history_Test.idx', 'history_Test.log'])
+        self.assertEqual(os.path.getsize('history_Test.idx'), 80)
+        self.assertEqual(self.texts(self.history.read_range(4, 8)),
+                         ['Bank gives Pot: %d' % i for i in range(4, 8)])
+        self.assertEqual([i.seq for i in self.history.read_seqs([0, 9])],
+                         [0, 9])
+        self.assertEqual(self.history.unflushed(), 0)
+        self.assertIsNone(self.history.prepare_flush())
+
+    def test_cut_off_write(self):
+        self.fill(3)
+        self.flush()
+        with open('history_Test.log', 'ab') as file:
+            file.write(b'[3, 0.0, "Ba')
+        with open('history_Test.idx', 'ab') as file:
+            file.write(b'\x01\x02')
+        loaded = History('history_Test', chunk_size=4, tail_size=3)
+        loaded.load()
+        self.assertEqual(len(loaded), 3)
+        loaded.append('Bank', 'give', 'Bank gives Pot: 3', [])
+        loaded.prepare_flush()()
+        loaded = History('history_Test', chunk_size=4, tail_size=3)
+        loaded.load()
+        self.assertEqual(self.texts(loaded.read_range(0, 4)),
+                         ['Bank gives Pot: %d' % i for i in range(4)])
+
+    def test_records_across_disk_and_memory(self):
+        self.fill(10)
+        self.flush()
+        self.fill(2)
+        self.assertEqual(len(self.history.tail), 3)
+        self.assertEqual(self.texts(self.history.records(2, 12)),
+                         ['Bank gives Pot: %d' % i for i in range(2, 10)] +
+                         ['Bank gives Pot: 0', 'Bank gives Pot: 1'])
+        self.assertEqual([i.seq for i in self.history], list(range(12)))
+
+    def test_pending_beyond_tail(self):
+        self.fill(6)
+        self.assertEqual([i.seq for i in self.history.records(0, 6)],
+                         list(range(6)))
+        self.flush()
+        self.assertEqual([i.seq for i in self.history.records(0, 6)],
+                         list(range(6)))
+
+    def test_page(self):
+        self.fill(7)
+        self.assertEqual(self.history.pages(3), 3)
+        self.assertEqual([i.seq for i in self.history.page(1, 3)], [4, 5, 6])
+        self.assertEqual([i.seq for i in self.history.page(3, 3)], [0])
+        self.assertEqual(self.history.page(4, 3), [])
+
+    def test_load(self):
+        self.fill(9)
+        self.flush()
+        loaded = History('history_Test', chunk_size=4, tail_size=3)
+        loaded.load()
+        self.assertEqual(len(loaded), 9)
+        self.assertEqual([i.seq for i in loaded.tail], [6, 7, 8])
+        self.assertEqual(list(loaded), list(self.history))
+
+    def test_indexes(self):
+        self.fill(3)
+        self.history.append('Alice', 'give', 'Alice gives Bob: 1',
+                            [('Alice', -1, ()), ('Bob', 1, ())])
+        self.flush()
+        self.fill(2)
+        self.assertEqual(self.history.accounts['Pot'], [0, 1, 2, 4, 5])
+        self.assertEqual(self.history.items['Loot'], [0, 1, 2, 4, 5])
+        self.assertEqual(self.texts(self.history.of_account('Bob', 5)),
+                         ['Alice gives Bob: 1'])
+        self.assertEqual([i.seq for i in self.history.of_item('Loot', 4)],
+                         [1, 2, 4, 5])
+        self.flush()
+        loaded = History('history_Test', chunk_size=4, tail_size=3)
+        loaded.load()
+        loaded.ensure_indexed()
+        self.assertEqual(loaded.accounts, self.history.accounts)
+        self.assertEqual(loaded.items, self.history.items)
+
+    def test_lazy_index(self):
+        self.fill(9)
+        self.flush()
+        loaded = History('history_Test', chunk_size=4, tail_size=3)
+        loaded.load()
+        self.assertEqual((len(loaded), loaded.indexed), (9, 0))
+        loaded.append('Bank', 'give', 'Bank gives Bob: 1',
+                      [('Bob', 1, ())])
+        self.assertEqual(loaded.accounts, {})
+        self.assertFalse(loaded.index_step())
+        self.assertEqual(loaded.indexed, 4)
+        self.assertEqual(loaded.accounts['Pot'], [0, 1, 2, 3])
+        self.assertEqual([i.seq for i in loaded.of_account('Pot', 2)], [7, 8])
+        self.assertEqual(loaded.accounts['Bob'], [9])
+        self.assertTrue(loaded.is_indexed())
+
+    def test_truncate_unindexes(self):
+        self.fill(2)
+        self.flush()
+        self.history.append('Alice', 'give', 'Alice gives Bob: 1',
+                            [('Alice', -1, ()), ('Bob', 1, ())])
+        self.history.truncate(2)
+        self.assertNotIn('Alice', self.history.accounts)
+        self.assertEqual(self.history.accounts['Pot'], [0, 1])
+
+    def test_truncate(self):
+        self.fill(4)
+        self.flush()
+        self.fill(3)
+        self.history.truncate(5)
+        self.assertEqual(len(self.history), 5)
+        self.assertEqual([i.seq for i in self.history.last(2)], [3, 4])
+        with self.assertRaises(ValueError):
+            self.history.truncate(3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,10 @@
 """
 File for the item class.
 """
-from typing import Optional
+import sys
+from typing import Optional, Mapping
+
+from files import write_atomic
 
 
 class Items:
@@ -14,8 +17,36 @@ class Items:
     def __init__(self) -> None:
         self.library = dict()
         self.save_location = ''
+        # Bumped whenever a value changes so anything valued against the
+        # library knows when to throw its numbers out.
+        self.version = 0
+        # Names of items added, revalued or deleted since the owner last
+        # wrote them out.
+        self.changed = set()
         return
 
+    def worth(self, name: str) -> float:
+        """The value an item counts for in totals.
+
+        Unvalued, priceless and unknown items are worth nothing.
+
+        :param name: Name of the item.
+        :return: The item's value, 0 if it has none.
+        """
+        value = self.library.get(name, -1)
+        if value < 0:
+            return 0
+        return value
+
+    def value_of(self, items: Mapping[str, int]) -> float:
+        """Values a collection of items.
+
+        :param items: How many of each item, by name.
+        :return: What they are worth together.
+        """
+        return sum(amount * self.worth(item)
+                   for item, amount in items.items())
+
     def new_item(self, name: str, value: float = -1) -> bool:
         """Add an item to the library.
 
@@ -28,7 +59,9 @@ class Items:
             return False
         if ',' in name:
             return False
-        self.library[name] = value
+        self.library[sys.intern(name)] = value
+        self.version += 1
+        self.changed.add(name)
         return True
 
     def change_value(self, name: str, new_value: float) -> bool:
@@ -43,6 +76,8 @@ class Items:
         """
         if name in self.library:
             self.library[name] = new_value
+            self.version += 1
+            self.changed.add(name)
             return True
         return False
 
@@ -55,8 +90,22 @@ class Items:
         if name not in self.library:
             return False
         self.library.pop(name)
+        self.version += 1
+        self.changed.add(name)
         return True
 
+    def restore(self, library: Mapping[str, float]) -> None:
+        """Puts the library back the way it was.
+
+        :param library: The name to value pairs to restore.
+        """
+        if library == self.library:
+            return
+        self.library.clear()
+        self.library.update(library)
+        self.version += 1
+        return
+
     def set_save_location(self, location) -> None:
         """Sets the save location of the library.
 
@@ -74,13 +123,17 @@ class Items:
         """
         if not self.save_location:
             return 'Save Location Not Set.\n'
-        data = ''
-        for name, value in self.library.items():
-            data += "%s,%d,\n" % (name, value)
-        with open(self.save_location, 'w') as file:
-            file.write(data)
+        write_atomic(self.save_location, self.dump())
         return
 
+    def dump(self) -> str:
+        """Puts the library into the form save_data() writes out.
+
+        :return: The library, one item per line.
+        """
+        return ''.join("%s,%d,\n" % (name, value)
+                       for name, value in self.library.items())
+
     def load_data(self) -> Optional[str]:
         """Turns the lines given into data.
 
@@ -88,6 +141,7 @@ class Items:
         """
         if not self.save_location:
             return "Save Location Not Set.\n"
+        self.version += 1
         with open(self.save_location) as file:
             lines = file.readlines()
             for line in lines:
@@ -95,5 +149,5 @@ class Items:
                 if len(data) != 3:
                     return "Something really broke in here. " \
                            "You should check it out."
-                self.library[data[0]] = float(data[1])
+                self.library[sys.intern(data[0])] = float(data[1])
         return
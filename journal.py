@@ -0,0 +1,197 @@
+"""
+File for the journal class, an append-only log of ledger changes.
+"""
+import os
+import threading
+import time
+from typing import List, Set
+
+# How far a write goes before it counts as done. NONE leaves getting it to
+# the disk to the OS, ASYNC has the flusher sync it in the background and
+# SYNC waits for the disk.
+NONE = 'none'
+ASYNC = 'async'
+SYNC = 'sync'
+DURABILITY = (NONE, ASYNC, SYNC)
+
+
+class Flusher:
+    """Syncs journals written in ASYNC mode every so often on a thread of its
+    own."""
+    def __init__(self, interval: float = 0.05) -> None:
+        """
+        :param interval: Seconds between syncs.
+        """
+        self.interval = interval
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        return
+
+    def add(self, journal: 'Journal') -> None:
+        """Has a journal synced in the next round, starting the thread if it
+        isn't running.
+
+        :param journal: The journal written to.
+        """
+        with self.lock:
+            self.dirty.add(journal)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        return
+
+    def run(self) -> None:
+        """Syncs whatever was written every interval, for ever."""
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self) -> Set['Journal']:
+        """Syncs every journal written since the last round now.
+
+        :return: The journals synced.
+        """
+        with self.lock:
+            journals = self.dirty
+            self.dirty = set()
+        for journal in journals:
+            journal.sync()
+        return journals
+
+
+class Journal:
+    """An append-only log of the changes committed to a ledger since its last
+    full save.
+
+    Each record is a block of tab separated lines closed by a line holding
+    only the commit marker. A record that was cut off before its marker was
+    never committed and is ignored when read back.
+
+    Writes are safe from several threads at once. In SYNC mode whoever wrote
+    a record calls sync() before counting it done, and callers that arrive
+    while a sync is under way wait for the next one together, so a burst of
+    commits costs one sync rather than one each.
+    """
+    COMMIT = 'C'
+    # Syncs journals in ASYNC mode, shared by all of them.
+    flusher = Flusher()
+
+    def __init__(self, location: str, durability: str = NONE) -> None:
+        """
+        :param location: The file the journal is kept in.
+        :param durability: NONE, ASYNC or SYNC.
+        """
+        if durability not in DURABILITY:
+            raise ValueError('Durability must be one of %s.'
+                             % ', '.join(DURABILITY))
+        self.location = location
+        self.durability = durability
+        # How many records have been written since the journal was cleared.
+        self.records = 0
+        # Records written and how many of those are known to be on disk, in
+        # all, and the syncs it took.
+        self.written = 0
+        self.synced = 0
+        self.syncs = 0
+        self.syncing = False
+        self.lock = threading.Condition()
+        return
+
+    def append(self, lines: List[str]) -> None:
+        """Appends a single record to the journal.
+
+        :param lines: The lines making up the record, without newlines.
+        """
+        self.records += 1
+        self.write(lines)
+        return
+
+    def write(self, lines: List[str]) -> int:
+        """Writes a record out without counting it, for when the count was
+        already taken ahead of time.
+
+        :param lines: The lines making up the record, without newlines.
+        :return: The ticket to hand sync() to wait for just this record.
+        """
+        with self.lock:
+            with open(self.location, 'a') as file:
+                file.write('\n'.join(lines) + '\n' + self.COMMIT + '\n')
+            self.written += 1
+            ticket = self.written
+        if self.durability == ASYNC:
+            self.flusher.add(self)
+        return ticket
+
+    def sync(self, ticket: int = 0) -> None:
+        """Waits until records are on disk, syncing them if nobody else is.
+
+        Whoever finds no sync under way syncs everything written so far,
+        anyone arriving meanwhile waits for it to finish and then, if their
+        record came too late for it, for the next.
+
+        :param ticket: How many records must be on disk, 0 for all written.
+        """
+        with self.lock:
+            ticket = ticket or self.written
+            while self.synced < ticket:
+                if self.syncing:
+                    self.lock.wait()
+                    continue
+                self.syncing = True
+                target = self.written
+                self.lock.release()
+                try:
+                    self.fsync()
+                finally:
+                    self.lock.acquire()
+                    self.syncing = False
+                    self.synced = max(self.synced, target)
+                    self.syncs += 1
+                    self.lock.notify_all()
+        return
+
+    def fsync(self) -> None:
+        """Has the OS put the journal's file on disk."""
+        try:
+            fd = os.open(self.location, os.O_RDONLY)
+        except FileNotFoundError:
+            # cleared by a save, which covers everything it held.
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return
+
+    def read(self) -> List[List[str]]:
+        """Reads back every committed record in the journal.
+
+        :return: A list of records, each a list of its lines.
+        """
+        ret = []
+        if not os.path.exists(self.location):
+            return ret
+        record = []
+        with open(self.location, 'r') as file:
+            for line in file.read().splitlines():
+                if line == self.COMMIT:
+                    ret.append(record)
+                    record = []
+                else:
+                    record.append(line)
+        self.records = len(ret)
+        return ret
+
+    def clear(self) -> None:
+        """Empties the journal, should be called once a full save is done."""
+        self.records = 0
+        self.discard()
+        return
+
+    def discard(self) -> None:
+        """Removes the journal's file without touching the count."""
+        with self.lock:
+            if os.path.exists(self.location):
+                os.remove(self.location)
+        return
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+import journal
+from journal import Journal
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def test_unknown_durability(self):
+        with self.assertRaises(ValueError):
+            Journal('journal_test', 'always')
+
+    def test_sync(self):
+        book = Journal('journal_test', journal.SYNC)
+        ticket = book.write(['A\tB'])
+        self.assertEqual(book.synced, 0)
+        book.sync(ticket)
+        self.assertEqual((book.synced, book.syncs), (1, 1))
+        # nothing new to sync.
+        book.sync(ticket)
+        self.assertEqual(book.syncs, 1)
+        self.assertEqual(book.read(), [['A\tB']])
+
+    def test_group_commit(self):
+        book = Journal('journal_test', journal.SYNC)
+        fsync = book.fsync
+
+        def slow_fsync():
+            time.sleep(0.05)
+            fsync()
+        book.fsync = slow_fsync
+
+        def commit(i):
+            book.sync(book.write(['Line%d' % i]))
+        threads = [threading.Thread(target=commit, args=(i,))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(book.synced, 8)
+        self.assertLess(book.syncs, 8)
+        self.assertEqual(len(book.read()), 8)
+
+    def test_sync_after_discard(self):
+        book = Journal('journal_test', journal.SYNC)
+        book.write(['A'])
+        book.discard()
+        book.sync()
+        self.assertEqual(book.synced, 1)
+
+    def test_async(self):
+        book = Journal('journal_test', journal.ASYNC)
+        flusher = journal.Flusher(interval=60)
+        book.flusher = flusher
+        book.write(['A'])
+        self.assertEqual(flusher.dirty, {book})
+        self.assertEqual(flusher.flush(), {book})
+        self.assertEqual(book.synced, 1)
+        self.assertEqual(flusher.dirty, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
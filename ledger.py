@@ -3,9 +3,22 @@ A ledger program file to manage transactions and loot in games.
 
 Not strongly secure, do not depend on it.
 """
-from typing import Union, Mapping, Tuple, NewType
+import os
+from bisect import bisect_left, insort
+from functools import partial
+from typing import (Union, Mapping, Tuple, NewType, List, Callable, Iterable,
+                    Set)
 from item import Items
 from account import Account
+from checkpoints import Checkpoints
+from history import History
+from journal import Journal
+from transaction import Transaction, parse_transaction
+from transfer import Transfer
+from columnar import ColumnarStore
+from files import write_atomic
+import snapshot
+import storage
 
 
 class Ledger:
@@ -26,6 +39,8 @@ class Ledger:
 
     -- handled in chatbot and calls show_balance()
     -+- [Account] Balance
+    -- handled in chatbot and calls balance_at()
+    -+- [Account] Balance at #[Entry]
 
     -- handled in chatbot and calls add_user()
     -+- Add Account [Account Name]
@@ -37,6 +52,10 @@ class Ledger:
     -+- New Item [Item]: [Value]
     -+- Delete Item [Item]
     -+- Show History [Lines]
+    -+- Show History Page [Page]
+    -+- Show History [Account] [Lines]
+    -+- Show History Item [Item] [Lines]
+    -+- Who Has [Item]
     -+- Show Items
     -+- Save
     -+- Load
@@ -47,7 +66,28 @@ class Ledger:
     -+- Toggle Transaction Lock
 
     -+- Total Value
+
+    Every command that changes something should be followed by commit(),
+    which appends just what changed to the journal. save() writes the whole
+    ledger out and empties the journal, commit() does so on its own every
+    snapshot_interval records. How sure commit() makes that the changes
+    reached the disk is up to durability.
     """
+    # Journal records between full saves.
+    snapshot_interval = 100
+    # History entries Show History gives at a time.
+    history_page = 20
+    # Whether save() writes a binary snapshot instead of the .sav, Items csv
+    # and config files.
+    binary_snapshots = False
+    # How far commit() goes before returning, 'none' leaves the journal to
+    # the OS, 'async' has it synced in the background every so often and
+    # 'sync' waits until it is on disk, see journal.py.
+    durability = 'none'
+    # The storage backend to keep ledgers in, a Storage class from
+    # storage.py, None keeps them in save files.
+    storage = None
+
     def __init__(self, name: str, server: str, admin: str, key: str,
                  storekey: str) -> None:
         """
@@ -65,6 +105,9 @@ class Ledger:
         self.location = server
         # A list of users who exist in the system.
         self.users = []
+        # Every account by name, users and system accounts alike, so lookups
+        # don't have to walk the user list.
+        self.accounts = dict()
         # The pot is a non-user, it is a communal pool of value, users can
         # add and remove from it at will, but the pot cannot change anything
         # it is given.
@@ -78,12 +121,70 @@ class Ledger:
         # The bank, the account for the admin who can add and take into the
         # system without worry.
         self.bank = Account(admin, "Bank", key)
-        # The transaction ledger, what all was traded and in what order.
-        self.history = []
         # The location it is saved to.
         self.save_location = "save_%s_%s.sav" % (self.location, self.name)
+        self.snapshot_location = "save_%s_%s.snap" % (self.location, self.name)
+        self.storage_location = "ledger_%s_%s.db" % (self.location, self.name)
+        self.backend = (None if self.storage is None else
+                        self.storage(self.storage_location, self.durability))
+        # The transaction ledger, what all was traded and in what order, and
+        # the account changes made by the command currently running.
+        self.history = (History("history_%s_%s" % (self.location, self.name))
+                        if self.backend is None else self.backend.history())
+        self.changes = []
+        # Every account as it was every so many entries into the history.
+        self.checkpoints = Checkpoints("checkpoint_%s_%s" % (self.location,
+                                                             self.name))
         # The Library of items as we know it.
         self.library = Items()
+        # Running totals over the users and the pot, kept up to date by
+        # account_changed() so Total Value never has to walk everyone.
+        self.total_currency = 0
+        self.total_items = dict()
+        # Who holds what, item -> {account name: count} over every account.
+        self.holders = dict()
+        # Cached worth of each account and of everything together, only good
+        # while the library is still at valued_version.
+        self.worth = dict()
+        self.total_worth = None
+        self.valued_version = -1
+        # Users richest first as (-worth, name), kept sorted so Top only has
+        # to read the front, and the key each user is filed under. Thrown out
+        # along with the worths, None until it's first needed.
+        self.ranking = None
+        self.ranked = dict()
+        # What show_balance() last gave for each account, with the account,
+        # its version and the library's version it was worked out at.
+        self.balances = dict()
+        # NumPy copy of the users and pot for valuing them all at once, only
+        # there once enable_columnar() is called.
+        self.columns = None
+        # Changes since the last commit, accounts touched and what the locks
+        # were.
+        self.dirty = set()
+        self.committed_locks = (False, False, False, False)
+        # What the save on disk is, 'text', 'binary' or None if there isn't
+        # one, and what has changed since it was written. save_lines holds
+        # each account's line of the text save.
+        self.saved = None
+        self.unsaved = set()
+        self.unsaved_items = set()
+        self.saved_locks = (False, False, False, False)
+        self.save_lines = dict()
+        # Saves made and bytes written by them, in all, by part and by the
+        # last save.
+        self.saves = 0
+        self.bytes_written = dict()
+        self.last_save = 0
+        self.journal = Journal("journal_" + self.save_location,
+                               self.durability)
+        # Whether close() was called, the ledger is done with.
+        self.closed = False
+        # While a batch runs, every account change so it can be undone.
+        self.undo = None
+        self.register_account(self.pot)
+        self.register_account(self.store)
+        self.register_account(self.bank)
         # A number of locks to keep things under control.
         self.user_lock = False
         self.transaction_lock = False
@@ -134,22 +235,302 @@ class Ledger:
         :return: The user we are looking for, None if it was not found.
         :rtype: Account, None
         """
-        if account == "Pot":
-            return self.pot
-        if self.is_account_name(account):
-            for i in range(len(self.users)):
-                if account == self.users[i].name:
-                    return self.users[i]
-        else:
+        return self.accounts.get(account)
+
+    def register_account(self, account: Account) -> None:
+        """Adds an account to the name index.
+
+        Every account the ledger knows about must pass through here so that
+        get_account() and is_account_name() stay in sync with it.
+
+        :param account: The account to index.
+        """
+        self.accounts[account.name] = account
+        self.dirty.add(account.name)
+        account.observer = self
+        self.index_holdings(account, account.inventory)
+        if self.in_totals(account):
+            self.add_to_totals(account.value, account.inventory)
+            if self.columns is not None:
+                self.columns.add_account(account)
+        self.worth.pop(account.name, None)
+        self.rank(account)
+        return
+
+    def unregister_account(self, name: str) -> Union[Account, None]:
+        """Removes an account from the name index and the user list.
+
+        The system accounts (Pot, Bank and Store) cannot be removed.
+
+        :param name: The name of the account to drop.
+        :return: The account removed, None if there was nothing to remove.
+        """
+        if name in ['Pot', 'Bank', 'Store']:
             return None
+        account = self.accounts.pop(name, None)
+        if account is not None:
+            self.users.remove(account)
+            self.dirty.add(name)
+            account.observer = None
+            for item in account.inventory:
+                self.drop_holder(item, name)
+            self.add_to_totals(-account.value,
+                               {item: -amount for item, amount in
+                                account.inventory.items()})
+            if self.columns is not None:
+                self.columns.remove_account(name)
+            self.worth.pop(name, None)
+            self.balances.pop(name, None)
+            self.unrank(name)
+        return account
+
+    def enable_columnar(self) -> bool:
+        """Starts keeping a NumPy copy of the users and pot, which Total
+        Value and Rectify are then worked out from.
+
+        :return: True if it is on, False if numpy isn't available.
+        """
+        try:
+            self.columns = ColumnarStore(self.library)
+        except ImportError:
+            self.columns = None
+            return False
+        for account in self.accounts.values():
+            if self.in_totals(account):
+                self.columns.add_account(account)
+        return True
+
+    def in_totals(self, account: Account) -> bool:
+        """Whether an account counts towards the ledger's totals.
+
+        The Bank and the Store sit outside the economy, everyone else counts.
+
+        :param account: The account to check.
+        :return: True if it is a user or the pot.
+        """
+        return account is not self.bank and account is not self.store
+
+    def add_to_totals(self, value: float, items: Mapping[str, int]) -> None:
+        """Shifts the running totals by the amounts given.
+
+        :param value: Currency to add, negative to remove.
+        :param items: Items to add, negative counts to remove.
+        """
+        self.check_valuation()
+        self.total_currency += value
+        for item, amount in items.items():
+            count = self.total_items.get(item, 0) + amount
+            if count:
+                self.total_items[item] = count
+            else:
+                self.total_items.pop(item, None)
+        if self.total_worth is not None:
+            self.total_worth += value + self.library.value_of(items)
+        return
+
+    def account_changed(self, account: Account, value: float,
+                        items: Mapping[str, int]) -> None:
+        """Called by an account whenever its value or items change.
+
+        :param account: The account that changed.
+        :param value: The change in currency.
+        :param items: The change in each item.
+        """
+        self.check_valuation()
+        self.dirty.add(account.name)
+        self.changes.append((account.name, value, tuple(items.items())))
+        self.index_holdings(account, items)
+        if self.undo is not None:
+            self.undo.append((account, value, items))
+        if self.in_totals(account):
+            self.add_to_totals(value, items)
+            if self.columns is not None:
+                self.columns.account_changed(account, value, items)
+        if account.name in self.worth:
+            self.worth[account.name] += value + self.library.value_of(items)
+        self.rank(account)
+        return
+
+    def index_holdings(self, account: Account, items: Iterable[str]) -> None:
+        """Brings the holder index up to date with an account's counts.
+
+        :param account: The account.
+        :param items: The items whose counts may have changed.
+        """
+        for item in items:
+            count = account.inventory.get(item, 0)
+            if count:
+                self.holders.setdefault(item, dict())[account.name] = count
+            else:
+                self.drop_holder(item, account.name)
+        return
+
+    def drop_holder(self, item: str, name: str) -> None:
+        """Takes an account out of an item's holders.
+
+        :param item: The item.
+        :param name: The account's name.
+        """
+        holders = self.holders.get(item)
+        if holders is not None:
+            holders.pop(name, None)
+            if not holders:
+                del self.holders[item]
+        return
+
+    def who_has(self, item: str) -> Mapping[str, int]:
+        """
+        :param item: The item.
+        :return: How many of it each account holding it has, by name.
+        """
+        return dict(self.holders.get(item, {}))
+
+    def holders_of(self, items: Iterable[str]) -> Mapping[str, Mapping[str, int]]:
+        """who_has() for several items at once.
+
+        :param items: The items.
+        :return: For each item, how many each account holding it has.
+        """
+        return {item: self.who_has(item) for item in items}
+
+    def holding_any(self, items: Iterable[str]) -> Set[str]:
+        """
+        :param items: The items.
+        :return: The names of accounts holding at least one of them.
+        """
+        ret = set()
+        for item in items:
+            ret.update(self.holders.get(item, ()))
+        return ret
+
+    def reprice(self, item: str, old: float) -> None:
+        """Brings cached worths up to date after an item's value changed,
+        touching only the accounts holding it.
+
+        Only call it when the caches were good right up to the change.
+
+        :param item: The item revalued.
+        :param old: What it counted for before, as library.worth() gave it.
+        """
+        change = self.library.worth(item) - old
+        self.valued_version = self.library.version
+        for name, count in self.holders.get(item, {}).items():
+            if name in self.worth:
+                self.worth[name] += change * count
+            self.rank(self.accounts[name])
+        if self.total_worth is not None:
+            self.total_worth += change * self.total_items.get(item, 0)
+        return
+
+    def show_holders(self, item: str) -> str:
+        """Shows who holds an item, most first.
+
+        :param item: The item.
+        :return: Each account holding it and how many.
+        """
+        holders = self.holders.get(item)
+        if not holders:
+            return 'Nobody has %s.\n' % item
+        return '%s is held by:\n' % item + ''.join(
+            '%s: %d\n' % (name, count) for name, count in
+            sorted(holders.items(), key=lambda i: (-i[1], i[0])))
+
+    def check_valuation(self) -> None:
+        """Throws out cached worths if the library's values have changed."""
+        if self.valued_version != self.library.version:
+            self.worth = dict()
+            self.total_worth = None
+            self.ranking = None
+            self.ranked = dict()
+            self.valued_version = self.library.version
+        return
+
+    def rank(self, account: Account) -> None:
+        """Moves a user to wherever their worth now puts them in the ranking,
+        if there is one.
+
+        :param account: The account that changed.
+        """
+        if self.ranking is None or account.name in ['Pot', 'Bank', 'Store']:
+            return
+        worth = self.account_worth(account)
+        # valuing it may have found the library changed and thrown it out.
+        if self.ranking is None:
+            return
+        self.unrank(account.name)
+        key = self.ranked[account.name] = (-worth, account.name)
+        insort(self.ranking, key)
+        return
+
+    def unrank(self, name: str) -> None:
+        """Takes a user out of the ranking.
+
+        :param name: The user's name.
+        """
+        key = self.ranked.pop(name, None)
+        if key is not None:
+            del self.ranking[bisect_left(self.ranking, key)]
+        return
+
+    def top(self, count: int = 10) -> str:
+        """Shows the richest users, by worth.
+
+        The ranking is kept up to date as accounts and values change, so only
+        the first time after the library changes in a way reprice() didn't
+        follow does everyone have to be valued and sorted.
+
+        :param count: How many users to show.
+        :return: Each of them and their worth, richest first.
+        """
+        self.check_valuation()
+        if self.ranking is None:
+            self.ranked = {i.name: (-self.account_worth(i), i.name)
+                           for i in self.users}
+            self.ranking = sorted(self.ranked.values())
+        if not self.ranking:
+            return 'No accounts.\n'
+        return ''.join('%d. %s: %d\n' % (place, name, -worth)
+                       for place, (worth, name) in
+                       enumerate(self.ranking[:max(count, 1)], 1))
+
+    def account_worth(self, account: Account) -> float:
+        """The total value of an account, currency and items together.
+
+        :param account: The account to value.
+        :return: Its currency plus the value of every valued item it holds.
+        """
+        self.check_valuation()
+        if account.name not in self.worth:
+            self.worth[account.name] = (float(account.value) +
+                                        self.library.value_of(account.inventory))
+        return self.worth[account.name]
 
     def __del__(self) -> None:
         """ When this is deleted it should automatically save. We don't want to
         lose our data do we?
         """
-        self.save()
+        if not self.closed and self.has_changes():
+            self.save()
+        return
+
+    def close(self) -> None:
+        """Lets go of the storage backend, once the ledger is written out
+        for the last time. Nothing is saved after, not even on delete."""
+        self.closed = True
+        if self.backend is not None:
+            self.backend.close()
         return
 
+    def has_changes(self) -> bool:
+        """Whether anything has changed since the last commit or save.
+
+        :return: True if there is something that hasn't been written out.
+        """
+        return bool(self.dirty or self.library.changed
+                    or self.history.unflushed()
+                    or self.checkpoints.pending
+                    or self.committed_locks != self.locks())
+
     def show_users(self) -> str:
         """ Returns string of all current accounts.
 
@@ -172,7 +553,7 @@ class Ledger:
         """
         if self.user_lock:
             return False, 'No new Users allowed.\n'
-        elif any(i.name == name for i in self.users):
+        elif name in self.accounts:
             return False, 'User already exists.\n'
         if value < 0:
             return False, 'Cannot start with negative value.\n'
@@ -186,9 +567,10 @@ class Ledger:
             if item not in self.library.library:  # if item doesn't exist add
                 self.library.new_item(name=item, value=-1)  # Item at default
         self.users.append(Account(owner, name, key, value, items))
-        self.history.append('{0.name} account added with {0.value}gp and '
-                            '{1}.'.format(self.users[-1],
-                                          self.users[-1].item_list()))
+        self.register_account(self.users[-1])
+        self.changes = [(name, value, tuple(items.items()))]
+        self.record(owner, 'open', '{0.name} account added with {0.value}gp '
+                    'and {1}.'.format(self.users[-1], self.users[-1].item_list()))
         return True, '%s account added.\n' % name
 
     def is_account_name(self, name: str) -> bool:
@@ -197,9 +579,7 @@ class Ledger:
         :param name: The name of the account to check.
         :return: True if there, false otherwise.
         """
-        if name in ['Pot', 'Bank', 'Store']:
-            return True
-        return name in [user.name for user in self.users]
+        return name in self.accounts
 
     def item_list(self) -> str:
         """Gets a list of all items and their current value.
@@ -218,12 +598,17 @@ class Ledger:
         :param key: The key of the user to check against.
         :return: A string of anything that happened and if it's successful.
         """
-        data = command.lstrip('Set Value ')
-        item, value = data.split(':')
+        data = command[len('Set Value '):]
+        try:
+            item, value = data.split(':')
+            value = float(value.strip())
+        except ValueError:
+            return 'Must be in Set Value [Item]: [Value] format.\n'
+        item = item.strip()
         if item not in self.library.library:
             return 'Item Not found.\n'
-        item = item.strip()
-        value = float(value.strip())
+        valued = self.valued_version == self.library.version
+        old = self.library.worth(item)
         if key == self.bank.key:
             if value in [-1, -2] or value > 0:
                 self.library.change_value(item, value)
@@ -234,7 +619,9 @@ class Ledger:
             if value < 0:
                 return "Value must be non-negative."
             self.library.change_value(item, value)
-        self.history.append(command)
+        if valued:
+            self.reprice(item, old)
+        self.record('Bank' if key == self.bank.key else '', 'value', command)
         return "Value properly set."
 
     def transaction(self, command: str, key: str) -> str:
@@ -259,75 +646,36 @@ class Ledger:
         """
         if self.transaction_lock:
             return 'Transactions locked.\n'
-        giver = ""
-        taker = ""
-        action = ""
-        value = ""
-        items = ""
-        ret = ''
+        self.changes = []
         # special op, while it doesn't move anything around, it is still
         # recorded and so put here.
         if command.startswith("Set Value"):
             return self.set_value(command, key)
+        record = parse_transaction(command)
+        if isinstance(record, str):
+            return record
+        return self.execute(record, key)
+
+    def execute(self, record: Transaction, key: str) -> str:
+        """Carries out a parsed transaction.
 
-        words = command.split(" ")
-        if len(words) < 3:
-            return 'Command not Recognized.\n'
-        # giver
-        giver = words[0]
+        :param record: The transaction as parse_transaction() gave it.
+        :param key: The key we use for security.
+        :return: An empty string on success, the error otherwise.
+        """
+        ret = ''
+        command = record.command
+        giver = record.giver
+        taker = record.taker
+        action = record.action
+        value = record.value
+        items_fin = record.item_dict()
         if giver != 'Bank' and not self.is_account_name(giver):
             return 'Account does not exist.\n'
-        # taker
-        if words[1] == 'gives':
-            taker = words[2]
-            action = 'give'
-        elif words[1] == 'takes' and words[2] == 'from':
-            taker = words[3]
-            action = 'take'
-        elif words[1] in ['buys', 'sells']:
-            taker = 'Store'
-            action = words[1][:-1]
-        else:
-            return 'Command not Recognized.\n'
-        if ':' in taker:
-            taker = taker.replace(':', '')
-        if taker not in ['Bank', 'Pot', 'Store'] and not self.is_account_name(taker):
+        if not self.is_account_name(taker):
             return "Account does not exist.\n"
         if giver == taker:
             return "Cannot make a transaction with yourself.\n"
-        # inputs
-        try:
-            inputs = ""
-            if action in ['give', 'take']:
-                inputs = command.split(':', 1)[1]
-            elif action in ['buy', 'sell']:
-                inputs = command.split(" ", 2)[2]
-            inputs = inputs.split(',')
-            # value
-            if len(inputs) == 1:
-                if ':' in inputs[0]:
-                    items = inputs
-                    value = 0
-                else:
-                    value = float(inputs[0])
-                    items = {}
-            elif ':' not in inputs[0]:
-                value = float(inputs[0])
-                items = inputs[1:]
-            else:
-                value = 0
-                items = inputs
-        except IndexError:
-            return "Improper Syntax.\n"
-        # items
-        items_fin = {}
-        for item in items:
-            if not item:  # if empty, ignore
-                continue
-            if ':' not in item:
-                return "Item must be in [Item]:[Amount] format.\n"
-            name, amount = item.split(':')
-            items_fin[name.strip()] = int(amount)
         if giver == 'Bank':  # Bank actions  ---------
             if self.bank_lock:
                 return 'Bank Locked.\n'
@@ -344,7 +692,7 @@ class Ledger:
                 # bank can take without reservation.
                 ret = self.get_account(taker).take(value=value, items=items_fin)
             if not ret:
-                self.history.append(command)
+                self.record(giver, action, command)
             return ret
         elif taker == 'Store':
             if self.store_lock:
@@ -370,53 +718,95 @@ class Ledger:
                 return ret
             price = 0
             if action == 'buy':
-                price = sum([amount*self.library.library[name] for name, amount in items_fin.items()])
-                ret = self.get_account(giver).remove(key=key, value=price)
-                if not ret:
-                    ret = self.get_account(giver).add(items=items_fin)
+                price = self.library.value_of(items_fin)
+                account = self.get_account(giver)
+                ret = Transfer().take(account, value=price, key=key).give(
+                    account, items=items_fin).apply()
                 if ret:
                     return ret
             elif action == 'sell':
-                price = sum([amount*self.library.library[name] for name, amount in items_fin.items()])
-                ret = self.get_account(giver).remove(items=items_fin, key=key)
-                if not ret:
-                    ret = self.get_account(giver).add(value=price)
+                price = self.library.value_of(items_fin)
+                account = self.get_account(giver)
+                ret = Transfer().take(account, items=items_fin, key=key).give(
+                    account, value=price).apply()
                 if ret:
                     return ret
-            self.history.append(command + " for %d." % price)
+            self.record(giver, action, command + " for %d." % price)
         elif taker == 'Pot':
             if action == 'give':
-                ret = self.get_account(giver).remove(value=value, items=items_fin, key=key)
-                if not ret:
-                    ret = self.pot.add(value=value, items=items_fin)
+                ret = Transfer().take(self.get_account(giver), value, items_fin,
+                                      key).give(self.pot, value,
+                                                items_fin).apply()
                 if ret:
                     return ret
-                self.history.append(command)
+                self.record(giver, action, command)
             elif action == 'take':
-                ret = self.pot.remove(value=value, items=items_fin, key="")
-                if not ret:
-                    ret = self.get_account(giver).add(value=value, items=items_fin)
+                ret = Transfer().take(self.pot, value, items_fin, "").give(
+                    self.get_account(giver), value, items_fin).apply()
                 if ret:
                     return ret
-                self.history.append(command)
+                self.record(giver, action, command)
         elif taker == 'Bank':
-            ret = self.get_account(giver).remove(value=value, items=items_fin,
-                                                 key=key)
-            if not ret:
-                ret = self.bank.add(value=value, items=items_fin)
+            ret = Transfer().take(self.get_account(giver), value, items_fin,
+                                  key).give(self.bank, value,
+                                            items_fin).apply()
             if ret:
                 return ret
-            self.history.append(command)
+            self.record(giver, action, command)
         else:
-            ret = self.get_account(giver).remove(value=value, items=items_fin,
-                                                 key=key)
-            if not ret:
-                ret = self.get_account(taker).add(value=value, items=items_fin)
+            ret = Transfer().take(self.get_account(giver), value, items_fin,
+                                  key).give(self.get_account(taker), value,
+                                            items_fin).apply()
             if ret:
                 return ret
-            self.history.append(command)
+            self.record(giver, action, command)
         return ret
 
+    def apply_batch(self, commands: List[str], key: str) -> str:
+        """Runs several transactions as one, either all of them go through or
+        none of them do.
+
+        Each command is run as transaction() would run it while every change
+        is noted down. If any of them fails everything done so far is put
+        back, history and library included. Nothing is written out here, a
+        single commit() afterwards covers the whole batch.
+
+        :param commands: The transaction commands, in order.
+        :param key: The key we use for security.
+        :return: An empty string if all of it went through, otherwise which
+            line failed and why.
+        """
+        history = len(self.history)
+        library = dict(self.library.library)
+        changed = set(self.library.changed)
+        dirty = set(self.dirty)
+        self.undo = []
+        try:
+            for line, command in enumerate(commands, 1):
+                command = command.strip()
+                if not command:
+                    continue
+                ret = self.transaction(command, key)
+                if ret and command.startswith("Set Value"):
+                    ret = '' if ret == "Value properly set." else ret
+                if ret:
+                    break
+            else:
+                return ''
+            undo = self.undo
+            self.undo = None
+            for account, value, items in reversed(undo):
+                account.adjust(-value, {item: -amount for item, amount in
+                                        items.items()})
+            self.history.truncate(history)
+            self.checkpoints.truncate(history)
+            self.library.restore(library)
+            self.library.changed = changed
+            self.dirty = dirty
+            return 'Line %d: %s' % (line, ret)
+        finally:
+            self.undo = None
+
     def show_balance(self, account: str) -> Tuple[float, Mapping[str, int], float, str]:
         """Shows the balance of an account.
         Value and all items, and the total value including items.
@@ -425,17 +815,62 @@ class Ledger:
         :param key: The key of the account
         :return: A string of the balance.
         """
-        if not self.is_account_name(account):
+        acc = self.get_account(account)
+        if acc is None:
             return 0, {}, 0, "Account does not exist.\n"
-        value = self.get_account(account=account).value
-        items = self.get_account(account=account).inventory
-        total_value = float(value) + sum([amount*self.library.library[item] if self.library.library[item] >= 0 else 0
-                                          for item, amount in items.items()])
+        cached = self.balances.get(account)
+        if (cached is not None and cached[0] is acc
+                and cached[1] == acc.version
+                and cached[2] == self.library.version):
+            return cached[3]
+        value = acc.value
+        items = acc.inventory
+        total_value = self.account_worth(acc)
         items_str = '\n'
         names = sorted([i for i in items.keys()])
         for name in names:
             items_str += '%s:%d, \n' % (name, items[name])
-        return value, items, total_value, "%s has %d and %s Total value of %d.\n" % (account, value, items_str, total_value)
+        ret = value, items, total_value, "%s has %d and %s Total value of %d.\n" % (account, value, items_str, total_value)
+        self.balances[account] = (acc, acc.version, self.library.version, ret)
+        return ret
+
+    def balance_at(self, account: str, entry: int) -> str:
+        """Works out an account's balance as it stood right after an entry
+        in the history.
+
+        Starts from the last checkpoint before the entry and adds up the
+        account's changes since, so it never goes through more than a
+        checkpoint interval's worth of the account's entries. Entries from
+        before history kept changes count for nothing.
+
+        :param account: The account.
+        :param entry: The entry's number.
+        :return: A string of the balance.
+        """
+        if not 0 <= entry < len(self.history):
+            return 'There is no entry #%d.\n' % entry
+        start = self.checkpoints.nearest(entry + 1)
+        balance = self.checkpoints.balance(start, account) if start else None
+        existed = balance is not None
+        value, items = balance if existed else (0, dict())
+        for record in self.history.of_account_between(account, start,
+                                                      entry + 1):
+            for name, change, moved in record.changes:
+                if name != account:
+                    continue
+                existed = True
+                value += change
+                for item, amount in moved:
+                    count = items.get(item, 0) + amount
+                    if count:
+                        items[item] = count
+                    else:
+                        items.pop(item, None)
+        if not existed:
+            return '%s did not exist at #%d.\n' % (account, entry)
+        items_str = ''.join('%s:%d, ' % (name, items[name])
+                            for name in sorted(items))
+        return '%s had %d and %sat #%d.\n' % (account, value, items_str, entry)
 
     def total_value(self) -> Tuple[float, Mapping[str, int], float, str]:
         """Retrieves the total value of the pot and all users combined.
@@ -443,25 +878,14 @@ class Ledger:
         :return: Returns the value, all items in a single dict, total value,
          and a string form of this info.
         """
-        value = 0
-        coll_items = {}
-        for user in self.users:
-            value += user.value
-            for item, amount in user.inventory.items():
-                if item in coll_items:
-                    coll_items[item] += amount
-                else:
-                    coll_items[item] = amount
-        # do the same for the pot.
-        value += self.pot.value
-        for item, amount in self.pot.inventory.items():
-            if item in coll_items:
-                coll_items[item] += amount
-            else:
-                coll_items[item] = amount
-
-        total_value = value + sum([amount*self.library.library[item] if self.library.library[item] >= 0 else 0
-                                   for item, amount in coll_items.items()])
+        value = self.total_currency
+        coll_items = dict(self.total_items)
+        self.check_valuation()
+        if self.total_worth is None and self.columns is not None:
+            self.total_worth = self.columns.total()
+        elif self.total_worth is None:
+            self.total_worth = value + self.library.value_of(coll_items)
+        total_value = self.total_worth
         items_str = ''
         for item, amount in coll_items.items():
             items_str += '%s:%d, ' % (item, amount)
@@ -469,6 +893,16 @@ class Ledger:
         ret = 'Everyone together holds %d and %s for a total value of %d.\n' % (value, items_str, total_value)
         return value, coll_items, total_value, ret
 
+    def account_worths(self) -> Mapping[str, float]:
+        """The worth of every user and the pot.
+
+        :return: Each account's currency plus the value of its items, by name.
+        """
+        if self.columns is not None:
+            return self.columns.worths()
+        return {account.name: self.account_worth(account)
+                for account in self.users + [self.pot]}
+
     def show_rectify(self) -> str:
         """Shows the current value difference between all users and the average.
 
@@ -478,8 +912,13 @@ class Ledger:
         """
         ret = ''
         ave_value = self.total_value()[2]/len(self.users)
+        if self.columns is not None:
+            worths = self.columns.worths()
+            for user in self.users:
+                ret += '%s: %d\n' % (user.name, ave_value-worths[user.name])
+            return ret
         for user in self.users:
-            ret += '%s: %d\n' % (user.name, ave_value-self.show_balance(user.name)[2])
+            ret += '%s: %d\n' % (user.name, ave_value-self.account_worth(user))
         return ret
 
     def toggle_user_lock(self) -> None:
@@ -510,35 +949,347 @@ class Ledger:
         self.bank_lock = not self.bank_lock
         return
 
+    def locks(self) -> Tuple[bool, bool, bool, bool]:
+        """The current state of all four locks.
+
+        :return: The user, transaction, store and bank locks in that order.
+        """
+        return (self.user_lock, self.transaction_lock, self.store_lock,
+                self.bank_lock)
+
+    def record(self, actor: str, action: str, text: str) -> None:
+        """Adds an entry to the history along with every account change made
+        since the command began.
+
+        :param actor: Who did it.
+        :param action: What kind of thing they did.
+        :param text: The line Show History gives for it.
+        """
+        self.history.append(actor, action, text, self.changes)
+        self.changes = []
+        return
+
+    def take_checkpoint(self) -> None:
+        """Takes a checkpoint if the history has passed another interval
+        since the last, see Checkpoints. Only the accounts are copied here,
+        the snapshot is built when it is written out."""
+        count = len(self.history)
+        if self.checkpoints.due(count):
+            self.checkpoints.take(count, [
+                self.stored_account(i.owner, i.name, i.key, i.value,
+                                    dict(i.inventory))
+                for i in [self.bank, self.store, self.pot] + self.users],
+                dict(self.library.library), self.locks())
+        return
+
+    def prepare_history(self) -> Union[Callable[[], None], None]:
+        """Gets what writes out the history and checkpoints not yet written.
+
+        :return: The function doing the writing, None if there's nothing.
+        """
+        self.take_checkpoint()
+        writes = [i for i in (self.history.prepare_flush(),
+                              self.checkpoints.prepare_flush()) if i]
+        if not writes:
+            return None
+        return partial(self.write_all, *writes)
+
+    def import_history(self, line: str) -> None:
+        """Adds a line of history from before it was kept as records, what
+        it did to each account was never kept.
+
+        :param line: The line as it was saved.
+        """
+        record = parse_transaction(line)
+        if isinstance(record, Transaction):
+            self.history.append(record.giver, record.action, line)
+        else:
+            self.history.append('', '', line)
+        return
+
+    def journal_record(self) -> List[str]:
+        """Builds a journal record of everything changed since the last
+        commit and marks it all as committed.
+
+        History isn't part of it, it goes to its own log.
+
+        :return: The lines of the record, empty if nothing has changed.
+        """
+        ret = []
+        for name in self.dirty:
+            account = self.accounts.get(name)
+            if account is None:
+                ret.append('R\t%s' % name)
+            else:
+                ret.append('A\t' + account.save_data())
+        for item in self.library.changed:
+            if item in self.library.library:
+                ret.append('I\t%s\t%r' % (item, self.library.library[item]))
+            else:
+                ret.append('X\t%s' % item)
+        if self.locks() != self.committed_locks:
+            ret.append('L\t' + '\t'.join(str(i) for i in self.locks()))
+        self.mark_committed()
+        return ret
+
+    def mark_committed(self) -> None:
+        """Marks the current state as written out, what changed is kept
+        until the next save."""
+        self.unsaved.update(self.dirty)
+        self.unsaved_items.update(self.library.changed)
+        self.dirty = set()
+        self.library.changed = set()
+        self.committed_locks = self.locks()
+        return
+
+    def commit(self) -> None:
+        """Writes whatever changed since the last commit to the journal.
+
+        Once the journal grows past snapshot_interval records the whole
+        ledger is saved and the journal started over. The first commit of a
+        new ledger is a full save too, so there is a save to replay onto.
+        """
+        write = self.prepare_commit()
+        if write is not None:
+            write()
+            self.sync()
+        return
+
+    def sync(self) -> None:
+        """Waits until everything committed is on disk if the ledger's
+        durability is 'sync', commits on other threads share the wait. A
+        storage backend is done once its write returns."""
+        if self.backend is None and self.journal.durability == 'sync':
+            self.journal.sync()
+        return
+
+    def prepare_commit(self) -> Union[Callable[[], None], None]:
+        """Works out everything commit() would write without writing it.
+
+        Everything that reads the ledger happens here, so the function
+        returned only touches the disk and can be run on another thread.
+        Writes for the same ledger must still be run in the order they were
+        prepared.
+
+        :return: The function doing the writing, None if nothing changed.
+        """
+        if self.backend is not None:
+            return self.prepare_backend_write()
+        # the journal is replayed on top of a save, until there is one
+        # everything goes into a full save.
+        if self.saved is None:
+            return self.prepare_save()
+        record = self.journal_record()
+        history = self.prepare_history()
+        if not record:
+            return history
+        if self.journal.records + 1 >= self.snapshot_interval:
+            return partial(self.write_all, history, self.prepare_save())
+        self.journal.records += 1
+        return partial(self.write_all, history,
+                       partial(self.journal.write, record))
+
+    @staticmethod
+    def write_all(*writes: Union[Callable[[], None], None]) -> None:
+        """Runs prepared writes in order.
+
+        :param writes: The writes, any that are None are skipped.
+        """
+        for write in writes:
+            if write is not None:
+                write()
+        return
+
+    def prepare_save(self) -> Callable[[], None]:
+        """Works out everything save() would write without writing it.
+
+        Only the parts changed since the last save are written, the save file
+        if any account changed, with only those accounts' lines built again,
+        the config if the locks changed and the Items csv if the library did.
+        A binary snapshot is a single file, it is written if anything changed.
+
+        :return: The function doing the writing, see prepare_commit().
+        """
+        if self.backend is not None:
+            return self.prepare_backend_write()
+        kind = 'binary' if self.binary_snapshots else 'text'
+        whole = self.saved != kind
+        accounts = self.unsaved | self.dirty
+        items = self.unsaved_items | self.library.changed
+        locks = self.locks() != self.saved_locks
+        history = self.prepare_history()
+        if self.binary_snapshots:
+            data = None
+            if whole or accounts or items or locks:
+                data = snapshot.dump(
+                    [self.bank, self.store, self.pot] + self.users,
+                    self.library.library, self.locks())
+            self.mark_saved(kind)
+            return partial(self.write_snapshot, data, history)
+        data = config = library = None
+        if whole or accounts:
+            if whole:
+                self.save_lines = dict()
+            for name in accounts:
+                self.save_lines.pop(name, None)
+            lines = self.save_lines
+            for account in [self.bank, self.store, self.pot] + self.users:
+                if account.name not in lines:
+                    lines[account.name] = account.save_data() + '\n'
+            # All small lines are separated by \n big seperations by \n\n,
+            # the history section is left empty now history has its own
+            # files.
+            data = ''.join(lines[i.name] for i in
+                           [self.bank, self.store, self.pot] + self.users)
+            data += '\n\n'
+        if whole or locks:
+            config = (str(self.user_lock) + "\n" + str(self.transaction_lock)
+                      + "\n" + str(self.store_lock) + "\n"
+                      + str(self.bank_lock))
+        self.library.set_save_location(self.save_location)
+        if whole or items:
+            library = self.library.dump()
+        self.mark_saved(kind)
+        return partial(self.write_save, data, config, library, history)
+
+    def prepare_backend_write(self) -> Callable[[], None]:
+        """Works out what to hand the storage backend, which keeps commits
+        and saves alike, everything the first time and only what changed
+        after.
+
+        :return: The function doing the writing, see prepare_commit().
+        """
+        whole = self.saved != 'storage'
+        accounts = self.unsaved | self.dirty
+        if whole:
+            accounts = [self.bank, self.store, self.pot] + self.users
+        else:
+            accounts = [self.accounts[i] for i in accounts
+                        if i in self.accounts]
+        items = self.unsaved_items | self.library.changed
+        if whole:
+            items = self.library.library
+        changes = storage.Changes(
+            storage.stored_accounts(accounts),
+            [i for i in self.unsaved | self.dirty if i not in self.accounts],
+            {i: self.library.library[i] for i in items
+             if i in self.library.library},
+            [i for i in items if i not in self.library.library],
+            self.locks() if whole or self.locks() != self.saved_locks
+            else None,
+            self.history.take_pending(), whole)
+        self.take_checkpoint()
+        self.mark_saved('storage')
+        return partial(self.write_all, partial(self.backend.write, changes),
+                       self.checkpoints.prepare_flush())
+
+    def mark_saved(self, kind: str) -> None:
+        """Marks the current state as saved, and so committed too.
+
+        :param kind: 'text', 'binary' or 'storage', which kind of save it
+            was.
+        """
+        self.mark_committed()
+        self.journal.records = 0
+        self.saved = kind
+        self.unsaved = set()
+        self.unsaved_items = set()
+        self.saved_locks = self.locks()
+        return
+
+    def write_save(self, data: Union[str, None], config: Union[str, None],
+                   items: Union[str, None],
+                   history: Union[Callable[[], None], None] = None) -> None:
+        """Writes out a save prepared by prepare_save().
+
+        :param data: The accounts, None if unchanged.
+        :param config: The locks, None if unchanged.
+        :param items: The item library, None if unchanged.
+        :param history: Writes any history not yet written out.
+        """
+        if history is not None:
+            history()
+        # the journal is thrown away next, so unless durability is 'none' the
+        # save has to be on disk first.
+        sync = self.journal.durability != 'none'
+        written = dict()
+        if data is not None:
+            written['accounts'] = write_atomic(self.save_location, data,
+                                                sync)
+        # save our smaller data to a config file.
+        if config is not None:
+            written['config'] = write_atomic("config_" + self.save_location,
+                                             config, sync)
+        # we save the items separately from our transactions and users.
+        if items is not None:
+            written['items'] = write_atomic(self.library.save_location, items,
+                                            sync)
+        # an older snapshot would be loaded in place of this.
+        if os.path.exists(self.snapshot_location):
+            os.remove(self.snapshot_location)
+        self.journal.discard()
+        self.count_save(written)
+        return
+
+    def write_snapshot(self, data: Union[bytes, None],
+                       history: Union[Callable[[], None], None] = None) -> None:
+        """Writes out a binary snapshot prepared by prepare_save().
+
+        :param data: The snapshot, None if nothing changed.
+        :param history: Writes any history not yet written out.
+        """
+        if history is not None:
+            history()
+        # see write_save().
+        sync = self.journal.durability != 'none'
+        written = dict()
+        if data is not None:
+            written['snapshot'] = write_atomic(self.snapshot_location, data,
+                                                sync)
+        self.journal.discard()
+        self.count_save(written)
+        return
+
+    def count_save(self, written: Mapping[str, int]) -> None:
+        """Adds a save's writes to the totals.
+
+        :param written: Bytes written to each part of the save.
+        """
+        self.saves += 1
+        self.last_save = sum(written.values())
+        for part, count in written.items():
+            self.bytes_written[part] = self.bytes_written.get(part, 0) + count
+        return
+
+    def save_stats(self) -> str:
+        """
+        :return: How many saves there have been and what they wrote.
+        """
+        return ('%d saves, %d bytes written by the last.\n' % (
+            self.saves, self.last_save) + ''.join(
+            '%s: %d bytes\n' % i for i in sorted(self.bytes_written.items())))
+
     def save(self) -> None:
         """ Save function. Can be called as needed, guaranteed to be called on
         close.
         """
-        with open(self.save_location, 'w') as file:
-            # first lines should have the current totals for each account
-            # All small lines are separated by \n big seperations by \n\n
-            file.write(self.bank.save_data()+"\n")
-            file.write(self.store.save_data()+'\n')
-            file.write(self.pot.save_data()+'\n')
-            for i in self.users:
-                file.write(i.save_data()+'\n')
-            file.write("\n\n")
-            # we save the items separately from our transactions and users.
-            # last we write the full transaction history.
-            file.write(self.transaction_log())
-        # save our smaller data to a config file.
-        with open("config_" + self.save_location, 'w') as file:
-            file.write(str(self.user_lock) + "\n" + str(self.transaction_lock)
-                       + "\n" + str(self.store_lock) + "\n"
-                       + str(self.bank_lock))
-        self.library.set_save_location(self.save_location)
-        self.library.save_data()
+        self.prepare_save()()
         return
 
+    def has_save(self) -> bool:
+        """
+        :return: Whether there is anything for load_save() to load.
+        """
+        if self.backend is not None:
+            return self.backend.exists()
+        return (os.path.exists(self.save_location)
+                or os.path.exists(self.snapshot_location)
+                or os.path.exists(self.journal.location))
+
     def load_config(self) -> None:
         """Config loading file"""
         with open("config_"+self.save_location, 'r') as file:
-            lines = file.readlines()
+            lines = file.read().splitlines()
             self.user_lock = lines[0] == 'True'
             self.transaction_lock = lines[1] == 'True'
             self.store_lock = lines[2] == 'True'
@@ -546,7 +1297,58 @@ class Ledger:
         return
 
     def load_save(self) -> None:
-        """Load save file."""
+        """Load the snapshot if there is one, otherwise the save file and its
+        config, then anything journaled since. A ledger that was never saved
+        is built from its journal alone.
+
+        Only the end of the history is read, the rest waits until something
+        asks for it.
+        """
+        if self.backend is not None:
+            if not self.backend.exists():
+                raise FileNotFoundError('%s holds no ledger.'
+                                        % self.storage_location)
+            stored = self.backend.load()
+            self.restore_state([self.stored_account(*i)
+                                for i in stored.accounts],
+                               stored.library, stored.locks)
+            self.history.load()
+            self.checkpoints.seen = len(self.history)
+            self.mark_saved('storage')
+            return
+        legacy = []
+        if os.path.exists(self.snapshot_location):
+            self.load_snapshot()
+            kind = 'binary'
+        elif (os.path.exists(self.save_location)
+              or not os.path.exists(self.journal.location)):
+            legacy = self.load_text()
+            kind = 'text'
+        else:
+            # only ever journaled, the journal holds all of it.
+            kind = None
+        self.history.load()
+        self.checkpoints.seen = len(self.history)
+        # saves from before the history had its own files carry it.
+        if not len(self.history):
+            for line in legacy:
+                if line:
+                    self.import_history(line)
+        records = self.journal.read()
+        for record in records:
+            self.replay(record)
+        # the save on disk is what was just loaded, unless the journal added
+        # to it, then all of it is written next save.
+        self.mark_saved(None if records else kind)
+        self.journal.records = len(records)
+        return
+
+    def load_text(self) -> List[str]:
+        """Loads the save file, the Items csv and the config.
+
+        :return: The history section of the save file, empty unless it is
+            from before history had its own files.
+        """
         with open(self.save_location, 'r') as file:
             data = file.read()
         sections = data.split('\n\n')
@@ -554,25 +1356,210 @@ class Ledger:
         self.bank.load_data(lines[0])
         self.store.load_data(lines[1])
         self.pot.load_data(lines[2])
-        for line in lines[2:]:
+        for line in lines[3:]:
             self.users.append(Account())
             self.users[-1].load_data(line)
+        self.reindex()
         self.library.set_save_location(self.save_location)
         self.library.load_data()
-        self.history = []
-        for line in sections[1].splitlines():
-            self.history.append(line)
+        if os.path.exists("config_" + self.save_location):
+            self.load_config()
+        return sections[1].splitlines() if len(sections) > 1 else []
+
+    def load_snapshot(self) -> None:
+        """Loads the binary snapshot. The history count it carries isn't
+        needed, the history is read from its own files."""
+        data = snapshot.Snapshot(self.snapshot_location)
+        try:
+            strings = data.strings()
+            # the names are already interned.
+            accounts = [self.stored_account(*i)
+                        for i in data.accounts(strings)]
+            library = data.library(strings)
+            locks = data.locks()
+        finally:
+            data.close()
+        self.restore_state(accounts, library, locks)
+        return
+
+    def restore_state(self, accounts: List, library: Mapping[str, float],
+                      locks: Tuple[bool, bool, bool, bool]) -> None:
+        """Puts a loaded ledger in place of this one's.
+
+        :param accounts: Every account, the Bank, Store and Pot first.
+        :param library: Item name -> value.
+        :param locks: The user, transaction, store and bank locks.
+        """
+        for system, account in zip([self.bank, self.store, self.pot],
+                                   accounts):
+            system.owner = account.owner
+            system.key = account.key
+            system.value = account.value
+            system.inventory = account.inventory
+            system.version += 1
+        self.users = accounts[3:]
+        self.reindex()
+        self.library.set_save_location(self.save_location)
+        self.library.restore(library)
+        (self.user_lock, self.transaction_lock, self.store_lock,
+         self.bank_lock) = locks
+        return
+
+    @staticmethod
+    def stored_account(owner: str, name: str, key: str, value: float,
+                       inventory: Mapping[str, int]) -> Account:
+        """
+        :return: An account holding what a snapshot or storage backend kept
+            of it.
+        """
+        ret = Account(owner, name, key, value)
+        ret.inventory = inventory
+        return ret
+
+    def reindex(self) -> None:
+        """Rebuilds the account index, totals and caches from the accounts
+        after they have been loaded.
+
+        Does what register_account() would for each of them, in bulk.
+        """
+        self.accounts = dict()
+        self.total_currency = 0
+        self.holders = dict()
+        self.worth = dict()
+        self.ranking = None
+        self.ranked = dict()
+        self.total_worth = None
+        if self.columns is not None:
+            self.columns = ColumnarStore(self.library)
+        holders = self.holders
+        total_items = dict()
+        for account in [self.pot, self.store, self.bank] + self.users:
+            name = account.name
+            self.accounts[name] = account
+            account.observer = self
+            counted = self.in_totals(account)
+            for item, amount in account.inventory.items():
+                held = holders.get(item)
+                if held is None:
+                    held = holders[item] = dict()
+                held[name] = amount
+                if counted:
+                    total_items[item] = total_items.get(item, 0) + amount
+            if counted:
+                self.total_currency += account.value
+                if self.columns is not None:
+                    self.columns.add_account(account)
+        self.total_items = {item: amount for item, amount in
+                            total_items.items() if amount}
+        self.dirty.update(self.accounts)
+        return
+
+    def replay(self, record: List[str]) -> None:
+        """Applies a journal record on top of the loaded ledger.
+
+        :param record: The lines of the record as journal_record() made them.
+        """
+        for line in record:
+            kind, data = line.split('\t', 1)
+            if kind == 'A':
+                account = Account()
+                account.load_data(data)
+                self.restore_account(account)
+            elif kind == 'R':
+                self.unregister_account(data)
+            elif kind == 'I':
+                item, value = data.split('\t')
+                if not self.library.new_item(item, float(value)):
+                    self.library.change_value(item, float(value))
+            elif kind == 'X':
+                self.library.delete_item(data)
+            elif kind == 'H':
+                index, entry = data.split('\t', 1)
+                # a save may have landed before the journal was cleared.
+                if int(index) == len(self.history):
+                    self.import_history(entry)
+            elif kind == 'L':
+                (self.user_lock, self.transaction_lock, self.store_lock,
+                 self.bank_lock) = [i == 'True' for i in data.split('\t')]
+        return
+
+    def restore_account(self, account: Account) -> None:
+        """Puts an account's saved state in place, replacing the account of
+        the same name if there is one.
+
+        :param account: The account as it was saved.
+        """
+        current = self.accounts.get(account.name)
+        if current is None:
+            self.users.append(account)
+            self.register_account(account)
+            return
+        if self.in_totals(current):
+            self.add_to_totals(-current.value,
+                               {item: -amount for item, amount in
+                                current.inventory.items()})
+        current.owner = account.owner
+        current.key = account.key
+        current.value = account.value
+        held = set(current.inventory) | set(account.inventory)
+        current.inventory = account.inventory
+        current.version += 1
+        self.index_holdings(current, held)
+        if self.in_totals(current):
+            self.add_to_totals(current.value, current.inventory)
+            if self.columns is not None:
+                self.columns.add_account(current)
+        self.worth.pop(current.name, None)
+        self.rank(current)
+        return
 
     def transaction_log(self, transactions: int=0) -> str:
         """Gets the history and returns it in readable format.
-        :param int transactions: number of transactions to show, 0 shows all.
+        :param int transactions: number of transactions to show, 0 shows the
+            most recent page.
         :return: The history, delineated by newlines.
         """
-        ret = ''
-        if 0 < transactions < len(self.history):
-            for i in self.history[-transactions:]:
-                ret += i + '\n'
-        else:
-            for i in self.history:
-                ret += i + '\n'
-        return ret
+        if transactions <= 0:
+            transactions = self.history_page
+        return ''.join(i.text + '\n' for i in self.history.last(transactions))
+
+    def account_log(self, account: str, transactions: int=0) -> str:
+        """Gets the history of one account.
+
+        :param account: The account.
+        :param transactions: number of entries to show, 0 shows a page.
+        :return: The entries changing the account, delineated by newlines.
+        """
+        if transactions <= 0:
+            transactions = self.history_page
+        records = self.history.of_account(account, transactions)
+        if not records:
+            return 'No history for %s.\n' % account
+        return ''.join('#%d %s\n' % (i.seq, i.text) for i in records)
+
+    def item_log(self, item: str, transactions: int=0) -> str:
+        """Gets the history of one item.
+
+        :param item: The item.
+        :param transactions: number of entries to show, 0 shows a page.
+        :return: The entries moving the item, delineated by newlines.
+        """
+        if transactions <= 0:
+            transactions = self.history_page
+        records = self.history.of_item(item, transactions)
+        if not records:
+            return 'No history for %s.\n' % item
+        return ''.join('#%d %s\n' % (i.seq, i.text) for i in records)
+
+    def history_page_log(self, page: int) -> str:
+        """Gets a page of the history, page 1 being the most recent.
+
+        :param page: Which page.
+        :return: The page's entries delineated by newlines, under a header.
+        """
+        pages = self.history.pages(self.history_page)
+        if not 0 < page <= pages:
+            return 'Page must be between 1 and %d.\n' % pages
+        records = self.history.page(page, self.history_page)
+        return 'Page %d of %d.\n' % (page, pages) + ''.join(
+            '#%d %s\n' % (i.seq, i.text) for i in records)
@@ -0,0 +1,141 @@
+"""
+File for carrying out the chat bot's ledger commands.
+
+Nothing here talks to discord or the disk directly, each command returns the
+reply to send and what kind of write it needs, so the same code can run in
+the bot's own process or in a shard process.
+"""
+import string
+from typing import Mapping, Tuple
+
+from ledger import Ledger
+
+# What a command needs written out afterwards.
+NO_WRITE = ''
+COMMIT = 'commit'
+SAVE = 'save'
+
+
+def create_ledger(books: Mapping, key: str, server: str, author_name: str,
+                  author_id: str, name: str) -> Tuple[str, str]:
+    """Creates a new ledger for a server, replacing any it had.
+
+    :param books: The ledgers by server id.
+    :param key: The server's id.
+    :param server: The server's name.
+    :param author_name: Who asked, they become the admin.
+    :param author_id: Their id, used as the admin's key.
+    :param name: Name of the ledger.
+    :return: The reply and what needs writing.
+    """
+    books[key] = Ledger(name, server, author_name, author_id,
+                        "%sStoreKey" % author_id)
+    return "Ledger Created.", NO_WRITE
+
+
+def run_command(books: Mapping, key: str, server: str, author_name: str,
+                author_id: str, command: str) -> Tuple[str, str]:
+    """Carries out a .t ledger command.
+
+    :param books: The ledgers by server id.
+    :param key: The server's id.
+    :param server: The server's name.
+    :param author_name: Who sent the command.
+    :param author_id: Their id, used as their key.
+    :param command: The command, without the .t in front.
+    :return: The reply, empty if there is none, and what needs writing.
+    """
+    if command.startswith('Load '):
+        name = command[len('Load '):]
+        if True in [c in name for c in string.whitespace]:
+            return 'Name cannot contain whitespace.', NO_WRITE
+        books[key] = Ledger(name, server, author_name, author_id,
+                            "%sStoreKey" % author_id)
+        books[key].load_save()
+        return 'Ledger Loaded.', NO_WRITE
+    book = books.get(key, False)
+    if not book:
+        return 'No Ledger on this server.', NO_WRITE
+    elif '\n' in command:  # several transactions pasted at once.
+        res = book.apply_batch(command.splitlines(), author_id)
+        if res:
+            return 'Nothing was done. %s' % res, NO_WRITE
+        return 'Transactions Complete.', COMMIT
+    elif command == 'Save':
+        return 'Ledger Saved.', SAVE
+    elif command == 'Show Items':
+        return book.item_list(), NO_WRITE
+    elif command == 'Total Value':
+        return book.total_value()[3], NO_WRITE
+    elif command == 'Rectify':
+        return book.show_rectify(), NO_WRITE
+    elif command.startswith('Add Account '):
+        account = command[len('Add Account '):].split(' ')[0]
+        return book.add_user(author_name, account, author_id)[1], COMMIT
+    elif command.startswith('Show Accounts'):
+        return book.show_users(), NO_WRITE
+    elif command.startswith('Show History'):
+        if 'Show History' == command:
+            return book.transaction_log(), NO_WRITE
+        elif command.startswith('Show History Page '):
+            page = command[len('Show History Page '):].strip()
+            if not page.isdigit():
+                return 'Page must be a number, like Show History Page 2.\n', \
+                    NO_WRITE
+            return book.history_page_log(int(page)), NO_WRITE
+        name = command[len('Show History '):]
+        if name.isdigit():
+            return book.transaction_log(int(name)), NO_WRITE
+        count = 0
+        if name.rsplit(' ', 1)[-1].isdigit():
+            name, count = name.rsplit(' ', 1)
+            count = int(count)
+        if name.startswith('Item '):
+            return book.item_log(name[len('Item '):], count), NO_WRITE
+        return book.account_log(name, count), NO_WRITE
+    elif command == 'Top' or command.startswith('Top '):
+        count = command[len('Top '):].strip()
+        if count and not count.isdigit():
+            return 'Top takes a number of accounts, like Top 5.\n', NO_WRITE
+        return book.top(int(count) if count else 10), NO_WRITE
+    elif command.startswith('Who Has '):
+        return book.show_holders(command[len('Who Has '):].strip()), NO_WRITE
+    elif command.startswith('New Item '):
+        data = command[len("New Item "):]
+        try:
+            item, value = data.split(':')
+            value = float(value.strip())
+        except ValueError:
+            return 'Must be in New Item [Item]: [Value] format.\n', NO_WRITE
+        item = item.strip()
+        mess = ''
+        write = NO_WRITE
+        if book.admin_new_item(author_id, item, value):
+            mess += 'Successfully Added %s.\n' % item
+            write = COMMIT
+        else:
+            mess += 'Item could not be added.\n'
+        if ',' in item:
+            mess += 'Item cannot have , in it. Use ; instead.'
+        return mess, write
+    elif command.startswith('Set Value '):
+        return book.transaction(command, author_id), COMMIT
+    elif command.startswith('Delete Item '):
+        item = command[len('Delete Item '):]
+        if book.delete_item(item, author_id):
+            return 'Item Successfully deleted.\n', COMMIT
+        return 'Item could not be deleted.\n', NO_WRITE
+    elif command.split() and book.is_account_name(command.split()[0]):
+        words = command.split()
+        if words[1:3] == ['Balance', 'at'] and len(words) == 4:
+            entry = words[3][1:] if words[3].startswith('#') else words[3]
+            if not entry.isdigit():
+                return 'Entry must be a number, like #12.\n', NO_WRITE
+            return book.balance_at(words[0], int(entry)), NO_WRITE
+        if words[1:2] == ['Balance']:
+            return book.show_balance(words[0])[3], NO_WRITE
+        res = book.transaction(command, author_id)
+        if res:
+            return res, NO_WRITE
+        return 'Transaction Complete.', COMMIT
+    return '', NO_WRITE
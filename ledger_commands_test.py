@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+import ledger_commands
+from ledger_commands import COMMIT, NO_WRITE, SAVE
+
+
+class TestLedgerCommands(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        self.books = {}
+        ledger_commands.create_ledger(self.books, '1', 'Server', 'Admin',
+                                      'AdminKey', 'Test')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def run_command(self, command, author='Admin', key='AdminKey'):
+        return ledger_commands.run_command(self.books, '1', 'Server', author,
+                                           key, command)
+
+    def test_no_ledger(self):
+        self.assertEqual(
+            ledger_commands.run_command({}, '1', 'Server', 'Admin',
+                                        'AdminKey', 'Total Value'),
+            ('No Ledger on this server.', NO_WRITE))
+
+    def test_transaction(self):
+        self.assertEqual(self.run_command('Add Account Alice'),
+                         ('Alice account added.\n', COMMIT))
+        self.assertEqual(self.run_command('Bank gives Alice: 10'),
+                         ('Transaction Complete.', COMMIT))
+        self.assertEqual(self.run_command('Alice Balance')[0].split('\n')[0],
+                         'Alice has 10 and ')
+        self.assertEqual(self.run_command('Bank gives Alice: -10'),
+                         ('Value cannot be negative.\n', NO_WRITE))
+
+    def test_batch(self):
+        self.run_command('Add Account Alice')
+        self.assertEqual(
+            self.run_command('Bank gives Alice: 10\nBank gives Alice: 5'),
+            ('Transactions Complete.', COMMIT))
+        self.assertEqual(self.books['1'].get_account('Alice').value, 15)
+
+    def test_save_and_load(self):
+        self.assertEqual(self.run_command('Save'), ('Ledger Saved.', SAVE))
+        self.books['1'].save()
+        self.assertEqual(self.run_command('Load Test'),
+                         ('Ledger Loaded.', NO_WRITE))
+        self.assertEqual(self.run_command('Load Bad Name'),
+                         ('Name cannot contain whitespace.', NO_WRITE))
+
+    def test_show_history(self):
+        self.run_command('Add Account Alice')
+        self.run_command('Add Account Bob')
+        self.run_command('Bank gives Alice: 10, Sword:1')
+        self.run_command('Bank gives Bob: 5')
+        self.assertEqual(self.run_command('Show History 1'),
+                         ('Bank gives Bob: 5\n', NO_WRITE))
+        self.assertEqual(self.run_command('Show History Alice 1'),
+                         ('#2 Bank gives Alice: 10, Sword:1\n', NO_WRITE))
+        self.assertEqual(self.run_command('Show History Item Sword'),
+                         ('#2 Bank gives Alice: 10, Sword:1\n', NO_WRITE))
+        self.assertEqual(self.run_command('Show History Item Shield 3'),
+                         ('No history for Shield.\n', NO_WRITE))
+
+    def test_balance_at(self):
+        self.run_command('Add Account Alice')
+        self.run_command('Bank gives Alice: 10')
+        self.run_command('Bank gives Alice: 5')
+        self.assertEqual(self.run_command('Alice Balance at #1'),
+                         ('Alice had 10 and at #1.\n', NO_WRITE))
+        self.assertEqual(self.run_command('Alice Balance at 2'),
+                         ('Alice had 15 and at #2.\n', NO_WRITE))
+        self.assertEqual(self.run_command('Alice Balance at #two'),
+                         ('Entry must be a number, like #12.\n', NO_WRITE))
+
+    def test_who_has(self):
+        self.run_command('Add Account Alice')
+        self.run_command('Add Account Bob')
+        self.run_command('Bank gives Alice: Sword:1')
+        self.run_command('Bank gives Bob: Sword:3')
+        self.assertEqual(self.run_command('Who Has Sword'),
+                         ('Sword is held by:\nBob: 3\nAlice: 1\n', NO_WRITE))
+        self.assertEqual(self.run_command('Who Has Shield'),
+                         ('Nobody has Shield.\n', NO_WRITE))
+
+    def test_top(self):
+        self.assertEqual(self.run_command('Top'), ('No accounts.\n', NO_WRITE))
+        self.run_command('Add Account Alice')
+        self.run_command('Add Account Bob')
+        self.run_command('Bank gives Alice: 5')
+        self.run_command('Bank gives Bob: 3, Gem:1')
+        self.run_command('Set Value Gem: 10')
+        self.assertEqual(self.run_command('Top'),
+                         ('1. Bob: 13\n2. Alice: 5\n', NO_WRITE))
+        self.assertEqual(self.run_command('Top 1'),
+                         ('1. Bob: 13\n', NO_WRITE))
+        self.assertEqual(self.run_command('Top many'),
+                         ('Top takes a number of accounts, like Top 5.\n',
+                          NO_WRITE))
+
+    def test_malformed(self):
+        self.run_command('Add Account Alice')
+        self.assertEqual(self.run_command('Show History Page x'),
+                         ('Page must be a number, like Show History Page 2.\n',
+                          NO_WRITE))
+        self.assertEqual(self.run_command('New Item Sword'),
+                         ('Must be in New Item [Item]: [Value] format.\n',
+                          NO_WRITE))
+        self.assertEqual(self.run_command('Set Value Sword'),
+                         ('Must be in Set Value [Item]: [Value] format.\n',
+                          COMMIT))
+        self.assertEqual(self.run_command('Alice'),
+                         ('Command not Recognized.\n', NO_WRITE))
+        self.assertEqual(self.run_command(''), ('', NO_WRITE))
+
+    def test_set_value(self):
+        self.run_command('New Item Sword: 1')
+        self.assertEqual(self.run_command('Set Value Sword: 5'),
+                         ('Value properly set.', COMMIT))
+        self.assertEqual(self.books['1'].library.library['Sword'], 5)
+
+    def test_unknown(self):
+        self.assertEqual(self.run_command('Nobody Balance'), ('', NO_WRITE))
+
+
+if __name__ == '__main__':
+    unittest.main()
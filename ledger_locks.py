@@ -0,0 +1,79 @@
+"""
+File for the ledger locks, which keep commands on one ledger from interleaving.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable
+
+
+class LedgerLocks:
+    """An asyncio lock for each ledger.
+
+    Commands on the same ledger wait their turn so one can't run in between
+    another's remove and add, commands on different ledgers don't wait on
+    each other at all. Keeps track of how many commands are queued and how
+    long they waited.
+    """
+    def __init__(self) -> None:
+        # key -> lock, only while someone holds or waits on it.
+        self.locks = dict()
+        # key -> how many commands are waiting on the lock.
+        self.waiting = dict()
+        # How many commands have gotten a lock and how long they waited.
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        return
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        """Holds the lock for a ledger while the block runs.
+
+        :param key: What the ledger is filed under.
+        """
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        self.waiting[key] = self.waiting.get(key, 0) + 1
+        start = time.monotonic()
+        try:
+            await lock.acquire()
+        finally:
+            self.waiting[key] -= 1
+            if not lock.locked():  # cancelled while waiting
+                self.forget(key)
+        wait = time.monotonic() - start
+        self.acquired += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        try:
+            yield
+        finally:
+            lock.release()
+            self.forget(key)
+
+    def forget(self, key: Hashable) -> None:
+        """Drops a ledger's lock once nobody holds or waits on it.
+
+        :param key: What the ledger is filed under.
+        """
+        if not self.waiting.get(key) and not self.locks[key].locked():
+            self.waiting.pop(key, None)
+            self.locks.pop(key)
+        return
+
+    def depth(self, key: Hashable) -> int:
+        """
+        :param key: What the ledger is filed under.
+        :return: How many commands are waiting on the ledger.
+        """
+        return self.waiting.get(key, 0)
+
+    def stats(self) -> str:
+        """
+        :return: Queue depths and wait times.
+        """
+        average = self.total_wait / self.acquired if self.acquired else 0
+        return ('%d ledgers busy, %d commands waiting.\n'
+                'Average wait: %.3fs, Longest wait: %.3fs.\n'
+                % (len(self.locks), sum(self.waiting.values()), average,
+                   self.max_wait))
@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+from ledger_locks import LedgerLocks
+
+
+class TestLedgerLocks(unittest.TestCase):
+    def setUp(self):
+        self.locks = LedgerLocks()
+        self.order = []
+
+    async def command(self, key, name):
+        async with self.locks.hold(key):
+            self.order.append(name + ' start')
+            await asyncio.sleep(0.01)
+            self.order.append(name + ' end')
+
+    def test_same_ledger_serialized(self):
+        async def run():
+            await asyncio.gather(self.command('A', '1'),
+                                 self.command('A', '2'))
+        asyncio.run(run())
+        self.assertEqual(self.order, ['1 start', '1 end', '2 start', '2 end'])
+
+    def test_different_ledgers_concurrent(self):
+        async def run():
+            await asyncio.gather(self.command('A', '1'),
+                                 self.command('B', '2'))
+        asyncio.run(run())
+        self.assertEqual(self.order, ['1 start', '2 start', '1 end', '2 end'])
+
+    def test_depth(self):
+        async def run():
+            first = asyncio.ensure_future(self.command('A', '1'))
+            second = asyncio.ensure_future(self.command('A', '2'))
+            await asyncio.sleep(0)
+            depth = self.locks.depth('A')
+            await asyncio.gather(first, second)
+            return depth
+        self.assertEqual(asyncio.run(run()), 1)
+        self.assertEqual(self.locks.depth('A'), 0)
+        self.assertEqual(self.locks.locks, {})
+        self.assertEqual(self.locks.acquired, 2)
+        self.assertGreater(self.locks.max_wait, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 import ledger
 from item import Items
@@ -24,6 +26,21 @@ class TestItems(unittest.TestCase):
     def test_change_value_false(self):
         self.assertFalse(self.library.change_value('DNE', 2))
 
+    def test_value_of(self):
+        self.library.change_value('Normal', 3)
+        self.assertEqual(self.library.value_of(
+            {'Normal': 2, 'Unvalued': 4, 'Priceless': 1, 'DNE': 1}), 6)
+        self.assertEqual(self.library.worth('DNE'), 0)
+
+    def test_restore(self):
+        library = dict(self.library.library)
+        self.library.new_item('Bolt', 20)
+        self.library.change_value('Normal', 9)
+        self.library.restore(library)
+        self.assertEqual(self.library.library, library)
+        self.assertEqual(self.library.worth('Bolt'), 0)
+        self.assertEqual(self.library.worth('Normal'), 1)
+
     def test_save_data(self):
         self.library.set_save_location("save_TestServer_TestName.sav")
         self.library.save_data()
@@ -159,6 +176,14 @@ class TestAccount(unittest.TestCase):
         print('\n' + self.acc.save_data())
         self.assertEqual(self.acc.save_data(), self.acc.save_data())
 
+    def test_compact(self):
+        self.assertFalse(hasattr(self.acc, '__dict__'))
+        new_acc = ledger.Account()
+        new_acc.load_data('Owner\tName\tKey\t10\tTe' + 'st:2')
+        self.assertIs(type(new_acc.inventory['Test']), int)
+        self.assertIs(next(iter(new_acc.inventory)),
+                      next(iter(self.acc.inventory)))
+
     def test_load(self):
         with open('Test_Account.sav', 'w') as file:
             file.write(self.acc.save_data())
@@ -225,6 +250,26 @@ class TestLedger(unittest.TestCase):
     def test_is_account_name_false(self):
         self.assertFalse(self.ledger.is_account_name("DNE"))
 
+    def test_get_account_system(self):
+        self.assertIs(self.ledger.get_account('Pot'), self.ledger.pot)
+        self.assertIs(self.ledger.get_account('Bank'), self.ledger.bank)
+        self.assertIs(self.ledger.get_account('Store'), self.ledger.store)
+        self.assertIsNone(self.ledger.get_account('DNE'))
+
+    def test_add_system_account_name(self):
+        self.assertEqual(self.ledger.add_user("TestUser", "Pot",
+                                              "TestUserKey"),
+                         (False, "User already exists.\n"))
+
+    def test_unregister_account(self):
+        self.ledger.add_user("TestUser2", 'TestAccount2', 'TestUserKey2')
+        self.assertEqual(self.ledger.unregister_account('TestAccount').name,
+                         'TestAccount')
+        self.assertFalse(self.ledger.is_account_name('TestAccount'))
+        self.assertEqual([i.name for i in self.ledger.users],
+                         ['TestAccount2'])
+        self.assertIsNone(self.ledger.unregister_account('Pot'))
+
     def test_transaction_bank_gives_value(self):
         self.assertEqual(
             self.ledger.transaction("Bank gives TestAccount: 100",
@@ -328,6 +373,49 @@ class TestLedger(unittest.TestCase):
             1
         )
 
+    def test_store_sell_worthless_item_keeps_it(self):
+        self.ledger.new_item('Junk', 0)
+        self.ledger.transaction("Bank gives TestAccount: Junk:1", 'TestKey')
+        self.assertEqual(
+            self.ledger.transaction("TestAccount sells Junk:1", 'TestUserKey'),
+            "Nothing given.\n"
+        )
+        self.assertEqual(
+            self.ledger.get_account('TestAccount').inventory['Junk'], 1
+        )
+
+    def test_show_balance_cached(self):
+        first = self.ledger.show_balance('TestAccount')
+        self.assertIs(self.ledger.show_balance('TestAccount'), first)
+        version = self.ledger.get_account('TestAccount').version
+        self.ledger.transaction('Bank gives TestAccount: 5', 'TestKey')
+        self.assertEqual(self.ledger.get_account('TestAccount').version,
+                         version + 1)
+        second = self.ledger.show_balance('TestAccount')
+        self.assertEqual(second[0], first[0] + 5)
+        self.ledger.set_value('Set Value Test: 300', 'TestKey')
+        self.assertEqual(self.ledger.show_balance('TestAccount')[2],
+                         second[2] + 200)
+
+    def test_top_kept_in_order(self):
+        def ranking():
+            return sorted((-self.ledger.account_worth(i), i.name)
+                          for i in self.ledger.users)
+        self.ledger.add_user("Rich", "RichAccount", "RichKey", 500)
+        self.assertEqual(self.ledger.top(2),
+                         '1. RichAccount: 500\n2. TestAccount: 200\n')
+        self.ledger.transaction('Bank gives TestAccount: 400', 'TestKey')
+        self.assertEqual(self.ledger.ranking, ranking())
+        self.ledger.set_value('Set Value Test: 1000', 'TestKey')
+        self.assertEqual(self.ledger.ranking, ranking())
+        self.assertTrue(self.ledger.top(1).startswith('1. TestAccount: 1500'))
+        self.ledger.apply_batch(['RichAccount gives TestAccount: 100',
+                                 'Bank gives Nobody: 1'], 'TestKey')
+        self.assertEqual(self.ledger.ranking, ranking())
+        self.ledger.unregister_account('RichAccount')
+        self.assertEqual(self.ledger.ranking, ranking())
+        self.assertNotIn('RichAccount', self.ledger.top())
+
     def test_store_locked(self):
         self.ledger.store_lock = True
         self.assertEqual(
@@ -445,6 +533,41 @@ class TestLedger(unittest.TestCase):
             2
         )
 
+    def test_apply_batch(self):
+        self.ledger.add_user("TestUser2", 'TestAccount2', 'TestUserKey2')
+        self.assertEqual(self.ledger.apply_batch(
+            ['Bank gives TestAccount: 50, Loot:3',
+             '',
+             'Bank gives TestAccount2: 50, Loot:2',
+             'Set Value Loot: 10'], 'TestKey'), '')
+        self.assertEqual(self.ledger.get_account('TestAccount').value, 150)
+        self.assertEqual(self.ledger.get_account('TestAccount2').inventory,
+                         {'Loot': 2})
+        self.assertEqual(len(self.ledger.history), 5)
+
+    def test_apply_batch_all_or_nothing(self):
+        self.ledger.add_user("TestUser2", 'TestAccount2', 'TestUserKey2')
+        history = list(self.ledger.history)
+        total = self.ledger.total_value()
+        self.assertEqual(self.ledger.apply_batch(
+            ['Bank gives TestAccount: 50, Loot:3',
+             'TestAccount gives TestAccount2: 150, Loot:1',
+             'TestAccount gives TestAccount2: 1, Loot:5'], 'TestKey'),
+            "Line 2: Invalid Key, you are not TestAccount.\n")
+        self.assertEqual(self.ledger.apply_batch(
+            ['Bank gives TestAccount: 50, Loot:3',
+             'TestAccount gives TestAccount2: 150, Loot:1',
+             'TestAccount gives TestAccount2: 1, Loot:5'], 'TestUserKey'),
+            "Line 1: Invalid Key.\n")
+        self.assertEqual(self.ledger.get_account('TestAccount').value, 100)
+        self.assertEqual(self.ledger.get_account('TestAccount').inventory,
+                         {'Test': 1})
+        self.assertEqual(self.ledger.get_account('TestAccount2').inventory,
+                         {})
+        self.assertNotIn('Loot', self.ledger.library.library)
+        self.assertEqual(list(self.ledger.history), history)
+        self.assertEqual(self.ledger.total_value(), total)
+
     def test_show_balance(self):
         self.assertEqual(
             self.ledger.show_balance('TestAccount'),
@@ -482,6 +605,22 @@ class TestLedger(unittest.TestCase):
              'Everyone together holds 100 and Test:1 for a total value of 200.\n')
         )
 
+    def test_total_value_tracks_transactions(self):
+        self.ledger.add_user("TestUser2", 'TestAccount2', 'TestUserKey2', 50)
+        self.ledger.transaction('Bank gives Pot: 100, Test:2', 'TestKey')
+        self.ledger.transaction('TestAccount gives TestAccount2: 20, Test:1',
+                                'TestUserKey')
+        self.ledger.transaction('TestAccount2 gives Bank: 10', 'TestUserKey2')
+        self.assertEqual(self.ledger.total_value()[:3],
+                         (240, {'Test': 3}, 540))
+        self.ledger.library.change_value('Test', 10)
+        self.assertEqual(self.ledger.total_value()[2], 270)
+        self.assertEqual(self.ledger.show_balance('TestAccount2')[2], 70)
+
+    def test_total_value_after_unregister(self):
+        self.ledger.unregister_account('TestAccount')
+        self.assertEqual(self.ledger.total_value()[:3], (0, {}, 0))
+
     def test_show_rectify(self):
         self.assertEqual(
             self.ledger.show_rectify(),
@@ -502,6 +641,63 @@ class TestLedger(unittest.TestCase):
         print(self.ledger.history)
         print(self.ledger.transaction_log(1))
 
+    def test_history_page_log(self):
+        self.ledger.history_page = 2
+        for i in range(4):
+            self.ledger.transaction('Bank gives Pot: %d' % i, 'TestKey')
+        self.assertEqual(self.ledger.transaction_log(),
+                         'Bank gives Pot: 2\nBank gives Pot: 3\n')
+        self.assertEqual(self.ledger.history_page_log(3),
+                         'Page 3 of 3.\n#0 TestAccount account added with '
+                         '100gp and Test:1.\n')
+        self.assertEqual(self.ledger.history_page_log(2),
+                         'Page 2 of 3.\n#1 Bank gives Pot: 0\n'
+                         '#2 Bank gives Pot: 1\n')
+        self.assertEqual(self.ledger.history_page_log(4),
+                         'Page must be between 1 and 3.\n')
+
+    def test_holders(self):
+        self.ledger.add_user("TestUser2", 'TestAccount2', 'TestUserKey2')
+        self.ledger.transaction('Bank gives TestAccount2: Test:2, Dagger:1',
+                                'TestKey')
+        self.ledger.transaction('TestAccount gives Pot: Test:1', 'TestUserKey')
+        self.assertEqual(self.ledger.who_has('Test'),
+                         {'TestAccount2': 2, 'Pot': 1})
+        self.assertEqual(self.ledger.holders_of(['Dagger', 'Loot']),
+                         {'Dagger': {'TestAccount2': 1}, 'Loot': {}})
+        self.assertEqual(self.ledger.holding_any(['Test', 'Dagger']),
+                         {'TestAccount2', 'Pot'})
+        self.ledger.transaction('Bank takes from TestAccount2: Dagger:1',
+                                'TestKey')
+        self.assertNotIn('Dagger', self.ledger.holders)
+        self.ledger.unregister_account('TestAccount2')
+        self.assertEqual(self.ledger.who_has('Test'), {'Pot': 1})
+
+    def test_set_value_reprices_holders(self):
+        self.ledger.add_user("TestUser2", 'TestAccount2', 'TestUserKey2')
+        self.ledger.transaction('Bank gives TestAccount2: Dagger:2', 'TestKey')
+        self.ledger.total_value()
+        self.ledger.account_worths()
+        self.assertEqual(self.ledger.transaction('Set Value Dagger: 5',
+                                                 'TestKey'),
+                         'Value properly set.')
+        self.assertEqual(self.ledger.valued_version,
+                         self.ledger.library.version)
+        self.assertEqual(self.ledger.worth['TestAccount2'], 10)
+        self.assertEqual(self.ledger.worth['TestAccount'], 200)
+        self.assertEqual(self.ledger.total_value()[2], 210)
+
+    def test_history_changes(self):
+        self.ledger.add_user("TestUser2", 'TestAccount2', 'TestUserKey2')
+        self.ledger.transaction('TestAccount gives TestAccount2: 25, Test:1',
+                                'TestUserKey')
+        record = self.ledger.history.last(1)[0]
+        self.assertEqual((record.seq, record.actor, record.action),
+                         (2, 'TestAccount', 'give'))
+        self.assertEqual(record.changes,
+                         (('TestAccount', -25, (('Test', -1),)),
+                          ('TestAccount2', 25, (('Test', 1),))))
+
     def test_save_and_load(self):
         self.ledger.save()
         data = ''
@@ -511,6 +707,16 @@ class TestLedger(unittest.TestCase):
         self.ledger.users = []
         self.assertEqual
 
+    def test_load_save_index(self):
+        self.ledger.save()
+        new_ledger = ledger.Ledger("Test", "Test", "TestAdmin", "TestKey",
+                                   "TestStoreKey")
+        new_ledger.load_save()
+        self.assertEqual([i.name for i in new_ledger.users], ['TestAccount'])
+        self.assertIs(new_ledger.get_account('TestAccount'),
+                      new_ledger.users[0])
+        self.assertIs(new_ledger.get_account('Pot'), new_ledger.pot)
+
     def test_give_bank_item(self):
         self.assertEqual(
             self.ledger.transaction('TestAccount gives Bank: 100',
@@ -519,5 +725,213 @@ class TestLedger(unittest.TestCase):
         )
 
 
+class TestLedgerJournal(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        self.ledger = self.new_ledger()
+        self.ledger.library.new_item('Test', 100)
+        self.ledger.add_user("TestUser", "TestAccount",
+                             "TestUserKey", 100, {'Test': 1})
+        self.ledger.save()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    @staticmethod
+    def new_ledger():
+        return ledger.Ledger("Journal", "Test", "TestAdmin", "TestKey",
+                             "TestStoreKey")
+
+    def test_commit_appends_only_changes(self):
+        self.ledger.transaction('Bank gives Pot: 50', 'TestKey')
+        self.ledger.commit()
+        self.assertEqual(self.ledger.journal.read(),
+                         [['A\t\tPot\t\t50.0\t']])
+        self.assertEqual(self.ledger.history.read_range(0, 2)[1].text,
+                         'Bank gives Pot: 50')
+
+    def test_commit_nothing(self):
+        self.ledger.commit()
+        self.assertEqual(self.ledger.journal.read(), [])
+
+    def test_load_replays_journal(self):
+        self.ledger.add_user("TestUser2", "TestAccount2", "TestUserKey2")
+        self.ledger.commit()
+        self.ledger.transaction('TestAccount gives TestAccount2: 25, Test:1',
+                                'TestUserKey')
+        self.ledger.transaction('Bank gives TestAccount2: Dagger:2', 'TestKey')
+        self.ledger.transaction('Set Value Dagger: 5', 'TestKey')
+        self.ledger.toggle_store_lock()
+        self.ledger.commit()
+        loaded = self.new_ledger()
+        loaded.load_save()
+        self.assertEqual([i.name for i in loaded.users],
+                         ['TestAccount', 'TestAccount2'])
+        self.assertEqual(loaded.get_account('TestAccount').value, 75)
+        self.assertEqual(loaded.get_account('TestAccount2').inventory,
+                         {'Test': 1, 'Dagger': 2})
+        self.assertEqual(loaded.library.library['Dagger'], 5)
+        self.assertTrue(loaded.store_lock)
+        self.assertEqual(list(loaded.history), list(self.ledger.history))
+        self.assertEqual(loaded.total_value()[:3], self.ledger.total_value()[:3])
+
+    def test_first_commit_saves(self):
+        fresh = ledger.Ledger("Fresh", "Test", "TestAdmin", "TestKey",
+                              "TestStoreKey")
+        fresh.add_user("TestUser", "TestAccount", "TestUserKey")
+        fresh.transaction('Bank gives TestAccount: 10', 'TestKey')
+        fresh.commit()
+        self.assertTrue(os.path.exists(fresh.save_location))
+        fresh.transaction('Bank gives TestAccount: 5', 'TestKey')
+        fresh.commit()
+        self.assertEqual(fresh.journal.records, 1)
+        loaded = ledger.Ledger("Fresh", "Test", "TestAdmin", "TestKey",
+                               "TestStoreKey")
+        loaded.load_save()
+        self.assertEqual(loaded.get_account('TestAccount').value, 15)
+        self.assertEqual(list(loaded.history), list(fresh.history))
+
+    def test_save_clears_journal(self):
+        self.ledger.transaction('Bank gives Pot: 50', 'TestKey')
+        self.ledger.commit()
+        self.ledger.save()
+        self.assertFalse(os.path.exists(self.ledger.journal.location))
+        loaded = self.new_ledger()
+        loaded.load_save()
+        self.assertEqual(loaded.pot.value, 50)
+        self.assertEqual(list(loaded.history), list(self.ledger.history))
+
+    def test_history_loads_lazily(self):
+        self.ledger.transaction('Bank gives TestAccount: 5', 'TestKey')
+        self.ledger.save()
+        loaded = self.new_ledger()
+        loaded.load_save()
+        self.assertEqual(len(loaded.history), 2)
+        self.assertEqual(loaded.history.indexed, 0)
+        self.assertEqual(loaded.account_log('TestAccount', 1),
+                         '#1 Bank gives TestAccount: 5\n')
+        self.assertTrue(loaded.history.is_indexed())
+
+    def test_balance_at(self):
+        self.ledger.checkpoints.interval = 3
+        self.ledger.add_user("TestUser2", "TestAccount2", "TestUserKey2")
+        self.ledger.commit()
+        for i in range(1, 6):
+            self.ledger.transaction('Bank gives TestAccount2: %d, Dagger:1'
+                                    % i, 'TestKey')
+            # taken when written out, not by the command.
+            self.assertEqual(self.ledger.checkpoints.pending, [])
+            self.ledger.commit()
+        self.ledger.transaction('TestAccount2 gives Pot: Dagger:5',
+                                'TestUserKey2')
+        self.ledger.commit()
+        self.assertEqual(self.ledger.checkpoints.nearest(8), 6)
+        self.assertTrue(os.path.exists(self.ledger.checkpoints.file(3)))
+        loaded = self.new_ledger()
+        loaded.load_save()
+        self.assertEqual(loaded.balance_at('TestAccount2', 1),
+                         'TestAccount2 had 0 and at #1.\n')
+        self.assertEqual(loaded.balance_at('TestAccount2', 3),
+                         'TestAccount2 had 3 and Dagger:2, at #3.\n')
+        self.assertEqual(loaded.balance_at('TestAccount2', 6),
+                         'TestAccount2 had 15 and Dagger:5, at #6.\n')
+        self.assertEqual(loaded.balance_at('TestAccount2', 7),
+                         'TestAccount2 had 15 and at #7.\n')
+        self.assertEqual(loaded.balance_at('TestAccount2', 0),
+                         'TestAccount2 did not exist at #0.\n')
+        self.assertEqual(loaded.balance_at('TestAccount2', 8),
+                         'There is no entry #8.\n')
+
+    def test_checkpoint_taken_at_commit(self):
+        self.ledger.checkpoints.interval = 3
+        for _ in range(4):
+            self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+        self.ledger.commit()
+        self.assertTrue(os.path.exists(self.ledger.checkpoints.file(5)))
+        self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+        self.ledger.commit()
+        self.assertEqual(self.ledger.checkpoints.nearest(6), 6)
+        self.assertEqual(self.ledger.balance_at('TestAccount', 4),
+                         'TestAccount had 104 and Test:1, at #4.\n')
+        self.assertEqual(self.ledger.balance_at('TestAccount', 5),
+                         'TestAccount had 105 and Test:1, at #5.\n')
+
+    def test_batch_rollback_drops_checkpoint(self):
+        self.ledger.checkpoints.interval = 2
+        self.assertEqual(self.ledger.apply_batch(
+            ['Bank gives Pot: 1', 'Bank gives Nobody: 1'], 'TestKey'),
+            'Line 2: Account does not exist.\n')
+        self.assertEqual(self.ledger.checkpoints.pending, [])
+
+    def test_load_legacy_history(self):
+        with open(self.ledger.save_location, 'a') as file:
+            file.write('Bank gives Pot: 5\nSet Value Dagger: 5\n')
+        for file in os.listdir('.'):
+            if file.startswith('history_'):
+                os.remove(file)
+        loaded = self.new_ledger()
+        loaded.load_save()
+        self.assertEqual([(i.actor, i.action, i.text) for i in loaded.history],
+                         [('Bank', 'give', 'Bank gives Pot: 5'),
+                          ('', '', 'Set Value Dagger: 5')])
+        loaded.save()
+        again = self.new_ledger()
+        again.load_save()
+        self.assertEqual(list(again.history), list(loaded.history))
+
+    def test_save_writes_only_changes(self):
+        self.assertEqual(set(self.ledger.bytes_written),
+                         {'accounts', 'config', 'items'})
+        before = dict(self.ledger.bytes_written)
+        self.ledger.transaction('Bank gives Pot: 50', 'TestKey')
+        self.ledger.commit()
+        self.ledger.save()
+        self.assertEqual(self.ledger.bytes_written['config'], before['config'])
+        self.assertEqual(self.ledger.bytes_written['items'], before['items'])
+        self.assertEqual(self.ledger.last_save,
+                         self.ledger.bytes_written['accounts']
+                         - before['accounts'])
+        self.ledger.toggle_bank_lock()
+        self.ledger.save()
+        self.assertEqual(self.ledger.last_save,
+                         self.ledger.bytes_written['config'] - before['config'])
+        self.ledger.library.new_item('Dagger', 5)
+        self.ledger.save()
+        self.assertEqual(self.ledger.last_save,
+                         self.ledger.bytes_written['items'] - before['items'])
+        self.ledger.save()
+        self.assertEqual((self.ledger.saves, self.ledger.last_save), (5, 0))
+        self.assertEqual([i for i in os.listdir('.') if i.endswith('.tmp')],
+                         [])
+        loaded = self.new_ledger()
+        loaded.load_save()
+        self.assertEqual(loaded.pot.value, 50)
+        self.assertTrue(loaded.bank_lock)
+        self.assertEqual(loaded.library.library['Dagger'], 5)
+        loaded.save()
+        self.assertEqual(loaded.last_save, 0)
+
+    def test_load_with_journal_saves_everything(self):
+        self.ledger.transaction('Bank gives Pot: 50', 'TestKey')
+        self.ledger.commit()
+        loaded = self.new_ledger()
+        loaded.load_save()
+        loaded.save()
+        self.assertEqual(set(loaded.bytes_written),
+                         {'accounts', 'config', 'items'})
+
+    def test_snapshot_interval(self):
+        self.ledger.snapshot_interval = 2
+        self.ledger.transaction('Bank gives Pot: 1', 'TestKey')
+        self.ledger.commit()
+        self.assertEqual(self.ledger.journal.records, 1)
+        self.ledger.transaction('Bank gives Pot: 1', 'TestKey')
+        self.ledger.commit()
+        self.assertEqual(self.ledger.journal.records, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
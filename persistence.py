@@ -0,0 +1,191 @@
+"""
+File for the persistence worker, which keeps ledger writes off the event loop.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Hashable, Mapping, Union
+
+from ledger import Ledger
+
+
+class PersistenceWorker:
+    """Writes ledgers to disk on a worker thread.
+
+    Ledgers are marked dirty after each command and written out a short while
+    later, so a burst of commands on one ledger costs a single write. Reading
+    the ledger is always done on the event loop, only the file writes run on
+    the thread, and there is just one thread so writes land in order.
+
+    Ledgers whose durability is 'sync' are committed with commit_durable()
+    instead, which waits for the disk on a pool of its own so the writing
+    thread keeps going and commands that land together share a sync.
+    Callers should let go of the ledger's lock before waiting, or the next
+    command can't commit until the sync is done and there's nothing to share.
+    """
+    def __init__(self, delay: float = 1.0, syncers: int = 8) -> None:
+        """
+        :param delay: Seconds to wait after a ledger is first marked dirty
+            before writing it, anything else marked in that time rides along.
+        :param syncers: Threads waiting on syncs, at most how many commits
+            can be waiting for the disk at once.
+        """
+        self.delay = delay
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.syncer = ThreadPoolExecutor(max_workers=syncers)
+        # key -> (ledger, timer) for every ledger waiting to be written.
+        self.pending = dict()
+        # key -> the last write handed to the thread, until it is done.
+        self.writing = dict()
+        # How many writes have been handed to the thread.
+        self.writes = 0
+        return
+
+    def mark_dirty(self, key: Hashable, ledger: Ledger) -> None:
+        """Schedules a ledger to be committed unless it already is.
+
+        :param key: What the ledger is filed under, usually its server.
+        :param ledger: The ledger that changed.
+        """
+        if key in self.pending:
+            if self.pending[key][0] is ledger:
+                return
+            # the ledger under this key was replaced, write the old one now.
+            self.commit(key)
+        timer = asyncio.get_event_loop().call_later(self.delay, self.commit,
+                                                    key)
+        self.pending[key] = (ledger, timer)
+        return
+
+    def commit(self, key: Hashable) -> Union[asyncio.Future, None]:
+        """Commits a pending ledger now instead of waiting for its timer.
+
+        :param key: What the ledger is filed under.
+        :return: The write, None if the ledger wasn't pending or had nothing
+            to write.
+        """
+        if key not in self.pending:
+            return None
+        ledger, timer = self.pending.pop(key)
+        timer.cancel()
+        return self.submit(key, ledger.prepare_commit())
+
+    def commit_durable(self, key: Hashable, ledger: Ledger) -> asyncio.Future:
+        """Commits a ledger now, for replying only once a change is on disk.
+
+        The ledger is read straight away, what comes back only waits on the
+        disk, so it can be awaited after the ledger's lock is let go.
+
+        :param key: What the ledger is filed under.
+        :param ledger: The ledger that changed.
+        :return: Done once the commit is as safe as the ledger's durability
+            asks for.
+        """
+        # anything already pending goes first, this ledger's or not.
+        self.commit(key)
+        self.submit(key, ledger.prepare_commit())
+        return asyncio.ensure_future(
+            self.sync_after(self.writing.get(key), ledger))
+
+    async def sync_after(self, write: Union[asyncio.Future, None],
+                         ledger: Ledger) -> None:
+        """Waits for a write and then for the ledger's sync.
+
+        :param write: The write to wait for, None if there is none.
+        :param ledger: The ledger written.
+        """
+        if write is not None:
+            await write
+        await asyncio.get_event_loop().run_in_executor(self.syncer,
+                                                       ledger.sync)
+        return
+
+    def save(self, key: Hashable, ledger: Ledger) -> asyncio.Future:
+        """Does a full save of a ledger, replacing any pending commit.
+
+        :param key: What the ledger is filed under.
+        :param ledger: The ledger to save.
+        :return: The write.
+        """
+        if key in self.pending:
+            self.pending.pop(key)[1].cancel()
+        return self.submit(key, ledger.prepare_save())
+
+    def evict(self, key: Hashable, ledger: Ledger) -> asyncio.Future:
+        """Does a full save of a ledger dropped from memory, then closes it
+        once the save is written, for LedgerRegistry's on_evict.
+
+        :param key: What the ledger is filed under.
+        :param ledger: The ledger dropped.
+        :return: The write.
+        """
+        if key in self.pending and self.pending[key][0] is ledger:
+            self.pending.pop(key)[1].cancel()
+        return self.submit(key, partial(ledger.write_all,
+                                        ledger.prepare_save(), ledger.close))
+
+    def submit(self, key: Hashable,
+               write: Union[Callable[[], None], None]) \
+            -> Union[asyncio.Future, None]:
+        """Hands a prepared write to the thread.
+
+        :param key: What the ledger being written is filed under.
+        :param write: What Ledger.prepare_commit() or prepare_save() gave.
+        :return: The write, None if there was nothing to do.
+        """
+        if write is None:
+            return None
+        self.writes += 1
+        future = asyncio.get_event_loop().run_in_executor(self.executor, write)
+        self.writing[key] = future
+        future.add_done_callback(
+            lambda done: self.writing.pop(key, None)
+            if self.writing.get(key) is done else None)
+        return future
+
+    async def settle(self, key: Hashable) -> None:
+        """Waits until writes already handed over for a ledger are done.
+
+        Anything reading the ledger's files, like loading it back after it was
+        dropped from memory, should wait on this first. A commit still
+        waiting on its timer isn't covered, use flush() where that matters,
+        like loading or replacing a ledger still in memory.
+
+        :param key: What the ledger is filed under.
+        """
+        future = self.writing.get(key)
+        if future is not None:
+            await future
+        return
+
+    async def flush(self, key: Union[Hashable, None] = None) -> None:
+        """Commits pending ledgers now and waits until they are on disk.
+
+        :param key: The ledger to flush, None flushes every ledger.
+        """
+        keys = list(self.pending) if key is None else [key]
+        for i in keys:
+            self.commit(i)
+        # one thread, so once this has run everything before it has too.
+        await asyncio.get_event_loop().run_in_executor(self.executor,
+                                                       lambda: None)
+        return
+
+    async def close(self, ledgers: Union[Mapping[Hashable, Ledger],
+                                         None] = None) -> None:
+        """Does a full save of every pending ledger and any others given,
+        waits for it all and stops the threads, for shutting down.
+
+        :param ledgers: More ledgers to save by key, like every one in memory.
+        """
+        for key, ledger in (ledgers or dict()).items():
+            if key in self.pending and self.pending[key][0] is not ledger:
+                # replaced, the old one still gets its commit.
+                self.commit(key)
+            self.save(key, ledger)
+        for key, (ledger, _) in list(self.pending.items()):
+            self.save(key, ledger)
+        await self.flush()
+        self.executor.shutdown()
+        self.syncer.shutdown()
+        return
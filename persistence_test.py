@@ -0,0 +1,124 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import ledger
+from persistence import PersistenceWorker
+
+
+class TestPersistenceWorker(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        self.ledger = ledger.Ledger("Persist", "Test", "TestAdmin", "TestKey",
+                                    "TestStoreKey")
+        self.ledger.add_user("TestUser", "TestAccount", "TestUserKey", 100)
+        self.ledger.save()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def test_burst_is_one_write(self):
+        async def burst():
+            worker = PersistenceWorker(delay=60)
+            for _ in range(30):
+                self.ledger.transaction('Bank gives TestAccount: 1',
+                                        'TestKey')
+                worker.mark_dirty('server', self.ledger)
+            self.assertFalse(os.path.exists(self.ledger.journal.location))
+            await worker.close()
+            return worker.writes
+        self.assertEqual(asyncio.run(burst()), 1)
+        # closing saves in full.
+        self.assertFalse(os.path.exists(self.ledger.journal.location))
+        loaded = ledger.Ledger("Persist", "Test", "TestAdmin", "TestKey",
+                               "TestStoreKey")
+        loaded.load_save()
+        self.assertEqual(loaded.get_account('TestAccount').value, 130)
+
+    def test_timer_writes(self):
+        async def wait():
+            worker = PersistenceWorker(delay=0.01)
+            self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+            worker.mark_dirty('server', self.ledger)
+            await asyncio.sleep(0.1)
+            await worker.flush()
+            return worker.writes
+        self.assertEqual(asyncio.run(wait()), 1)
+        self.assertEqual(len(self.ledger.journal.read()), 1)
+
+    def test_flush_before_load(self):
+        async def load():
+            worker = PersistenceWorker(delay=60)
+            self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+            worker.mark_dirty('server', self.ledger)
+            await worker.flush('server')
+            self.assertEqual(worker.pending, dict())
+            loaded = ledger.Ledger("Persist", "Test", "TestAdmin", "TestKey",
+                                   "TestStoreKey")
+            loaded.load_save()
+            await worker.close()
+            return loaded
+        loaded = asyncio.run(load())
+        self.assertEqual(loaded.get_account('TestAccount').value, 101)
+
+    def test_save(self):
+        async def save():
+            worker = PersistenceWorker(delay=60)
+            self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+            worker.mark_dirty('server', self.ledger)
+            await worker.save('server', self.ledger)
+            await worker.close()
+            return worker.writes
+        self.assertEqual(asyncio.run(save()), 1)
+        self.assertFalse(os.path.exists(self.ledger.journal.location))
+
+    def test_evict(self):
+        async def evict():
+            worker = PersistenceWorker(delay=60)
+            self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+            worker.mark_dirty('server', self.ledger)
+            await worker.evict('server', self.ledger)
+            self.assertEqual(worker.pending, dict())
+            await worker.close()
+        asyncio.run(evict())
+        self.assertTrue(self.ledger.closed)
+        self.assertFalse(os.path.exists(self.ledger.journal.location))
+
+    def test_commit_durable(self):
+        async def commit():
+            worker = PersistenceWorker(delay=60)
+            self.ledger.journal.durability = 'sync'
+            self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+            worker.mark_dirty('server', self.ledger)
+            self.ledger.transaction('Bank gives TestAccount: 2', 'TestKey')
+            await asyncio.gather(*(worker.commit_durable('server', self.ledger)
+                                   for _ in range(3)))
+            self.assertEqual(worker.pending, dict())
+            await worker.close()
+            return worker.writes
+        self.assertEqual(asyncio.run(commit()), 1)
+        self.assertEqual(self.ledger.journal.synced, 1)
+        self.assertEqual(len(self.ledger.journal.read()), 1)
+
+    def test_commit_durable_writes_before_waiting(self):
+        async def commit():
+            worker = PersistenceWorker(delay=60)
+            self.ledger.journal.durability = 'sync'
+            synced = []
+            for i in range(3):
+                self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+                synced.append(worker.commit_durable('server', self.ledger))
+                # the write is handed over before anything is awaited.
+                self.assertEqual(worker.writes, i + 1)
+            await asyncio.gather(*synced)
+            await worker.close()
+        asyncio.run(commit())
+        self.assertEqual(self.ledger.journal.synced, 3)
+        self.assertLessEqual(self.ledger.journal.syncs, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+File for the ledger registry, which decides which ledgers stay in memory.
+"""
+import os
+from collections import OrderedDict
+from typing import Callable, Hashable, Union
+
+from ledger import Ledger
+
+
+class LedgerRegistry:
+    """Every server's ledger, loaded from disk the first time it is asked for.
+
+    At most capacity ledgers are kept in memory. When another is needed the
+    one used longest ago is saved and dropped, it will be loaded again the
+    next time it is asked for. Which ledger belongs to which server is kept
+    in an index file so ledgers can be found again after a restart.
+    """
+    def __init__(self, capacity: int = 100,
+                 index_location: str = 'ledger_index.sav',
+                 on_evict: Union[Callable[[Hashable, Ledger], None],
+                                 None] = None) -> None:
+        """
+        :param capacity: Most ledgers to keep in memory at once.
+        :param index_location: Where the server to ledger index is kept.
+        :param on_evict: Called with the key and ledger when a ledger is
+            dropped, must see that it gets saved and then closed. Defaults
+            to Ledger.save() then Ledger.close().
+        """
+        self.capacity = capacity
+        self.index_location = index_location
+        self.on_evict = on_evict
+        # The ledgers in memory, least recently used first.
+        self.ledgers = OrderedDict()
+        # key -> (name, server, admin, key, storekey) for every ledger known.
+        self.known = dict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if os.path.exists(index_location):
+            with open(index_location, 'r') as file:
+                for line in file.read().splitlines():
+                    data = line.split('\t')
+                    self.known[data[0]] = tuple(data[1:])
+        return
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.ledgers or key in self.known
+
+    def __getitem__(self, key: Hashable) -> Ledger:
+        ledger = self.get(key)
+        if ledger is None:
+            raise KeyError(key)
+        return ledger
+
+    def __setitem__(self, key: Hashable, ledger: Ledger) -> None:
+        """Files a ledger under a key, replacing whatever was there.
+
+        :param key: What to file it under, usually the server's id.
+        :param ledger: The ledger.
+        """
+        args = (ledger.name, str(ledger.location), ledger.bank.owner,
+                ledger.bank.key, ledger.store_key)
+        if self.known.get(key) != args:
+            self.known[key] = args
+            self.write_index()
+        replaced = self.ledgers.get(key)
+        if replaced is not None and replaced is not ledger:
+            # whatever it had was written out before it was replaced.
+            replaced.close()
+        self.ledgers[key] = ledger
+        self.ledgers.move_to_end(key)
+        self.evict()
+        return
+
+    def get(self, key: Hashable, default: Union[Ledger, None] = None) \
+            -> Union[Ledger, None]:
+        """Gets a ledger, loading it if it isn't in memory.
+
+        :param key: What the ledger was filed under.
+        :param default: What to return if there is no such ledger.
+        :return: The ledger, default if there isn't one.
+        """
+        if key in self.ledgers:
+            self.hits += 1
+            self.ledgers.move_to_end(key)
+            return self.ledgers[key]
+        self.misses += 1
+        if key not in self.known:
+            return default
+        ledger = Ledger(*self.known[key])
+        if ledger.has_save():
+            ledger.load_save()
+        self.ledgers[key] = ledger
+        self.evict()
+        return ledger
+
+    def evict(self) -> None:
+        """Drops the least recently used ledgers until within capacity."""
+        while len(self.ledgers) > self.capacity:
+            key, ledger = self.ledgers.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is None:
+                ledger.save()
+                ledger.close()
+            else:
+                self.on_evict(key, ledger)
+        return
+
+    def write_index(self) -> None:
+        """Writes out which ledger belongs to which server."""
+        with open(self.index_location, 'w') as file:
+            for key, args in self.known.items():
+                file.write('\t'.join(str(i) for i in (key,) + args) + '\n')
+        return
+
+    def stats(self) -> str:
+        """
+        :return: How full the registry is and how well it's doing.
+        """
+        return ('%d of %d ledgers loaded, %d known.\n'
+                'Hits: %d, Misses: %d, Evictions: %d.\n'
+                % (len(self.ledgers), self.capacity, len(self.known),
+                   self.hits, self.misses, self.evictions))
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from ledger import Ledger
+from registry import LedgerRegistry
+
+
+class TestLedgerRegistry(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        self.registry = LedgerRegistry(capacity=2)
+        for server in ['A', 'B', 'C']:
+            ledger = Ledger(server, server, "TestAdmin", "TestKey",
+                            "TestStoreKey")
+            ledger.add_user("TestUser", "TestAccount", "TestUserKey", 100)
+            self.registry[server] = ledger
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def test_evicts_least_recent(self):
+        self.assertEqual(list(self.registry.ledgers), ['B', 'C'])
+        self.assertEqual(self.registry.evictions, 1)
+        self.assertTrue(os.path.exists('save_A_A.sav'))
+        self.assertIn('A', self.registry)
+
+    def test_loads_on_miss(self):
+        ledger = self.registry['A']
+        self.assertEqual(self.registry.misses, 1)
+        self.assertEqual(ledger.get_account('TestAccount').value, 100)
+        self.assertEqual(list(self.registry.ledgers), ['C', 'A'])
+        self.registry.get('A')
+        self.assertEqual(self.registry.hits, 1)
+
+    def test_unknown(self):
+        self.assertIsNone(self.registry.get('DNE'))
+        self.assertRaises(KeyError, lambda: self.registry['DNE'])
+
+    def test_index_survives_restart(self):
+        registry = LedgerRegistry(capacity=2)
+        self.assertIn('A', registry)
+        ledger = registry['A']
+        self.assertEqual(ledger.bank.key, 'TestKey')
+        self.assertEqual(ledger.store_key, 'TestStoreKey')
+        self.assertEqual([i.name for i in ledger.users], ['TestAccount'])
+
+    def test_journal_only_survives_restart(self):
+        # committed before first commits wrote a save.
+        ledger = self.registry['C']
+        ledger.transaction('Bank gives TestAccount: 5', 'TestKey')
+        ledger.journal.append(ledger.journal_record())
+        ledger.prepare_history()()
+        self.assertFalse(ledger.has_changes())
+        registry = LedgerRegistry(capacity=2)
+        ledger = registry['C']
+        self.assertEqual(ledger.get_account('TestAccount').value, 105)
+        self.assertEqual(ledger.journal.records, 1)
+
+    def test_stats(self):
+        self.assertEqual(self.registry.stats(),
+                         '2 of 2 ledgers loaded, 3 known.\n'
+                         'Hits: 0, Misses: 0, Evictions: 1.\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
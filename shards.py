@@ -0,0 +1,195 @@
+"""
+File for the shard pool, which spreads ledgers across worker processes.
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+import zlib
+from multiprocessing.connection import Connection
+from typing import List, Tuple
+
+import ledger_commands
+from registry import LedgerRegistry
+
+
+def serve(connection: Connection, shard: int, capacity: int) -> None:
+    """The loop a shard process runs, carrying out requests one at a time.
+
+    Requests are tuples of the kind and its arguments:
+    ('create', ...) and ('command', ...) take ledger_commands' arguments
+    after the books, ('ping',) answers 'pong' and ('stop',) saves every
+    ledger and ends the loop.
+
+    :param connection: The shard's end of the pipe.
+    :param shard: Which shard this is, keeps its index file apart.
+    :param capacity: Most ledgers to keep in memory.
+    """
+    books = LedgerRegistry(capacity=capacity,
+                           index_location='ledger_index_%d.sav' % shard)
+    handlers = {'create': ledger_commands.create_ledger,
+                'command': ledger_commands.run_command}
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        kind = request[0]
+        if kind == 'ping':
+            connection.send('pong')
+        elif kind == 'stop':
+            for book in books.ledgers.values():
+                book.save()
+            connection.send('stopped')
+            break
+        else:
+            try:
+                reply, write = handlers[kind](books, *request[1:])
+                book = books.get(request[1])
+                if write == ledger_commands.COMMIT:
+                    book.commit()
+                elif write == ledger_commands.SAVE:
+                    book.save()
+            except Exception as e:
+                reply = 'Something went wrong: %s' % e
+            connection.send(reply)
+    return
+
+
+class ShardPool:
+    """A pool of worker processes, each owning the ledgers of some servers.
+
+    A server always goes to the same shard, so its commands still run one at a
+    time while servers on other shards run alongside. Shards that die are
+    started again, their ledgers are loaded back from disk on next use.
+    """
+    def __init__(self, shards: int = 0, capacity: int = 100,
+                 timeout: float = 5, deadline: float = 300) -> None:
+        """
+        :param shards: How many processes to run, 0 for one per CPU.
+        :param capacity: Most ledgers each shard keeps in memory.
+        :param timeout: Seconds an idle shard has to answer a health check.
+        :param deadline: Seconds a single request may run before the shard
+            counts as hung, long enough for the slowest Load or Rectify.
+        """
+        self.count = shards or multiprocessing.cpu_count()
+        self.capacity = capacity
+        self.timeout = timeout
+        self.deadline = deadline
+        self.processes = [None] * self.count
+        self.connections = [None] * self.count
+        # Only one request may be on a shard's pipe at a time.
+        self.locks = [threading.Lock() for _ in range(self.count)]
+        # When the request on each shard's pipe was sent, None if there's
+        # none.
+        self.started = [None] * self.count
+        self.restarts = 0
+        for i in range(self.count):
+            self.spawn(i)
+        return
+
+    def spawn(self, shard: int) -> None:
+        """Starts a shard's process, replacing the old one if there was one.
+
+        :param shard: Which shard to start.
+        """
+        if self.processes[shard] is not None:
+            self.processes[shard].kill()
+            self.processes[shard].join()
+            self.connections[shard].close()
+            self.restarts += 1
+        ours, theirs = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=serve, args=(theirs, shard, self.capacity), daemon=True)
+        process.start()
+        theirs.close()
+        self.processes[shard] = process
+        self.connections[shard] = ours
+        return
+
+    def shard_of(self, key: str) -> int:
+        """Which shard a server's ledger lives on.
+
+        :param key: The server's id.
+        :return: The shard, the same one every time.
+        """
+        return zlib.crc32(str(key).encode()) % self.count
+
+    def call(self, shard: int, request: Tuple) -> str:
+        """Sends a request to a shard and waits for its answer.
+
+        :param shard: The shard to ask.
+        :param request: The request, see serve().
+        :return: The shard's reply.
+        """
+        with self.locks[shard]:
+            self.started[shard] = time.monotonic()
+            try:
+                self.connections[shard].send(request)
+                return self.connections[shard].recv()
+            except (EOFError, OSError):
+                # died, or hung and was killed by check().
+                self.spawn(shard)
+                return 'The ledger stumbled, please try again.'
+            finally:
+                self.started[shard] = None
+
+    async def run(self, kind: str, key: str, *args) -> str:
+        """Carries out a ledger request on the server's shard.
+
+        :param kind: 'create' or 'command'.
+        :param key: The server's id.
+        :param args: The rest of ledger_commands' arguments.
+        :return: The reply to send.
+        """
+        shard = self.shard_of(key)
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self.call, shard, (kind, key) + args)
+
+    def check(self) -> List[int]:
+        """Health checks every shard, restarting any that are dead or don't
+        answer in time.
+
+        A shard busy with a request isn't pinged, it only counts as hung
+        once that one request has run past the deadline. Requests queued up
+        behind it don't count against it.
+
+        :return: The shards restarted.
+        """
+        ret = []
+        for shard in range(self.count):
+            if not self.locks[shard].acquire(blocking=False):
+                started = self.started[shard]
+                if (started is not None and time.monotonic() - started
+                        > self.deadline):
+                    # killing it ends the request and has call() start it
+                    # again.
+                    self.processes[shard].kill()
+                    ret.append(shard)
+                continue
+            try:
+                try:
+                    connection = self.connections[shard]
+                    connection.send(('ping',))
+                    healthy = (connection.poll(self.timeout)
+                               and connection.recv() == 'pong')
+                except (EOFError, OSError):
+                    healthy = False
+                if not healthy or not self.processes[shard].is_alive():
+                    self.spawn(shard)
+                    ret.append(shard)
+            finally:
+                self.locks[shard].release()
+        return ret
+
+    def close(self) -> None:
+        """Has every shard save its ledgers, then stops them."""
+        for shard in range(self.count):
+            with self.locks[shard]:
+                try:
+                    self.connections[shard].send(('stop',))
+                    self.connections[shard].recv()
+                except (EOFError, OSError):
+                    pass
+                self.processes[shard].join()
+        return
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+from shards import ShardPool
+
+
+class TestShardPool(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        self.pool = ShardPool(2)
+
+    def tearDown(self):
+        self.pool.close()
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def run_command(self, key, command):
+        return asyncio.run(self.pool.run('command', key, 'Server', 'Admin',
+                                         'AdminKey', command))
+
+    def test_commands(self):
+        self.assertEqual(
+            asyncio.run(self.pool.run('create', '1', 'Server', 'Admin',
+                                      'AdminKey', 'Test')),
+            'Ledger Created.')
+        self.assertEqual(self.run_command('1', 'Add Account Alice'),
+                         'Alice account added.\n')
+        self.assertEqual(self.run_command('1', 'Bank gives Alice: 10'),
+                         'Transaction Complete.')
+        self.assertEqual(self.run_command('2', 'Total Value'),
+                         'No Ledger on this server.')
+        self.assertTrue(os.path.exists('journal_save_Server_Test.sav'))
+
+    def test_same_shard(self):
+        self.assertEqual(self.pool.shard_of('12345'),
+                         self.pool.shard_of('12345'))
+
+    def test_check_restarts_dead_shard(self):
+        self.assertEqual(self.pool.check(), [])
+        self.pool.processes[1].kill()
+        self.pool.processes[1].join()
+        self.assertEqual(self.pool.check(), [1])
+        self.assertEqual(self.pool.restarts, 1)
+        self.assertEqual(self.pool.check(), [])
+
+    def test_check_leaves_busy_shard(self):
+        with self.pool.locks[0]:
+            self.pool.started[0] = time.monotonic()
+            self.assertEqual(self.pool.check(), [])
+            self.pool.started[0] = None
+        self.assertTrue(self.pool.processes[0].is_alive())
+        self.assertEqual(self.pool.restarts, 0)
+
+    def test_check_restarts_hung_shard(self):
+        self.pool.deadline = 0.2
+        os.kill(self.pool.processes[0].pid, signal.SIGSTOP)
+        replies = []
+        stuck = threading.Thread(target=lambda: replies.append(
+            self.pool.call(0, ('ping',))))
+        stuck.start()
+        time.sleep(0.1)
+        # still within the deadline, only busy.
+        self.assertEqual(self.pool.check(), [])
+        time.sleep(0.2)
+        self.assertEqual(self.pool.check(), [0])
+        stuck.join()
+        self.assertEqual(replies,
+                         ['The ledger stumbled, please try again.'])
+        self.assertEqual(self.pool.check(), [])
+
+    def test_crash_is_reported(self):
+        self.pool.processes[0].kill()
+        self.pool.processes[0].join()
+        self.assertEqual(self.pool.call(0, ('ping',)),
+                         'The ledger stumbled, please try again.')
+        self.assertEqual(self.pool.call(0, ('ping',)), 'pong')
+
+
+if __name__ == '__main__':
+    unittest.main()
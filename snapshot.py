@@ -0,0 +1,231 @@
+"""
+File for binary ledger snapshots, the whole of a ledger's state in a form
+that loads without parsing.
+
+A snapshot is a header, the magic bytes, a format version, the byte order it
+was written in and how many sections follow, then the sections. Each section
+is a four byte tag, the typecode of the array it holds and its length in
+bytes, then the array itself padded out to eight bytes. Every column of the
+ledger gets its own section so it can be read straight out of the memory
+mapped file.
+
+Run with python snapshot.py [Server] [Name] to convert a ledger's .sav, Items
+csv and config files to a snapshot.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from typing import Iterator, List, Mapping, Tuple
+
+MAGIC = b'BBLS'
+VERSION = 2
+# magic, version, byte order (0 little, 1 big), section count.
+HEADER = struct.Struct('<4sHBxQ')
+# tag, typecode, length in bytes. Both are eight bytes long, so with the
+# padding every array starts eight byte aligned.
+SECTION = struct.Struct('<4sc3xQ')
+BYTE_ORDER = 0 if sys.byteorder == 'little' else 1
+
+
+class SnapshotError(Exception):
+    """A file that isn't a snapshot this version can read."""
+
+
+def string_table(strings: Mapping[str, int], name: str) -> int:
+    """Gets a string's number in the string table, adding it if new.
+
+    :param strings: The table, string -> number.
+    :param name: The string.
+    :return: Its number.
+    """
+    ret = strings.get(name)
+    if ret is None:
+        ret = strings[name] = len(strings)
+    return ret
+
+
+def dump(accounts: List, library: Mapping[str, float],
+         locks: Tuple[bool, bool, bool, bool]) -> bytes:
+    """Builds a snapshot.
+
+    :param accounts: Every account, the Bank, Store and Pot first.
+    :param library: Item name -> value.
+    :param locks: The user, transaction, store and bank locks.
+    :return: The snapshot.
+    """
+    strings = dict()
+    item_names = array('I', (string_table(strings, i) for i in library))
+    item_values = array('d', library.values())
+    owners = array('I')
+    names = array('I')
+    keys = array('I')
+    values = array('d')
+    # where each account's inventory starts in held_items and held_counts.
+    starts = array('I', [0])
+    held_items = array('I')
+    held_counts = array('i')
+    for account in accounts:
+        owners.append(string_table(strings, account.owner))
+        names.append(string_table(strings, account.name))
+        keys.append(string_table(strings, str(account.key)))
+        values.append(account.value)
+        for item, amount in account.inventory.items():
+            held_items.append(string_table(strings, item))
+            held_counts.append(amount)
+        starts.append(len(held_items))
+    encoded = [i.encode() for i in strings]
+    sections = [(b'STRL', array('I', map(len, encoded))),
+                (b'STRS', array('B', b''.join(encoded))),
+                (b'ITMN', item_names), (b'ITMV', item_values),
+                (b'ACOW', owners), (b'ACNM', names), (b'ACKY', keys),
+                (b'ACVL', values), (b'ACIX', starts),
+                (b'INVI', held_items), (b'INVC', held_counts),
+                (b'LOCK', array('B', locks))]
+    ret = [HEADER.pack(MAGIC, VERSION, BYTE_ORDER, len(sections))]
+    for tag, column in sections:
+        data = column.tobytes()
+        ret.append(SECTION.pack(tag, column.typecode.encode(), len(data)))
+        ret.append(data + bytes(-len(data) % 8))
+    return b''.join(ret)
+
+
+class Snapshot:
+    """A snapshot read back through a memory map.
+
+    Columns are memoryviews straight onto the file where the byte order
+    allows, nothing is copied until the accounts are built.
+    """
+    def __init__(self, location: str) -> None:
+        """
+        :param location: The snapshot's file.
+        """
+        with open(location, 'rb') as file:
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                raise SnapshotError('%s is not a snapshot.' % location)
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.read(memoryview(self.map), location)
+        return
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Snapshot':
+        """Reads a snapshot already in memory.
+
+        :param data: The snapshot, as dump() made it.
+        :return: The snapshot.
+        """
+        if len(data) < HEADER.size:
+            raise SnapshotError('Not a snapshot.')
+        ret = cls.__new__(cls)
+        ret.map = None
+        ret.read(memoryview(data), 'Snapshot')
+        return ret
+
+    def read(self, view: memoryview, location: str) -> None:
+        """Checks the header and finds the sections.
+
+        :param view: The whole snapshot.
+        :param location: Where it came from, for errors.
+        """
+        self.view = view
+        magic, version, order, count = HEADER.unpack_from(self.view)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError('%s is not a snapshot.' % location)
+        if version != VERSION:
+            self.close()
+            raise SnapshotError('%s is snapshot version %d, only %d is known.'
+                                % (location, version, VERSION))
+        self.swap = order != BYTE_ORDER
+        self.sections = dict()
+        offset = HEADER.size
+        for _ in range(count):
+            tag, typecode, length = SECTION.unpack_from(self.view, offset)
+            offset += SECTION.size
+            self.sections[tag] = (typecode.decode(),
+                                  self.view[offset:offset + length])
+            offset += length + (-length % 8)
+        return
+
+    def close(self) -> None:
+        """Lets go of the file, any column still held from it must be let go
+        of first."""
+        self.sections = dict()
+        self.view.release()
+        if self.map is not None:
+            self.map.close()
+        return
+
+    def column(self, tag: bytes):
+        """
+        :param tag: The section's tag.
+        :return: The array it holds, a view onto the file unless the byte
+            order has to be changed.
+        """
+        typecode, data = self.sections[tag]
+        if not self.swap:
+            return data.cast(typecode)
+        ret = array(typecode, bytes(data))
+        ret.byteswap()
+        return ret
+
+    def strings(self) -> List[str]:
+        """
+        :return: The string table, every string interned.
+        """
+        blob = bytes(self.sections[b'STRS'][1]).decode()
+        ends = list(accumulate(self.column(b'STRL')))
+        return [sys.intern(blob[start:end])
+                for start, end in zip([0] + ends, ends)]
+
+    def library(self, strings: List[str]) -> Mapping[str, float]:
+        """
+        :param strings: The string table.
+        :return: Item name -> value.
+        """
+        return dict(zip([strings[i] for i in self.column(b'ITMN')],
+                        self.column(b'ITMV').tolist()))
+
+    def accounts(self, strings: List[str]) -> Iterator[
+            Tuple[str, str, str, float, Mapping[str, int]]]:
+        """
+        :param strings: The string table.
+        :return: Each account's owner, name, key, value and inventory, the
+            Bank, Store and Pot first.
+        """
+        starts = self.column(b'ACIX').tolist()
+        items = [strings[i] for i in self.column(b'INVI')]
+        counts = self.column(b'INVC').tolist()
+        for owner, name, key, value, start, end in zip(
+                self.column(b'ACOW'), self.column(b'ACNM'),
+                self.column(b'ACKY'), self.column(b'ACVL').tolist(),
+                starts, starts[1:]):
+            yield (strings[owner], strings[name], strings[key], value,
+                   dict(zip(items[start:end], counts[start:end])))
+
+    def locks(self) -> Tuple[bool, bool, bool, bool]:
+        """
+        :return: The user, transaction, store and bank locks.
+        """
+        return tuple(bool(i) for i in self.column(b'LOCK'))
+
+
+def convert(server: str, name: str) -> str:
+    """Converts a ledger saved as text to a snapshot.
+
+    :param server: The server it belongs to.
+    :param name: The ledger's name.
+    :return: Where the snapshot went.
+    """
+    import ledger
+    book = ledger.Ledger(name, server, '', '', '')
+    book.load_save()
+    book.binary_snapshots = True
+    book.save()
+    return book.snapshot_location
+
+
+if __name__ == '__main__':
+    print(convert(sys.argv[1], sys.argv[2]))
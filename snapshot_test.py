@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+import ledger
+import snapshot
+from account import Account
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        self.ledger = self.new_ledger()
+        self.ledger.library.new_item('Test', 100)
+        self.ledger.library.new_item('Relic', -2)
+        self.ledger.add_user("TestUser", "TestAccount", "TestUserKey", 100,
+                             {'Test': 1})
+        self.ledger.add_user("TestUser2", "TestAccount2", "TestUserKey2", 5)
+        self.ledger.transaction('Bank gives Pot: 7, Relic:2', 'TestKey')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    @staticmethod
+    def new_ledger():
+        return ledger.Ledger("Snap", "Test", "TestAdmin", "TestKey",
+                             "TestStoreKey")
+
+    def test_round_trip(self):
+        accounts = [Account('Admin', 'Bank', 'Key', 1.5),
+                    Account('Bob', 'Bob', '12', 3, {'Ring': 2, 'Sword': 1})]
+        with open('test.snap', 'wb') as file:
+            file.write(snapshot.dump(accounts, {'Ring': 5.0, 'Sword': -1},
+                                     (True, False, False, True)))
+        data = snapshot.Snapshot('test.snap')
+        strings = data.strings()
+        self.assertEqual(list(data.accounts(strings)),
+                         [('Admin', 'Bank', 'Key', 1.5, {}),
+                          ('Bob', 'Bob', '12', 3.0, {'Ring': 2, 'Sword': 1})])
+        self.assertEqual(data.library(strings), {'Ring': 5.0, 'Sword': -1.0})
+        self.assertEqual(data.locks(), (True, False, False, True))
+        data.close()
+
+    def test_not_a_snapshot(self):
+        with open('bad.snap', 'wb') as file:
+            file.write(b'Bank\tBank\tKey\t0\t\n' * 4)
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.Snapshot('bad.snap')
+        with open('future.snap', 'wb') as file:
+            file.write(snapshot.HEADER.pack(snapshot.MAGIC, 99,
+                                            snapshot.BYTE_ORDER, 0))
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.Snapshot('future.snap')
+
+    def test_ledger_save_and_load(self):
+        self.ledger.toggle_store_lock()
+        self.ledger.binary_snapshots = True
+        self.ledger.save()
+        self.assertTrue(os.path.exists(self.ledger.snapshot_location))
+        self.ledger.transaction('TestAccount gives TestAccount2: 10',
+                                'TestUserKey')
+        self.ledger.commit()
+        loaded = self.new_ledger()
+        loaded.load_save()
+        self.assertEqual([(i.name, i.value, i.inventory) for i in
+                          [loaded.bank, loaded.store, loaded.pot] +
+                          loaded.users],
+                         [(i.name, i.value, i.inventory) for i in
+                          [self.ledger.bank, self.ledger.store,
+                           self.ledger.pot] + self.ledger.users])
+        self.assertEqual(loaded.library.library, self.ledger.library.library)
+        self.assertTrue(loaded.store_lock)
+        self.assertEqual(loaded.total_value()[:3],
+                         self.ledger.total_value()[:3])
+        self.assertEqual(list(loaded.history), list(self.ledger.history))
+
+    def test_text_save_replaces_snapshot(self):
+        self.ledger.binary_snapshots = True
+        self.ledger.save()
+        self.ledger.binary_snapshots = False
+        self.ledger.transaction('Bank gives Pot: 1', 'TestKey')
+        self.ledger.save()
+        self.assertFalse(os.path.exists(self.ledger.snapshot_location))
+        loaded = self.new_ledger()
+        loaded.load_save()
+        self.assertEqual(loaded.pot.value, 8)
+
+    def test_convert(self):
+        self.ledger.save()
+        self.assertEqual(snapshot.convert('Test', 'Snap'),
+                         self.ledger.snapshot_location)
+        os.remove(self.ledger.save_location)
+        loaded = self.new_ledger()
+        loaded.load_save()
+        self.assertEqual(loaded.get_account('TestAccount').inventory,
+                         {'Test': 1})
+        self.assertEqual(loaded.pot.inventory, {'Relic': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,445 @@
+"""
+File for ledger storage backends, what a ledger is kept in when it isn't
+kept in its save files.
+
+Run with python storage.py [Server] [Name] to move a ledger's save files and
+history into a SQLite database.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Mapping, NamedTuple, Sequence, Tuple, Union
+
+from history import History, HistoryRecord
+
+# owner, name, key, value, inventory
+StoredAccount = Tuple[str, str, str, float, Mapping[str, int]]
+
+
+class Stored(NamedTuple):
+    """Everything a backend holds about a ledger but its history."""
+    accounts: List[StoredAccount]
+    library: Mapping[str, float]
+    locks: Tuple[bool, bool, bool, bool]
+
+
+class Changes(NamedTuple):
+    """Everything a commit hands a backend to write.
+
+    Accounts are written whole, ones already kept are replaced and keep their
+    place in the order, new ones go at the end.
+    """
+    accounts: Sequence[StoredAccount] = ()
+    removed: Sequence[str] = ()
+    items: Mapping[str, float] = {}
+    deleted: Sequence[str] = ()
+    locks: Union[Tuple[bool, bool, bool, bool], None] = None
+    history: Sequence[HistoryRecord] = ()
+    # Whether this is everything, anything else kept is dropped first.
+    replace: bool = False
+
+
+class Storage(ABC):
+    """What a storage backend has to do for a ledger.
+
+    A ledger kept in a backend doesn't use its save files, journal or history
+    log. Each commit hands the backend what changed since the last one,
+    which it must write all or nothing. The history is the backend's own
+    History, reading back from it whatever isn't held in memory.
+    """
+    @abstractmethod
+    def exists(self) -> bool:
+        """
+        :return: Whether the backend has a ledger in it.
+        """
+
+    @abstractmethod
+    def load(self) -> Stored:
+        """
+        :return: The ledger as last written, the Bank, Store and Pot first.
+        """
+
+    @abstractmethod
+    def write(self, changes: Changes) -> None:
+        """Writes a commit.
+
+        :param changes: What changed.
+        """
+
+    @abstractmethod
+    def history(self) -> History:
+        """
+        :return: A history reading from the backend.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Lets go of whatever the backend holds open, nothing may be read
+        or written after."""
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    owner TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS inventories (
+    account TEXT NOT NULL,
+    item TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (account, item)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS inventories_item ON inventories (item);
+CREATE TABLE IF NOT EXISTS items (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS locks (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    user INTEGER NOT NULL,
+    transactions INTEGER NOT NULL,
+    store INTEGER NOT NULL,
+    bank INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    actor TEXT NOT NULL,
+    action TEXT NOT NULL,
+    text TEXT NOT NULL,
+    changes TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS history_accounts (
+    account TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (account, seq)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS history_items (
+    item TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (item, seq)) WITHOUT ROWID;
+"""
+
+
+class SQLiteStorage(Storage):
+    """A ledger kept in a SQLite database in WAL mode.
+
+    Accounts, inventories, items, locks and the history each have a table,
+    and which history records touched each account and item is indexed so
+    an account's or item's history is a single index lookup. Each commit is
+    one database transaction.
+
+    The connection is shared by the event loop and the persistence worker's
+    thread, a lock keeps them to one at a time.
+    """
+    def __init__(self, location: str, durability: str = 'none') -> None:
+        """
+        :param location: The database's file.
+        :param durability: The ledger's durability, 'sync' waits for every
+            commit to reach the disk, anything else leaves the last few to
+            the next checkpoint of the WAL.
+        """
+        self.location = location
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(location, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=%s' % (
+            'FULL' if durability == 'sync' else 'NORMAL'))
+        self.connection.executescript(SCHEMA)
+        return
+
+    def query(self, sql: str, parameters: Sequence = ()) -> List[tuple]:
+        """
+        :param sql: A select.
+        :param parameters: Its parameters.
+        :return: Every row it gives.
+        """
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def exists(self) -> bool:
+        """
+        :return: Whether a ledger has been written to the database.
+        """
+        return bool(self.query('SELECT 1 FROM accounts LIMIT 1'))
+
+    def load(self) -> Stored:
+        """
+        :return: The ledger as last committed, the Bank, Store and Pot first.
+        """
+        inventories = dict()
+        for account, item, amount in self.query(
+                'SELECT account, item, amount FROM inventories'):
+            inventories.setdefault(account, dict())[item] = amount
+        accounts = [(owner, name, key, value, inventories.get(name, dict()))
+                    for owner, name, key, value in self.query(
+                        'SELECT owner, name, key, value FROM accounts '
+                        'ORDER BY id')]
+        library = dict(self.query('SELECT name, value FROM items'))
+        locks = self.query('SELECT user, transactions, store, bank FROM locks')
+        return Stored(accounts, library,
+                      tuple(bool(i) for i in locks[0]) if locks
+                      else (False, False, False, False))
+
+    def write(self, changes: Changes) -> None:
+        """Writes a commit as a single transaction.
+
+        :param changes: What changed.
+        """
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute('BEGIN')
+            try:
+                self.write_changes(cursor, changes)
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+        return
+
+    @staticmethod
+    def write_changes(cursor: sqlite3.Cursor, changes: Changes) -> None:
+        """Writes a commit inside a transaction already begun.
+
+        :param cursor: The transaction's cursor.
+        :param changes: What changed.
+        """
+        if changes.replace:
+            for table in ('accounts', 'inventories', 'items', 'locks',
+                          'history', 'history_accounts', 'history_items'):
+                cursor.execute('DELETE FROM %s' % table)
+        names = [(i[1],) for i in changes.accounts] + \
+            [(i,) for i in changes.removed]
+        cursor.executemany('DELETE FROM inventories WHERE account = ?', names)
+        cursor.executemany('DELETE FROM accounts WHERE name = ?',
+                           [(i,) for i in changes.removed])
+        cursor.executemany(
+            'INSERT INTO accounts (owner, name, key, value) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET '
+            'owner = excluded.owner, key = excluded.key, '
+            'value = excluded.value',
+            [(owner, name, str(key), value)
+             for owner, name, key, value, _ in changes.accounts])
+        cursor.executemany(
+            'INSERT INTO inventories (account, item, amount) VALUES (?, ?, ?)',
+            [(name, item, amount)
+             for _, name, _, _, inventory in changes.accounts
+             for item, amount in inventory.items()])
+        cursor.executemany('INSERT OR REPLACE INTO items (name, value) '
+                           'VALUES (?, ?)', changes.items.items())
+        cursor.executemany('DELETE FROM items WHERE name = ?',
+                           [(i,) for i in changes.deleted])
+        if changes.locks is not None:
+            cursor.execute('INSERT OR REPLACE INTO locks VALUES (0, ?, ?, ?, ?)',
+                           changes.locks)
+        cursor.executemany(
+            'INSERT INTO history VALUES (?, ?, ?, ?, ?, ?)',
+            [(i.seq, i.time, i.actor, i.action, i.text, json.dumps(i.changes))
+             for i in changes.history])
+        cursor.executemany(
+            'INSERT OR IGNORE INTO history_accounts VALUES (?, ?)',
+            [(name, i.seq) for i in changes.history
+             for name, _, _ in i.changes])
+        cursor.executemany(
+            'INSERT OR IGNORE INTO history_items VALUES (?, ?)',
+            [(item, i.seq) for i in changes.history
+             for _, _, items in i.changes for item, _ in items])
+        return
+
+    def history(self, tail_size: int = 200) -> 'SQLiteHistory':
+        """
+        :param tail_size: Most recent records to keep in memory.
+        :return: A history reading from the database.
+        """
+        return SQLiteHistory(self, tail_size)
+
+    def close(self) -> None:
+        """Closes the connection."""
+        with self.lock:
+            self.connection.close()
+        return
+
+
+def load_record(row: Sequence) -> HistoryRecord:
+    """
+    :param row: A row of the history table.
+    :return: The record it holds.
+    """
+    seq, when, actor, action, text, changes = row
+    return HistoryRecord(seq, when, actor, action, text,
+                         tuple((name, value, tuple(tuple(i) for i in items))
+                               for name, value, items in json.loads(changes)))
+
+
+class SQLiteHistory(History):
+    """A history kept in the history tables of a SQLite database.
+
+    The database indexes it, so nothing is indexed in memory, and anything
+    not held in memory is read back with a query rather than from the log.
+    Records are written by the ledger's commits, along with everything else
+    they changed.
+    """
+    def __init__(self, storage: SQLiteStorage, tail_size: int = 200) -> None:
+        """
+        :param storage: The database.
+        :param tail_size: Most recent records to keep in memory.
+        """
+        super().__init__(storage.location, tail_size=tail_size)
+        self.storage = storage
+        return
+
+    def index(self, record: HistoryRecord) -> None:
+        """Done by the database."""
+        return
+
+    def unindex(self, record: HistoryRecord) -> None:
+        """Done by the database."""
+        return
+
+    def write(self, records: List[HistoryRecord]) -> None:
+        """Writes records on their own, commits write them with the rest.
+
+        :param records: The records, in order and following on from the ones
+            already written.
+        """
+        self.storage.write(Changes(history=records))
+        return
+
+    def load(self) -> None:
+        """Finds how many records there are and reads in the tail."""
+        self.pending = []
+        rows = self.storage.query('SELECT * FROM history ORDER BY seq DESC '
+                                  'LIMIT ?', (self.tail.maxlen,))
+        self.tail.clear()
+        self.tail.extend(load_record(i) for i in reversed(rows))
+        self.count = self.flushed = self.indexed = (rows[0][0] + 1 if rows
+                                                    else 0)
+        return
+
+    def read_range(self, start: int, stop: int) -> List[HistoryRecord]:
+        """
+        :param start: The first record's number.
+        :param stop: One past the last record's number, all of them written.
+        :return: The records, oldest first.
+        """
+        return [load_record(i) for i in self.storage.query(
+            'SELECT * FROM history WHERE seq >= ? AND seq < ? ORDER BY seq',
+            (start, stop))]
+
+    def read_seqs(self, seqs: Sequence[int]) -> List[HistoryRecord]:
+        """
+        :param seqs: The records' numbers, in order, all of them written.
+        :return: The records.
+        """
+        if not seqs:
+            return []
+        return [load_record(i) for i in self.storage.query(
+            'SELECT * FROM history WHERE seq IN (%s) ORDER BY seq'
+            % ','.join('?' * len(seqs)), seqs)]
+
+    def touching(self, table: str, name: str, start: int, stop: int,
+                 count: int) -> List[HistoryRecord]:
+        """Finds the latest records touching an account or item.
+
+        Records held in memory are searched there, they may not have been
+        committed yet, and the index is used for the ones before.
+
+        :param table: 'accounts' or 'items'.
+        :param name: The account or item.
+        :param start: The first record's number to look at.
+        :param stop: One past the last record's number to look at.
+        :param count: Most records to get.
+        :return: The records, oldest first.
+        """
+        held, first_held = self.held()
+        found = []
+        for record in held:
+            if not start <= record.seq < stop:
+                continue
+            if table == 'accounts':
+                names = [i[0] for i in record.changes]
+            else:
+                names = [item for i in record.changes for item, _ in i[2]]
+            if name in names:
+                found.append(record)
+        found = found[-count:]
+        if len(found) < count and start < first_held:
+            column = 'account' if table == 'accounts' else 'item'
+            rows = self.storage.query(
+                'SELECT history.* FROM history_%s JOIN history USING (seq) '
+                'WHERE %s = ? AND seq >= ? AND seq < ? ORDER BY seq DESC '
+                'LIMIT ?' % (table, column),
+                (name, start, min(stop, first_held), count - len(found)))
+            found = [load_record(i) for i in reversed(rows)] + found
+        return found
+
+    def of_account(self, name: str, count: int) -> List[HistoryRecord]:
+        """
+        :param name: The account.
+        :param count: Most records to get.
+        :return: The latest records changing the account, oldest first.
+        """
+        return self.touching('accounts', name, 0, self.count, count)
+
+    def of_account_between(self, name: str, start: int,
+                           stop: int) -> List[HistoryRecord]:
+        """
+        :param name: The account.
+        :param start: The first record's number.
+        :param stop: One past the last record's number.
+        :return: The records in that run changing the account, oldest first.
+        """
+        return self.touching('accounts', name, start, stop, stop - start)
+
+    def of_item(self, name: str, count: int) -> List[HistoryRecord]:
+        """
+        :param name: The item.
+        :param count: Most records to get.
+        :return: The latest records moving the item, oldest first.
+        """
+        return self.touching('items', name, 0, self.count, count)
+
+
+def stored_accounts(accounts: Iterable) -> List[StoredAccount]:
+    """
+    :param accounts: Accounts.
+    :return: What a backend keeps of each.
+    """
+    return [(i.owner, i.name, str(i.key), i.value, dict(i.inventory))
+            for i in accounts]
+
+
+def migrate(server: str, name: str) -> str:
+    """Moves a ledger kept in save files, and its history, into a SQLite
+    database. The files are left as they are.
+
+    :param server: The server it belongs to.
+    :param name: The ledger's name.
+    :return: Where the database went.
+    """
+    import ledger
+    book = ledger.Ledger(name, server, '', '', '')
+    book.load_save()
+    location = book.storage_location
+    if os.path.exists(location):
+        raise FileExistsError('%s already exists.' % location)
+    database = SQLiteStorage(location)
+    try:
+        database.write(Changes(
+            stored_accounts([book.bank, book.store, book.pot] + book.users),
+            items=book.library.library, locks=book.locks()))
+        records = []
+        for record in book.history:
+            records.append(record)
+            if len(records) == book.history.chunk_size:
+                database.write(Changes(history=records))
+                records = []
+        database.write(Changes(history=records))
+    finally:
+        database.close()
+    return location
+
+
+if __name__ == '__main__':
+    print(migrate(sys.argv[1], sys.argv[2]))
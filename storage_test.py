@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import ledger
+import storage
+from registry import LedgerRegistry
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        ledger.Ledger.storage = storage.SQLiteStorage
+        self.ledger = self.new_ledger()
+        self.ledger.library.new_item('Test', 100)
+        self.ledger.add_user("TestUser", "TestAccount", "TestUserKey", 100,
+                             {'Test': 1})
+        self.ledger.add_user("TestUser2", "TestAccount2", "TestUserKey2", 5)
+        self.ledger.transaction('Bank gives Pot: 7', 'TestKey')
+        self.ledger.commit()
+
+    def tearDown(self):
+        self.ledger.backend.close()
+        ledger.Ledger.storage = None
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    @staticmethod
+    def new_ledger():
+        return ledger.Ledger("Store", "Test", "TestAdmin", "TestKey",
+                             "TestStoreKey")
+
+    def load(self):
+        loaded = self.new_ledger()
+        self.assertTrue(loaded.has_save())
+        loaded.load_save()
+        return loaded
+
+    def test_commit_and_load(self):
+        self.ledger.transaction('TestAccount gives TestAccount2: 10, Test:1',
+                                'TestUserKey')
+        self.ledger.toggle_store_lock()
+        self.ledger.commit()
+        self.assertFalse(os.path.exists(self.ledger.save_location))
+        self.assertFalse(os.path.exists(self.ledger.journal.location))
+        loaded = self.load()
+        self.assertEqual([(i.name, i.value, i.inventory) for i in
+                          [loaded.bank, loaded.store, loaded.pot] +
+                          loaded.users],
+                         [(i.name, i.value, i.inventory) for i in
+                          [self.ledger.bank, self.ledger.store,
+                           self.ledger.pot] + self.ledger.users])
+        self.assertEqual(loaded.library.library, {'Test': 100})
+        self.assertTrue(loaded.store_lock)
+        self.assertEqual(list(loaded.history), list(self.ledger.history))
+        self.assertEqual(loaded.who_has('Test'), {'TestAccount2': 1})
+        loaded.backend.close()
+
+    def test_commit_writes_only_changes(self):
+        rows = []
+        self.ledger.backend.connection.set_trace_callback(rows.append)
+        self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+        self.ledger.commit()
+        self.ledger.backend.connection.set_trace_callback(None)
+        written = [i for i in rows if i.startswith('INSERT INTO accounts')]
+        self.assertEqual(len(written), 1)
+        self.assertIn("'TestAccount'", written[0])
+        self.assertEqual(rows[0], 'BEGIN')
+        self.assertEqual(rows[-1], 'COMMIT')
+
+    def test_failed_write_rolls_back(self):
+        self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+        records = self.ledger.history.pending
+        # the record is already there, so the insert fails.
+        self.ledger.history.pending = [self.ledger.history.tail[0]]
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.ledger.commit()
+        self.ledger.history.pending = records
+        self.assertEqual(self.load().get_account('TestAccount').value, 100)
+
+    def test_removed_user(self):
+        self.ledger.unregister_account('TestAccount2')
+        self.ledger.users.pop()
+        self.ledger.commit()
+        self.assertIsNone(self.load().get_account('TestAccount2'))
+
+    def test_history_queries(self):
+        for i in range(5):
+            self.ledger.transaction('Bank gives TestAccount: %d' % (i + 1),
+                                    'TestKey')
+        self.ledger.commit()
+        loaded = self.new_ledger()
+        loaded.history = loaded.backend.history(tail_size=2)
+        loaded.load_save()
+        self.assertEqual(len(loaded.history), len(self.ledger.history))
+        self.assertEqual(len(loaded.history.tail), 2)
+        self.assertEqual(loaded.history.accounts, dict())
+        self.assertEqual([i.text for i in
+                          loaded.history.of_account('TestAccount', 3)],
+                         ['Bank gives TestAccount: %d' % i for i in (3, 4, 5)])
+        self.assertEqual([i.seq for i in loaded.history.of_item('Test', 5)],
+                         [0])
+        self.assertEqual(loaded.balance_at('TestAccount', 5),
+                         self.ledger.balance_at('TestAccount', 5))
+        self.assertEqual(loaded.transaction_log(3),
+                         self.ledger.transaction_log(3))
+        loaded.backend.close()
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            storage.Storage()
+
+    def test_evict_closes(self):
+        books = LedgerRegistry(capacity=1)
+        books['Store'] = self.ledger
+        self.ledger.transaction('Bank gives TestAccount: 1', 'TestKey')
+        other = ledger.Ledger("Other", "Test", "TestAdmin", "TestKey",
+                              "TestStoreKey")
+        books['Other'] = other
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.ledger.backend.query('SELECT 1')
+        self.ledger = books['Store']
+        self.assertEqual(self.ledger.get_account('TestAccount').value, 101)
+        other.close()
+
+    def test_migrate(self):
+        self.ledger.backend.close()
+        ledger.Ledger.storage = None
+        files = ledger.Ledger("Files", "Test", "TestAdmin", "TestKey",
+                              "TestStoreKey")
+        files.add_user("TestUser", "TestAccount", "TestUserKey", 100)
+        files.transaction('Bank gives TestAccount: 5', 'TestKey')
+        files.save()
+        self.assertEqual(storage.migrate('Test', 'Files'),
+                         files.storage_location)
+        with self.assertRaises(FileExistsError):
+            storage.migrate('Test', 'Files')
+        ledger.Ledger.storage = storage.SQLiteStorage
+        loaded = ledger.Ledger("Files", "Test", "TestAdmin", "TestKey",
+                               "TestStoreKey")
+        loaded.load_save()
+        self.assertEqual(loaded.get_account('TestAccount').value, 105)
+        self.assertEqual(list(loaded.history), list(files.history))
+        self.ledger = loaded
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+File for the transaction record and the parser that builds it from a command.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, NamedTuple, Tuple, Union
+
+
+class Transaction(NamedTuple):
+    """A parsed transaction command, ready to be carried out by the ledger.
+
+    Action is one of give, take, buy or sell. Items are kept as (name, amount)
+    pairs so the record can't be changed once parsed.
+    """
+    command: str
+    giver: str
+    taker: str
+    action: str
+    value: float
+    items: Tuple[Tuple[str, int], ...]
+
+    def item_dict(self) -> Dict[str, int]:
+        """
+        :return: A fresh dict of the items, safe to hand to an account.
+        """
+        return dict(self.items)
+
+
+# [Account] gives [Account]: ..., [Account] takes from [Account]: ...,
+# [Account] buys ... and [Account] sells ...
+COMMAND = re.compile(r'(?P<giver>[^ ]+) (?:gives (?P<give>[^ ]+)'
+                     r'|takes from (?P<take>[^ ]+)|(?P<trade>buy|sell)s )')
+
+
+@lru_cache(maxsize=256)
+def parse_transaction(command: str) -> Union[Transaction, str]:
+    """Parses a transaction command.
+
+    Only the syntax is checked here, whether the accounts and items exist is
+    up to the ledger carrying it out. Repeated commands are served from a
+    cache.
+
+    :param command: The command to parse.
+        Valid commands:
+            [Account] gives [Account]: [Value], [Items...]
+            [Account] takes from [Account]: [Value], [Items...]
+            [Account] sells [Items...]
+            [Account] buys [Items...]
+        Item must be in [Name]: [Count] format.
+    :return: The parsed transaction, or a string saying what was wrong.
+    """
+    match = COMMAND.match(command)
+    if match is None:
+        return 'Command not Recognized.\n'
+    if match.group('trade'):
+        action = match.group('trade')
+        taker = 'Store'
+        inputs = command[match.end():]
+    else:
+        action = 'give' if match.group('give') else 'take'
+        taker = (match.group('give') or match.group('take')).replace(':', '')
+        if ':' not in command:
+            return "Improper Syntax.\n"
+        inputs = command.split(':', 1)[1]
+    inputs = inputs.split(',')
+    value = 0
+    if ':' not in inputs[0]:
+        try:
+            value = float(inputs[0])
+        except ValueError:
+            return "Improper Syntax.\n"
+        inputs = inputs[1:]
+    items = {}
+    for item in inputs:
+        if not item:  # if empty, ignore
+            continue
+        if item.count(':') != 1:
+            return "Item must be in [Item]:[Amount] format.\n"
+        name, amount = item.split(':')
+        try:
+            items[name.strip()] = int(amount)
+        except ValueError:
+            return "Item must be in [Item]:[Amount] format.\n"
+    return Transaction(command, match.group('giver'), taker, action, value,
+                       tuple(items.items()))
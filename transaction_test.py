@@ -0,0 +1,54 @@
+import unittest
+from transaction import Transaction, parse_transaction
+
+
+class TestParseTransaction(unittest.TestCase):
+    def test_give(self):
+        self.assertEqual(
+            parse_transaction('Alice gives Bob: 100, Sword:1, Shield: 2'),
+            Transaction('Alice gives Bob: 100, Sword:1, Shield: 2', 'Alice',
+                        'Bob', 'give', 100, (('Sword', 1), ('Shield', 2))))
+
+    def test_take_from(self):
+        record = parse_transaction('Alice takes from Pot: Sword:1')
+        self.assertEqual((record.giver, record.taker, record.action),
+                         ('Alice', 'Pot', 'take'))
+        self.assertEqual(record.value, 0)
+        self.assertEqual(record.item_dict(), {'Sword': 1})
+
+    def test_buy_and_sell(self):
+        record = parse_transaction('Alice buys Sword:2')
+        self.assertEqual((record.taker, record.action, record.items),
+                         ('Store', 'buy', (('Sword', 2),)))
+        self.assertEqual(parse_transaction('Alice sells Sword:2').action,
+                         'sell')
+
+    def test_value_only(self):
+        record = parse_transaction('Bank gives Alice: 12.5')
+        self.assertEqual((record.value, record.items), (12.5, ()))
+
+    def test_not_recognized(self):
+        self.assertEqual(parse_transaction('Alice steals Bob: 100'),
+                         'Command not Recognized.\n')
+        self.assertEqual(parse_transaction('Alice buys'),
+                         'Command not Recognized.\n')
+
+    def test_improper_syntax(self):
+        self.assertEqual(parse_transaction('Alice gives Bob 100'),
+                         'Improper Syntax.\n')
+        self.assertEqual(parse_transaction('Alice gives Bob: lots'),
+                         'Improper Syntax.\n')
+
+    def test_bad_item(self):
+        self.assertEqual(parse_transaction('Alice gives Bob: 100, 50'),
+                         'Item must be in [Item]:[Amount] format.\n')
+        self.assertEqual(parse_transaction('Alice gives Bob: Sword:x'),
+                         'Item must be in [Item]:[Amount] format.\n')
+
+    def test_cached(self):
+        self.assertIs(parse_transaction('Alice gives Bob: 1'),
+                      parse_transaction('Alice gives Bob: 1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
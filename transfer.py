@@ -0,0 +1,160 @@
+"""
+File for transfers, currency and items moving between accounts all at once.
+"""
+import sys
+from typing import Dict, List, Mapping, Tuple, Union
+
+from account import Account
+
+
+class Transfer:
+    """Currency and items moving between any number of accounts, either all
+    of it goes through or none of it does.
+
+    Each side is added with take() or give(), then apply() checks every side
+    in a single pass, working out where each account ends up, and only then
+    writes it all. Nothing is touched unless every side checks out, and if
+    writing fails part way whatever was written is put back.
+
+    Checks and errors are the same as Account.take() and Account.add() make,
+    so a transfer can stand in for a remove() followed by an add().
+    """
+    def __init__(self) -> None:
+        # (account, value, items, key, taking) for each side, in order.
+        self.sides = []
+        return
+
+    def take(self, account: Account, value: float = 0,
+             items: Union[Mapping[str, int], None] = None,
+             key: Union[str, None] = None) -> 'Transfer':
+        """Adds a side taking from an account.
+
+        :param account: The account.
+        :param value: How much currency to take.
+        :param items: How many of each item to take.
+        :param key: The key to check against the account's, None for no check.
+        :return: The transfer, to add more sides to.
+        """
+        self.sides.append((account, value, items, key, True))
+        return self
+
+    def give(self, account: Account, value: float = 0,
+             items: Union[Mapping[str, int], None] = None) -> 'Transfer':
+        """Adds a side giving to an account.
+
+        .. warning:: Item's existence cannot be checked here, must be checked
+        beforehand.
+
+        :param account: The account.
+        :param value: How much currency to give.
+        :param items: How many of each item to give.
+        :return: The transfer, to add more sides to.
+        """
+        self.sides.append((account, value, items, None, False))
+        return self
+
+    def check(self) -> Union[str, List[Tuple[
+            Account, float, Dict[str, int], float, Dict[str, int],
+            Dict[str, int]]]]:
+        """Checks every side, in order, against where the sides before it
+        leave each account. Each account's count of an item is only looked
+        up once.
+
+        :return: What went wrong, or for each account in the order first
+            touched, its new value, its new count of each item touched, the
+            change in both and what it held of those items before.
+        """
+        # id(account) -> [account, value, counts, value change, item changes,
+        # counts before]
+        state = dict()
+        for account, value, items, key, taking in self.sides:
+            entry = state.get(id(account))
+            if entry is None:
+                entry = state[id(account)] = [account, account.value, dict(),
+                                              0, dict(), dict()]
+            counts = entry[2]
+            before = entry[5]
+            inventory = account.inventory
+            if taking:
+                if key is not None and key != account.key:
+                    return "Invalid Key, you are not %s.\n" % account.name
+                if not value and not items:
+                    return "Nothing Passed. Try again.\n"
+                if value < 0:
+                    return "You cannot remove a negative number!\n"
+                elif value > entry[1]:
+                    return "You don't have enough money.\n"
+                sign = -1
+            else:
+                if not value and items is None:
+                    return "Nothing given.\n"
+                if value < 0:
+                    return "Value cannot be negative.\n"
+                sign = 1
+            new = dict()
+            for item, amount in (items or {}).items():
+                count = counts.get(item)
+                if count is None:
+                    count = before[item] = inventory.get(item, 0)
+                if taking:
+                    if not count:
+                        return "You don't have any %s(s).\n" % item
+                    elif count < amount:
+                        return "You don't have enough %s(s).\n" % item
+                    elif amount < 1:
+                        return "You cannot remove less than 1 item from an " \
+                               "Inventory.\n"
+                elif amount < 1:
+                    return "Cannot add a negative number of %s to " \
+                           "inventory.\n" % item
+                new[item] = count + sign * amount
+            counts.update(new)
+            entry[1] += sign * value
+            entry[3] += sign * value
+            changes = entry[4]
+            for item, amount in (items or {}).items():
+                changes[item] = changes.get(item, 0) + sign * amount
+        return [tuple(i) for i in state.values()]
+
+    def apply(self) -> str:
+        """Checks the transfer and carries it out if it checks out.
+
+        :return: An empty string if it went through, what went wrong
+            otherwise.
+        """
+        checked = self.check()
+        if isinstance(checked, str):
+            return checked
+        written = []
+        try:
+            for account, value, counts, _, _, before in checked:
+                written.append((account, account.value, before))
+                self.write(account, value, counts)
+        except BaseException:
+            for account, value, before in written:
+                self.write(account, value, before)
+            raise
+        for account, _, _, value, items, _ in checked:
+            items = {item: amount for item, amount in items.items() if amount}
+            if value or items:
+                account.notify(value, items)
+        return ""
+
+    @staticmethod
+    def write(account: Account, value: float,
+              counts: Mapping[str, int]) -> None:
+        """Sets an account's value and counts of items, without telling
+        anyone.
+
+        :param account: The account.
+        :param value: Its value.
+        :param counts: Its count of each item, 0 to have none.
+        """
+        inventory = account.inventory
+        account.value = value
+        for item, count in counts.items():
+            if count:
+                inventory[sys.intern(item)] = count
+            else:
+                inventory.pop(item, None)
+        return
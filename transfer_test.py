@@ -0,0 +1,103 @@
+import unittest
+from account import Account
+from transfer import Transfer
+
+
+class Observer:
+    def __init__(self):
+        self.changes = []
+
+    def account_changed(self, account, value, items):
+        self.changes.append((account.name, value, items))
+
+
+class Exploding(dict):
+    """An inventory that fails the first time anything is written to it."""
+    def __setitem__(self, key, value):
+        raise MemoryError
+
+
+class TestTransfer(unittest.TestCase):
+    def setUp(self):
+        self.observer = Observer()
+        self.alice = Account('Alice', 'Alice', 'AliceKey', 100,
+                             {'Sword': 2, 'Ring': 1})
+        self.bob = Account('Bob', 'Bob', 'BobKey', 10)
+        self.carol = Account('Carol', 'Carol', 'CarolKey', 0)
+        for account in (self.alice, self.bob, self.carol):
+            account.observer = self.observer
+
+    def state(self):
+        return [(i.value, i.inventory)
+                for i in (self.alice, self.bob, self.carol)]
+
+    def test_transfer(self):
+        self.assertEqual(Transfer().take(self.alice, 40, {'Sword': 2},
+                                         'AliceKey')
+                         .give(self.bob, 40, {'Sword': 2}).apply(), '')
+        self.assertEqual(self.state(),
+                         [(60, {'Ring': 1}), (50, {'Sword': 2}), (0, {})])
+        self.assertEqual(self.observer.changes,
+                         [('Alice', -40, {'Sword': -2}),
+                          ('Bob', 40, {'Sword': 2})])
+
+    def test_errors_match_account(self):
+        cases = [((self.alice, 5, None, 'Wrong'),
+                  "Invalid Key, you are not Alice.\n"),
+                 ((self.alice, 0, None), "Nothing Passed. Try again.\n"),
+                 ((self.alice, -1, None), "You cannot remove a negative "
+                                          "number!\n"),
+                 ((self.alice, 101, None), "You don't have enough money.\n"),
+                 ((self.alice, 0, {'Gem': 1}), "You don't have any Gem(s).\n"),
+                 ((self.alice, 0, {'Sword': 3}),
+                  "You don't have enough Sword(s).\n")]
+        for side, error in cases:
+            self.assertEqual(Transfer().take(*side).give(self.bob, 1).apply(),
+                             error)
+        self.assertEqual(Transfer().give(self.bob).apply(), "Nothing given.\n")
+        self.assertEqual(Transfer().give(self.bob, -1).apply(),
+                         "Value cannot be negative.\n")
+        self.assertEqual(Transfer().give(self.bob, 0, {'Gem': 0}).apply(),
+                         "Cannot add a negative number of Gem to inventory.\n")
+        self.assertEqual(self.state(),
+                         [(100, {'Sword': 2, 'Ring': 1}), (10, {}), (0, {})])
+        self.assertEqual(self.observer.changes, [])
+
+    def test_failed_receiver_takes_nothing(self):
+        # giving nothing back used to leave the sword taken.
+        self.assertEqual(Transfer().take(self.alice, 0, {'Sword': 1})
+                         .give(self.alice, 0).apply(), "Nothing given.\n")
+        self.assertEqual(self.alice.inventory, {'Sword': 2, 'Ring': 1})
+
+    def test_multi_party(self):
+        self.assertEqual(Transfer().take(self.alice, 30, {'Sword': 1})
+                         .take(self.bob, 10).give(self.carol, 40, {'Sword': 1})
+                         .give(self.bob, 0, {'Ring': 1})
+                         .take(self.alice, 0, {'Ring': 1}).apply(), '')
+        self.assertEqual(self.state(),
+                         [(70, {'Sword': 1}), (0, {'Ring': 1}),
+                          (40, {'Sword': 1})])
+
+    def test_sides_see_earlier_sides(self):
+        self.assertEqual(Transfer().take(self.alice, 0, {'Sword': 2})
+                         .take(self.alice, 0, {'Sword': 1}).give(self.bob, 1)
+                         .apply(), "You don't have any Sword(s).\n")
+        self.assertEqual(Transfer().give(self.carol, 5)
+                         .take(self.carol, 5).apply(), '')
+        self.assertEqual(self.alice.inventory, {'Sword': 2, 'Ring': 1})
+        # no net change, no one told.
+        self.assertEqual(self.observer.changes, [])
+
+    def test_rollback(self):
+        self.carol.inventory = Exploding()
+        with self.assertRaises(MemoryError):
+            Transfer().take(self.alice, 5, {'Sword': 1}).give(
+                self.bob, 5).give(self.carol, 0, {'Sword': 1}).apply()
+        self.assertEqual([(i.value, dict(i.inventory)) for i in
+                          (self.alice, self.bob, self.carol)],
+                         [(100, {'Sword': 2, 'Ring': 1}), (10, {}), (0, {})])
+        self.assertEqual(self.observer.changes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()